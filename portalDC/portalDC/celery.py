@@ -1,6 +1,8 @@
 # portal_project/celery.py
 import os
 from celery import Celery
+from celery.signals import setup_logging, worker_process_init
+from .logconfig import configure_logging
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portalDC.settings')
@@ -13,6 +15,16 @@ app = Celery('portalDC')
 # should have a `CELERY_` prefix.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Use the same queued JSON logging as the web processes instead of Celery's own setup
+@setup_logging.connect
+def configure_worker_logging(loglevel=None, **kwargs):
+    configure_logging(level=loglevel or os.environ.get('PORTAL_LOG_LEVEL', 'INFO'))
+
+# Forked pool processes don't inherit the log listener thread; start one in each
+@worker_process_init.connect
+def configure_pool_process_logging(**kwargs):
+    configure_logging(level=os.environ.get('PORTAL_LOG_LEVEL', 'INFO'))
+
 # Auto-discover tasks in all installed apps.
 # Celery will look for a `tasks.py` file in each app.
 app.autodiscover_tasks()
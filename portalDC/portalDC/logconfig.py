@@ -0,0 +1,79 @@
+# portal_project/logconfig.py
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Structured fields passed as ``extra={'fields': {...}}``
+    (see submissions.tracing) are merged into the top level of the record.
+    """
+
+    def format(self, record):
+        data = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare() would pre-format the record with a plain Formatter, gluing
+    the traceback onto the message. Keep them apart for the JSON formatter instead.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.stack_info = None
+        return record
+
+
+_configured_pid = None
+
+
+def configure_logging(level='INFO'):
+    """
+    Routes all logging through a QueueHandler so request threads only enqueue the
+    record; a single listener thread does the formatting and the stdout write.
+    Safe to call repeatedly: it only reconfigures in a new (e.g. forked) process,
+    which doesn't inherit the parent's listener thread.
+    """
+    global _configured_pid
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _configured_pid == os.getpid():
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Flush what is still queued on shutdown
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(StructuredQueueHandler(log_queue))
+    _configured_pid = os.getpid()
\ No newline at end of file
@@ -11,8 +11,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
 from pathlib import Path
-import sys
-import logging
+from kombu import Queue
+from .logconfig import configure_logging
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,11 +30,17 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 LOGGING_CONFIG = None # Disable Django's default logging config
-logging.basicConfig(
-    level=logging.INFO, # Log INFO level and above
-    format='%(asctime)s %(levelname)-8s %(name)-15s %(message)s',
-    stream=sys.stdout, # Force output to standard out
-)
+# JSON lines on stdout, written by a background listener thread (see portalDC/logconfig.py)
+configure_logging(level=os.environ.get('PORTAL_LOG_LEVEL', 'INFO'))
+# Fraction of successful requests/tasks whose per-phase timing record is logged.
+# Failed ones are always logged.
+SUBMISSION_TRACE_SAMPLE_RATE = float(os.environ.get('PORTAL_TRACE_SAMPLE_RATE', '0.05'))
+# Request profiler (submissions/profiling.py): fraction of requests run under cProfile;
+# those slower than SUBMISSION_PROFILE_SLOW_MS are saved for `manage.py profile_report`
+SUBMISSION_PROFILE_SAMPLE_RATE = float(os.environ.get('PORTAL_PROFILE_SAMPLE_RATE', '0')) # 0 = off
+SUBMISSION_PROFILE_SLOW_MS = int(os.environ.get('PORTAL_PROFILE_SLOW_MS', '500'))
+SUBMISSION_PROFILE_DIR = os.environ.get('PORTAL_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles')) # Never under MEDIA_ROOT
+SUBMISSION_PROFILE_MAX_CAPTURES = 500 # Oldest captures are deleted beyond this
 
 # Application definition
 
@@ -50,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'submissions.metrics.MetricsMiddleware', # First, so it times the whole stack (see /metrics)
+    'submissions.profiling.ProfilingMiddleware', # Removes itself unless SUBMISSION_PROFILE_SAMPLE_RATE > 0
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,12 +93,92 @@ WSGI_APPLICATION = 'portalDC.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PORTAL_DB_ENGINE=postgresql switches to PostgreSQL (configured by the PORTAL_DB_*
+# variables below); otherwise the single-box SQLite setup is used.
+# Compare the two with `python manage.py bench_db_writes --compare`.
+PORTAL_DB_ENGINE = os.environ.get('PORTAL_DB_ENGINE', 'sqlite')
+if PORTAL_DB_ENGINE == 'postgresql':
+    # PORTAL_DB_POOL=1 (default) gives each process a psycopg connection pool; with 0 each
+    # thread keeps one persistent connection for PORTAL_DB_CONN_MAX_AGE seconds instead.
+    # Keep processes x PORTAL_DB_POOL_MAX_SIZE below the server's max_connections.
+    PORTAL_DB_POOL = os.environ.get('PORTAL_DB_POOL', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PORTAL_DB_NAME', 'portal'),
+            'USER': os.environ.get('PORTAL_DB_USER', 'portal'),
+            'PASSWORD': os.environ.get('PORTAL_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PORTAL_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('PORTAL_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if PORTAL_DB_POOL else int(os.environ.get('PORTAL_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True, # Drop persistent connections the server has closed
+            'OPTIONS': {
+                'pool': {
+                    'min_size': 2,
+                    'max_size': int(os.environ.get('PORTAL_DB_POOL_MAX_SIZE', '10')),
+                    'timeout': 10, # Seconds to wait for a free connection
+                },
+            } if PORTAL_DB_POOL else {},
+        }
+    }
+else:
+    # Tuned for several processes writing at once (3 waitress + Celery workers):
+    # WAL lets readers run alongside the writer, synchronous=NORMAL is safe with WAL and
+    # skips an fsync per commit, and IMMEDIATE transactions take the write lock up front,
+    # so writers queue on the busy timeout instead of failing with "database is locked"
+    # when a read transaction tries to upgrade.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20, # Seconds to wait for the write lock
+            },
+        }
     }
-}
+
+
+# Cache
+# Set PORTAL_CACHE_URL (e.g. redis://localhost:6379/2) in production so the waitress
+# processes and the Celery worker share one cache: status invalidations made by the
+# worker then reach every web process. The local-memory fallback is per process, so
+# it relies on a short timeout instead.
+PORTAL_CACHE_URL = os.environ.get('PORTAL_CACHE_URL')
+if PORTAL_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': PORTAL_CACHE_URL,
+        }
+    }
+    SUBMISSION_STATUS_CACHE_TIMEOUT = 300 # Seconds; entries are refreshed on every status change
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'portal',
+        }
+    }
+    SUBMISSION_STATUS_CACHE_TIMEOUT = 5 # Seconds; other processes' invalidations can't reach this cache
+SUBMISSION_STATUS_BATCH_LIMIT = 100 # Max ids per status/?ids=... request
+SUBMISSION_LIST_DEFAULT_LIMIT = 50 # Page size of list/ (keyset-paginated)
+SUBMISSION_LIST_MAX_LIMIT = 500
+# Redis used for pub/sub of status changes to the SSE endpoint (submissions/events.py)
+SUBMISSION_EVENTS_REDIS_URL = os.environ.get('PORTAL_EVENTS_REDIS_URL', 'redis://localhost:6379/3')
+
+# Admission control of submit/ and submit-async/ (submissions/admission.py). Token
+# buckets, in-flight requests and throughput are kept in Redis, shared by all processes.
+SUBMISSION_ADMISSION_REDIS_URL = os.environ.get('PORTAL_ADMISSION_REDIS_URL', 'redis://localhost:6379/4')
+SUBMISSION_IP_RATE_LIMIT = (60, 120) # (submissions per minute, burst); a classroom may share one address
+SUBMISSION_STUDENT_RATE_LIMIT = (6, 10)
+SUBMISSION_TRUSTED_PROXIES = ('127.0.0.1', '::1') # Caddy; its X-Real-IP header names the client
+SUBMISSION_MAX_QUEUE_DEPTH = 5000 # Messages waiting in the submission queues before submit/ answers 503
+SUBMISSION_MAX_INFLIGHT_UPLOADS = 64 # Submit requests being handled at once, across processes
+SUBMISSION_INFLIGHT_STALE = 10 * 60 # Seconds before a request's slot is considered leaked
+SUBMISSION_SHED_RETRY_AFTER = 30 # Base Retry-After (seconds) of a 503; jittered up to twice that
+SUBMISSION_THROUGHPUT_WINDOW = 5 * 60 # Seconds of finished submissions behind the ETA
 
 
 # Password validation
@@ -148,12 +236,131 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 # Optional: Set timezone if needed
 CELERY_TIMEZONE = 'UTC' # Or your project's timezone
+# Queues: fast validation/bookkeeping, heavy page extraction and similarity work each
+# get their own workers (see runservers.py), so a 300-page thesis never delays the
+# validation of other submissions. Anything unrouted goes to the default 'celery' queue.
+CELERY_TASK_QUEUES = (
+    Queue('validation'),
+    Queue('extraction'),
+    Queue('similarity'),
+    Queue('celery'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'submissions.tasks.process_submission': {'queue': 'validation'},
+    'submissions.tasks.merge_extracted_text': {'queue': 'validation'},
+    'submissions.tasks.mark_submission_failed': {'queue': 'validation'},
+    'submissions.tasks.finalize_batch': {'queue': 'validation'},
+    'submissions.tasks.finalize_batch_failed': {'queue': 'validation'},
+    'submissions.tasks.extract_page_range': {'queue': 'extraction'},
+    'submissions.tasks.check_similarity': {'queue': 'similarity'},
+    'submissions.tasks.render_previews': {'queue': 'extraction'},
+    'submissions.tasks.index_submission_text': {'queue': 'similarity'},
+}
+# Acknowledge messages only once a task has finished, and requeue them if the worker
+# process dies mid-task; the submission tasks are idempotent (see submissions/tasks.py)
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# Transient task errors are retried with jittered exponential backoff before landing
+# in the FailedTask dead-letter table. Keep the backoff cap below the Redis visibility
+# timeout (1 hour), or unacknowledged retries get delivered twice.
+SUBMISSION_TASK_MAX_RETRIES = 5
+SUBMISSION_TASK_RETRY_BACKOFF_MAX = 10 * 60 # Seconds
+# Tasks are long; don't let one process hoard messages another idle process could run
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Grow prefork pools with queue depth, not just reserved tasks (see submissions/autoscale.py)
+CELERY_WORKER_AUTOSCALER = 'submissions.autoscale:QueueDepthAutoscaler'
+# Periodic tasks (run `celery -A portalDC beat` alongside the worker)
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-uploads': {
+        'task': 'submissions.tasks.purge_expired_uploads',
+        'schedule': 60 * 60, # Hourly
+    },
+    'migrate-blob-tiers': {
+        'task': 'submissions.tasks.migrate_blob_tiers',
+        'schedule': 15 * 60, # Small batches, often (SUBMISSION_TIERING_BATCH)
+    },
+    'evict-previews': {
+        'task': 'submissions.tasks.evict_previews',
+        'schedule': 60 * 60, # Backstop; renders also evict as they fill the cache
+    },
+}
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles') # Store uploads in a 'mediafiles' directory
+# Store uploads in a 'mediafiles' directory. The Caddyfile reads the same variables,
+# and falls back to the same directories relative to the project (Caddy's working directory).
+MEDIA_ROOT = os.environ.get('PORTAL_MEDIA_ROOT', os.path.join(BASE_DIR, 'mediafiles'))
 
 # URL that handles the media served from MEDIA_ROOT. Make sure it doesn't clash with app URLs.
 # It must end in a slash if non-empty.
 MEDIA_URL = '/media/'
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
\ No newline at end of file
+STATIC_ROOT = os.environ.get('PORTAL_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+
+# --- Submission Uploads ---
+# Uploads are streamed straight into MEDIA_ROOT by submissions.uploadhandlers,
+# which hashes them and rejects non-PDFs / oversized bodies after the first chunk.
+SUBMISSION_MAX_UPLOAD_SIZE = 100 * 1024 * 1024 # Keep in sync with `request_body` in the Caddyfile
+SUBMISSION_UPLOAD_CHUNK_SIZE = 64 * 1024 # Bytes handed to the upload handler per read
+SUBMISSION_INCOMING_DIR = os.path.join(MEDIA_ROOT, '.incoming') # Partial uploads (same filesystem as final files)
+
+# Batch uploads (a ZIP or several PDFs plus a manifest), see submissions/batch.py
+SUBMISSION_BATCH_MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024 # Whole request; keep in sync with the Caddyfile
+SUBMISSION_BATCH_MAX_FILES = 500 # Each is an open temp file until the batch is stored
+
+# Resumable (chunked) uploads, see submissions/resumable.py
+SUBMISSION_STAGING_DIR = os.path.join(MEDIA_ROOT, '.staging') # Chunks of unfinished uploads
+SUBMISSION_RESUMABLE_CHUNK_SIZE = 5 * 1024 * 1024 # Size of every chunk except the last
+SUBMISSION_RESUMABLE_EXPIRY = 24 * 60 * 60 # Seconds before an unfinished upload is purged
+
+# PDF processing: documents longer than this are split into page-range tasks
+# that run in parallel on the workers (see submissions/tasks.py)
+SUBMISSION_PAGES_PER_TASK = 25
+
+# Similarity index (MinHash + LSH, see submissions/similarity.py)
+SUBMISSION_SIMILARITY_THRESHOLD = 0.5 # Estimated Jaccard similarity reported as a match
+SUBMISSION_SIMILARITY_MAX_MATCHES = 10 # Matches stored per submission
+
+# Storage tiers (see submissions/tiering.py). Blobs are stored in MEDIA_ROOT (hot) and
+# moved to S3-compatible object storage (cold) once old, if a bucket is configured.
+# PORTAL_COLD_ENDPOINT_URL points at MinIO (or any S3 stand-in, e.g. `moto_server`)
+# instead of AWS; credentials come from the usual AWS_* environment variables.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+SUBMISSION_COLD_STORAGE = None # STORAGES alias of the cold tier; None keeps every blob local
+if os.environ.get('PORTAL_COLD_BUCKET'):
+    STORAGES['submissions_cold'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage', # pip install django-storages[s3]
+        'OPTIONS': {
+            'bucket_name': os.environ['PORTAL_COLD_BUCKET'],
+            'endpoint_url': os.environ.get('PORTAL_COLD_ENDPOINT_URL') or None,
+            'region_name': os.environ.get('PORTAL_COLD_REGION') or None,
+            'file_overwrite': True, # Blob names are content addresses
+            'querystring_expire': 5 * 60, # Lifetime of presigned download URLs (seconds)
+        },
+    }
+    SUBMISSION_COLD_STORAGE = 'submissions_cold'
+SUBMISSION_COLD_AFTER_DAYS = 30 # Hot this long (since upload or last promotion) before moving
+SUBMISSION_TIERING_BATCH = 200 # Blobs moved per migrate_blob_tiers run
+
+# Downloads are sent by the proxy, not Python: 'X-Accel-Redirect' (Caddy, nginx) with
+# the internal prefix below, or 'X-Sendfile' (Apache, lighttpd) with the file's path.
+# Set PORTAL_SENDFILE_HEADER to '' when nothing sits in front of Django (runserver).
+SUBMISSION_SENDFILE_HEADER = os.environ.get('PORTAL_SENDFILE_HEADER', 'X-Accel-Redirect')
+SUBMISSION_SENDFILE_PREFIX = '/protected-media/' # Maps to MEDIA_ROOT in the Caddyfile
+
+# ZIP exports (submissions/export.py): rows read per query while streaming
+SUBMISSION_EXPORT_BATCH = 500
+
+# First-page PDF previews (submissions/previews.py; needs pypdfium2 and Pillow)
+SUBMISSION_PREVIEW_DIR = os.path.join(MEDIA_ROOT, '.previews') # Cache, named by content hash
+SUBMISSION_PREVIEW_CACHE_SIZE = 1024 * 1024 * 1024 # Bytes; least recently used previews are evicted beyond this
+SUBMISSION_PREVIEW_PRERENDER = True # Render in the background after upload instead of on the first request
+
+# Full-text search (submissions/search.py): FTS5 on SQLite, tsvector on PostgreSQL
+SUBMISSION_SEARCH_CONFIG = 'simple' # PostgreSQL text search config; 'simple' keeps words (and code) as written, like FTS5
+SUBMISSION_SEARCH_DEFAULT_LIMIT = 20 # Hits per page
+SUBMISSION_SEARCH_MAX_LIMIT = 100
\ No newline at end of file
@@ -1,16 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings # Import settings
-from django.conf.urls.static import static # Import static
 from django.views.generic import RedirectView
+from submissions.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('submissions/', include('submissions.urls')),
+    path('metrics', metrics_view, name='metrics'), # Prometheus scrape target
     path('', RedirectView.as_view(url='/submissions/submit/', permanent=False), name='index_redirect'),
 
 ]
-
-# Add this block for serving media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media is not served publicly; submissions/download/<pk>/ hands files to the proxy
\ No newline at end of file
@@ -1,9 +1,13 @@
 # run_servers.py
+import re
+import shutil
 import subprocess
 import os
+import tempfile
 import time
 import signal
 import sys
+import urllib.request
 
 # --- Configuration ---
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__)) # Assumes script is in project root
@@ -11,93 +15,447 @@ PYTHON_EXE = sys.executable # Use the python exe that runs this script
 WAITRESS_HOST = "127.0.0.1"
 WAITRESS_PORTS = [8000, 8001, 8002]
 DJANGO_APP = "portalDC.wsgi:application" # Your WSGI application
+ASGI_APP = "portalDC.asgi:application" # Serves the async endpoints (SSE status streams, submit-async/)
+ASGI_PORT = 8100 # Caddy routes /submissions/events/* and /submissions/submit-async/ here
 CELERY_APP = "portalDC" # Your Celery app name (from celery.py)
-CADDY_EXE = os.path.join(PROJECT_DIR, "caddy.exe") # Assumes caddy.exe is in project root
-CADDY_CONFIG = os.path.join(PROJECT_DIR, "Caddyfile")
+CELERY_QUEUES = ["validation", "extraction", "similarity", "celery"] # See CELERY_TASK_QUEUES in settings.py
+CADDY_EXE = os.path.join(PROJECT_DIR, "caddy.exe") if sys.platform == "win32" else (shutil.which("caddy") or "caddy")
+CADDY_CONFIG = os.path.join(PROJECT_DIR, "caddyfile")
+# Every child records Prometheus samples here so /metrics adds up all processes (see submissions/metrics.py)
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "portalDC-metrics"))
+
+# Supervisor (Linux/macOS): web workers are started on free ports inside each pool's
+# block of ports, and the Caddyfile actually served is a copy of CADDY_CONFIG with
+# the upstream lists rewritten to the workers that are up and passing health checks.
+WEB_WORKERS = int(os.environ.get("PORTAL_WEB_WORKERS", os.cpu_count() or 1))
+ASGI_WORKERS = int(os.environ.get("PORTAL_ASGI_WORKERS", 1))
+PORT_BLOCK = 100 # Ports WAITRESS_PORTS[0].. belong to the waitress pool, ASGI_PORT.. to uvicorn
+CADDY_LIVE_CONFIG = os.path.join(tempfile.gettempdir(), "portalDC.caddyfile")
+HEALTH_PATH = "/submissions/health/"
+HEALTH_INTERVAL = 2 # Seconds between supervision rounds
+HEALTH_TIMEOUT = 2 # Seconds a probe may take
+HEALTH_FAILURES = 3 # Consecutive failed probes before a worker is restarted
+STARTUP_TIMEOUT = 60 # Seconds a new worker has to pass its first probe
+DRAIN_SECONDS = 10 # Time given to in-flight requests after a worker leaves the upstream list
+STOP_TIMEOUT = 15 # Seconds to wait after SIGTERM before SIGKILL (web, caddy)
+CELERY_STOP_TIMEOUT = 120 # Celery's warm shutdown finishes the running tasks first
+BACKOFF_BASE = 1 # Restart delay doubles per crash: 1s, 2s, 4s ... BACKOFF_MAX
+BACKOFF_MAX = 60
+STABLE_SECONDS = 60 # A worker up this long has its backoff reset
+
+
+def reset_metrics_dir():
+    # prometheus_client requires an empty directory at startup; old files would replay stale samples
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR)
+
 
 # Commands to run
-commands = []
 
-# 1. Waitress Instances
-for port in WAITRESS_PORTS:
-    cmd = [
+def web_command(port):
+    return [
         "waitress-serve",
         f"--host={WAITRESS_HOST}",
         f"--port={port}",
         DJANGO_APP,
     ]
-    commands.append({"name": f"Waitress (Port {port})", "cmd": cmd})
 
-# 2. Celery Worker
-celery_cmd = [
+
+def asgi_command(port):
+    # Uvicorn (ASGI) for long-lived SSE status streams and async uploads; one event loop holds thousands of them
+    return [
+        PYTHON_EXE,
+        "-m", "uvicorn",
+        ASGI_APP,
+        f"--host={WAITRESS_HOST}",
+        f"--port={port}",
+    ]
+
+
+# Celery Workers
+celery_base = [
     PYTHON_EXE, # Use python to run celery if 'celery' command isn't directly in PATH reliably
     "-m", "celery", # Run celery as a module
     "-A", CELERY_APP,
     "worker",
     "-l", "info",
-    "--pool=solo", # Necessary for Windows
-    "--concurrency=1", # Start with 1 on Windows
 ]
-commands.append({"name": "Celery Worker", "cmd": celery_cmd})
-
-# 3. Caddy Server
-caddy_cmd = [
-    CADDY_EXE,
-    "run",
-    f"--config={CADDY_CONFIG}",
-    f"--adapter=caddyfile", # Explicitly specify adapter
+
+
+def celery_commands():
+    if sys.platform == "win32":
+        # Windows has no prefork pool: one solo worker consumes every queue
+        celery_cmd = celery_base + [
+            "--pool=solo", # Necessary for Windows
+            "--concurrency=1", # Start with 1 on Windows
+            f"--queues={','.join(CELERY_QUEUES)}",
+        ]
+        return [{"name": "Celery Worker", "cmd": celery_cmd}]
+    # One worker per queue so slow extraction never holds up validation of new submissions.
+    # Prefork pools autoscale between min and max processes with queue depth
+    # (submissions.autoscale.QueueDepthAutoscaler); validation is mostly DB/IO and uses threads.
+    cpus = os.cpu_count() or 1
+    worker_pools = {
+        "validation": ["--pool=threads", "--concurrency=8", "--queues=validation,celery"],
+        "extraction": ["--pool=prefork", f"--autoscale={cpus},1", "--queues=extraction"],
+        "similarity": ["--pool=prefork", f"--autoscale={max(cpus // 2, 1)},1", "--queues=similarity"],
+    }
+    return [{"name": f"Celery Worker ({name})", "cmd": celery_base + options + [f"--hostname={name}@%h"]}
+            for name, options in worker_pools.items()]
+
+
+# Celery Beat (periodic tasks, e.g. purging expired resumable uploads)
+beat_cmd = [
+    PYTHON_EXE,
+    "-m", "celery",
+    "-A", CELERY_APP,
+    "beat",
+    "-l", "info",
 ]
-commands.append({"name": "Caddy Server", "cmd": caddy_cmd})
 
 
-# --- Process Management ---
-processes = []
+def caddy_command(config):
+    return [
+        CADDY_EXE,
+        "run",
+        f"--config={config}",
+        f"--adapter=caddyfile", # Explicitly specify adapter
+    ]
+
+
+# --- Windows: start everything once, stop on Ctrl+C ---
+
+def run_windows():
+    commands = [{"name": f"Waitress (Port {port})", "cmd": web_command(port)} for port in WAITRESS_PORTS]
+    commands.append({"name": f"Uvicorn ASGI (Port {ASGI_PORT})", "cmd": asgi_command(ASGI_PORT)})
+    commands += celery_commands()
+    commands.append({"name": "Celery Beat", "cmd": beat_cmd})
+    commands.append({"name": "Caddy Server", "cmd": caddy_command(CADDY_CONFIG)})
+
+    processes = []
+
+    reset_metrics_dir()
+    print("Starting services...")
+
+    try:
+        for item in commands:
+            print(f"Starting {item['name']}...")
+            try:
+                # CREATE_NEW_CONSOLE opens each process in its own window on Windows
+                process = subprocess.Popen(
+                    item['cmd'],
+                    cwd=PROJECT_DIR, # Run command from the project directory
+                    creationflags=getattr(subprocess, "CREATE_NEW_CONSOLE", 0) # Windows-only flag
+                )
+                processes.append(process)
+                print(f"  -> Started {item['name']} (PID: {process.pid})")
+                time.sleep(1) # Small delay between starting processes
+            except FileNotFoundError:
+                print(f"  -> ERROR: Command not found for {item['name']}. Check path/installation.")
+                print(f"     Command: {' '.join(item['cmd'])}")
+            except Exception as e:
+                print(f"  -> ERROR: Failed to start {item['name']}: {e}")
+                print(f"     Command: {' '.join(item['cmd'])}")
+
+
+        print("\nAll services launched in separate windows.")
+        print("Press Ctrl+C in *this* window (the script's window) to stop all services.")
+
+        # Keep the main script alive until Ctrl+C
+        while True:
+            time.sleep(1)
+
+    except KeyboardInterrupt:
+        print("\nCtrl+C received. Stopping services...")
+
+    finally:
+        for i, process in enumerate(reversed(processes)): # Stop in reverse order
+            print(f"Stopping process {len(processes)-i} (PID: {process.pid})...")
+            try:
+                # Send SIGTERM (like Ctrl+C) - terminate() is often sufficient on Windows
+                process.terminate()
+                process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                print(f"  -> Process {process.pid} did not terminate gracefully, killing.")
+                process.kill()
+            except Exception as e:
+                print(f"  -> Error stopping process {process.pid}: {e}")
+        print("All specified services stopped.")
+
+
+# --- Linux/macOS: supervisor ---
+
+def log(message):
+    print(f"[supervisor {time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+class Child:
+    """One supervised process: its command, Popen handle and restart bookkeeping."""
 
-print("Starting services...")
+    def __init__(self, name, cmd, port=None, stop_timeout=STOP_TIMEOUT):
+        self.name = name
+        self.cmd = cmd
+        self.port = port # Probed over HTTP when set
+        self.stop_timeout = stop_timeout
+        self.process = None
+        self.started_at = 0
+        self.healthy = False
+        self.failures = 0 # Consecutive failed probes
+        self.crashes = 0 # Crashes since it was last stable; drives the backoff
+        self.restart_at = 0 # Earliest monotonic time of the next start
 
-try:
-    for item in commands:
-        print(f"Starting {item['name']}...")
+    def start(self):
         try:
-            # CREATE_NEW_CONSOLE opens each process in its own window on Windows
-            process = subprocess.Popen(
-                item['cmd'],
-                cwd=PROJECT_DIR, # Run command from the project directory
-                creationflags=subprocess.CREATE_NEW_CONSOLE
-            )
-            processes.append(process)
-            print(f"  -> Started {item['name']} (PID: {process.pid})")
-            time.sleep(1) # Small delay between starting processes
-        except FileNotFoundError:
-            print(f"  -> ERROR: Command not found for {item['name']}. Check path/installation.")
-            print(f"     Command: {' '.join(item['cmd'])}")
-        except Exception as e:
-            print(f"  -> ERROR: Failed to start {item['name']}: {e}")
-            print(f"     Command: {' '.join(item['cmd'])}")
-
-
-    print("\nAll services launched in separate windows.")
-    print("Press Ctrl+C in *this* window (the script's window) to stop all services.")
-
-    # Keep the main script alive until Ctrl+C
-    while True:
-        time.sleep(1)
-
-except KeyboardInterrupt:
-    print("\nCtrl+C received. Stopping services...")
-
-finally:
-    for i, process in enumerate(reversed(processes)): # Stop in reverse order
-        print(f"Stopping process {len(processes)-i} (PID: {process.pid})...")
+            # Own session: a Ctrl+C in the terminal reaches only the supervisor, which then
+            # stops the children in drain order
+            self.process = subprocess.Popen(self.cmd, cwd=PROJECT_DIR, start_new_session=True)
+        except OSError as e:
+            log(f"could not start {self.name}: {e} (command: {' '.join(self.cmd)})")
+            self.schedule_restart()
+            return
+        self.started_at = time.monotonic()
+        self.healthy = False
+        self.failures = 0
+        log(f"started {self.name} (PID {self.process.pid})")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def probe(self):
         try:
-            # Send SIGTERM (like Ctrl+C) - terminate() is often sufficient on Windows
-            process.terminate()
-            # Optional: Wait a bit and force kill if needed
-            # try:
-            #    process.wait(timeout=5)
-            # except subprocess.TimeoutExpired:
-            #    print(f"  -> Process {process.pid} did not terminate gracefully, killing.")
-            #    process.kill()
-        except Exception as e:
-            print(f"  -> Error stopping process {process.pid}: {e}")
-    print("All specified services stopped.")
\ No newline at end of file
+            with urllib.request.urlopen(f"http://{WAITRESS_HOST}:{self.port}{HEALTH_PATH}", timeout=HEALTH_TIMEOUT) as response:
+                return response.status == 200
+        except OSError:
+            return False
+
+    def stop(self):
+        """SIGTERM, then SIGKILL if it has not exited within stop_timeout."""
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            log(f"{self.name} did not stop within {self.stop_timeout}s, killing")
+            self.process.kill()
+            self.process.wait()
+        log(f"stopped {self.name}")
+
+    def schedule_restart(self):
+        delay = min(BACKOFF_BASE * 2 ** self.crashes, BACKOFF_MAX)
+        self.crashes += 1
+        self.restart_at = time.monotonic() + delay
+        self.process = None
+        self.healthy = False
+        log(f"restarting {self.name} in {delay}s")
+
+
+class Pool:
+    """A set of identical HTTP workers on ports base_port.., load-balanced by Caddy."""
+
+    def __init__(self, name, command, size, base_port):
+        self.name = name
+        self.command = command
+        self.size = size
+        self.base_port = base_port
+        self.workers = []
+
+    def owns(self, port):
+        return self.base_port <= port < self.base_port + PORT_BLOCK
+
+    def spawn(self):
+        used = {worker.port for worker in self.workers}
+        port = next(port for port in range(self.base_port, self.base_port + PORT_BLOCK) if port not in used)
+        worker = Child(f"{self.name}:{port}", self.command(port), port=port)
+        worker.start()
+        self.workers.append(worker)
+        return worker
+
+    def upstreams(self):
+        return sorted(worker.port for worker in self.workers if worker.healthy)
+
+
+UPSTREAM_LINE = re.compile(r"^(\s*reverse_proxy\s+)((?:http://[\w.]+:\d+\s+)+)(\{)", re.MULTILINE)
+
+
+class Supervisor:
+    """
+    Runs every service as a child process and keeps it running:
+
+    - crashed children are restarted with exponential backoff
+    - web/ASGI workers are probed over HTTP and restarted after HEALTH_FAILURES failed probes
+    - the Caddyfile's upstream lists follow the healthy workers (caddy reload, no downtime)
+    - SIGHUP: rolling restart; each worker's replacement must pass its probe before the
+      old one leaves the upstream list, and the old one gets DRAIN_SECONDS before SIGTERM
+    - SIGTERM/SIGINT: Caddy drains first, then workers, then Celery (warm shutdown)
+    """
+
+    def __init__(self):
+        self.pools = [
+            Pool("waitress", web_command, WEB_WORKERS, WAITRESS_PORTS[0]),
+            Pool("uvicorn", asgi_command, ASGI_WORKERS, ASGI_PORT),
+        ]
+        self.services = [Child(item["name"], item["cmd"], stop_timeout=CELERY_STOP_TIMEOUT) for item in celery_commands()]
+        self.services.append(Child("Celery Beat", beat_cmd))
+        self.caddy = Child("Caddy Server", caddy_command(CADDY_LIVE_CONFIG))
+        self.live_upstreams = None
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def _on_hup(self, signum, frame):
+        self.reload_requested = True
+
+    def _on_term(self, signum, frame):
+        self.stop_requested = True
+
+    def _sleep(self, seconds):
+        """Sleeps in short steps so a stop signal is noticed promptly."""
+        deadline = time.monotonic() + seconds
+        while not self.stop_requested and time.monotonic() < deadline:
+            time.sleep(0.2)
+
+    def _wait_healthy(self, workers, timeout=STARTUP_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        pending = list(workers)
+        while pending and time.monotonic() < deadline and not self.stop_requested:
+            for worker in list(pending):
+                if not worker.alive():
+                    pending.remove(worker)
+                elif worker.probe():
+                    worker.healthy = True
+                    pending.remove(worker)
+            if pending:
+                time.sleep(0.5)
+        return all(worker.healthy for worker in workers)
+
+    def _render_caddyfile(self):
+        with open(CADDY_CONFIG) as f:
+            template = f.read()
+
+        def replace(match):
+            first_port = int(re.search(r":(\d+)", match.group(2)).group(1))
+            pool = next((pool for pool in self.pools if pool.owns(first_port)), None)
+            if pool is None or not pool.upstreams():
+                return match.group(0) # Leave unknown or (momentarily) empty pools alone
+            upstreams = " ".join(f"http://{WAITRESS_HOST}:{port}" for port in pool.upstreams())
+            return f"{match.group(1)}{upstreams} {match.group(3)}"
+
+        return UPSTREAM_LINE.sub(replace, template)
+
+    def _sync_upstreams(self):
+        """Rewrites the live Caddyfile and reloads Caddy when the set of healthy workers changed."""
+        upstreams = [pool.upstreams() for pool in self.pools]
+        if upstreams == self.live_upstreams:
+            return
+        with open(CADDY_LIVE_CONFIG, "w") as f:
+            f.write(self._render_caddyfile())
+        self.live_upstreams = upstreams
+        log(f"upstreams: {dict(zip((pool.name for pool in self.pools), upstreams))}")
+        if self.caddy.alive():
+            # Graceful: Caddy swaps the config without closing open connections
+            result = subprocess.run([CADDY_EXE, "reload", f"--config={CADDY_LIVE_CONFIG}", "--adapter=caddyfile"], cwd=PROJECT_DIR)
+            if result.returncode != 0:
+                log("caddy reload failed; will retry on the next round")
+                self.live_upstreams = None
+
+    def _check(self, child, probe):
+        now = time.monotonic()
+        if child.process is None:
+            if now >= child.restart_at:
+                child.start()
+            return
+        if not child.alive():
+            log(f"{child.name} exited with code {child.process.returncode}")
+            child.schedule_restart()
+            return
+        if now - child.started_at >= STABLE_SECONDS:
+            child.crashes = 0
+        if not probe:
+            return
+        if child.probe():
+            child.healthy, child.failures = True, 0
+        elif child.healthy or now - child.started_at > STARTUP_TIMEOUT:
+            child.failures += 1
+            child.healthy = False
+            if child.failures >= HEALTH_FAILURES:
+                log(f"{child.name} failed {child.failures} health checks")
+                child.stop()
+                child.schedule_restart()
+
+    def _rolling_restart(self):
+        log("SIGHUP: rolling restart")
+        for pool in self.pools:
+            for old in list(pool.workers):
+                if self.stop_requested:
+                    return
+                new = pool.spawn()
+                if not self._wait_healthy([new]):
+                    log(f"{new.name} never became healthy; keeping {old.name}")
+                    new.stop()
+                    pool.workers.remove(new)
+                    continue
+                pool.workers.remove(old)
+                old.healthy = False
+                self._sync_upstreams() # Caddy stops sending new requests to the old worker
+                self._sleep(DRAIN_SECONDS)
+                old.stop()
+        # Celery: warm shutdown (running tasks finish; acks_late redelivers the rest), one at a time
+        for service in self.services:
+            if self.stop_requested:
+                return
+            service.stop()
+            service.start()
+        log("rolling restart finished")
+
+    def _shutdown(self):
+        log("stopping: draining Caddy, then web workers, then Celery")
+        self.caddy.stop()
+        for pool in self.pools:
+            for worker in pool.workers:
+                if worker.alive():
+                    worker.process.terminate()
+            for worker in pool.workers:
+                worker.stop()
+        for service in self.services:
+            if service.alive():
+                service.process.terminate() # Warm shutdown starts everywhere at once
+        for service in self.services:
+            service.stop()
+        log("all services stopped")
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_term)
+        signal.signal(signal.SIGINT, self._on_term)
+        reset_metrics_dir()
+        try:
+            for pool in self.pools:
+                for _ in range(pool.size):
+                    pool.spawn()
+            for service in self.services:
+                service.start()
+            self._wait_healthy([worker for pool in self.pools for worker in pool.workers])
+            self._sync_upstreams()
+            self.caddy.start()
+
+            while not self.stop_requested:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self._rolling_restart()
+                for pool in self.pools:
+                    for worker in pool.workers:
+                        self._check(worker, probe=True)
+                for service in self.services + [self.caddy]:
+                    self._check(service, probe=False)
+                self._sync_upstreams()
+                self._sleep(HEALTH_INTERVAL)
+        finally:
+            self._shutdown()
+
+
+if __name__ == "__main__":
+    if sys.platform == "win32":
+        run_windows()
+    else:
+        log(f"PID {os.getpid()}: SIGHUP for a rolling restart, SIGTERM/Ctrl+C to stop")
+        Supervisor().run()
\ No newline at end of file
@@ -1,3 +1,65 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .models import ALL_STUDENTS, FailedTask, Submission, SubmissionStatusCount
+from .tasks import requeue_failed
 
 # Register your models here.
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids COUNT(*) over the whole table: an unfiltered list takes its total from the
+    SubmissionStatusCount counters, a filtered one counts at most COUNT_LIMIT rows.
+    Past that the page links stop at the limit, which is fine for browsing.
+    """
+    COUNT_LIMIT = 10_000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return sum(SubmissionStatusCount.objects.counts(ALL_STUDENTS).values())
+        return self.object_list.order_by()[:self.COUNT_LIMIT].count()
+
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student_name', 'status', 'submitted_at', 'completed_at', 'page_count', 'similarity_score')
+    list_filter = ('status', 'submitted_at')
+    search_fields = ('=student_name',) # Whole-name match instead of a '%term%' scan
+    ordering = ('-submitted_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False # Skips the extra unfiltered COUNT(*) next to filtered results
+    # Status only moves through Submission.objects.transition(); nothing here is hand-edited.
+    # student_name too: SubmissionStatusCount and file_name (the logical path) are keyed by it
+    readonly_fields = ('student_name', 'status', 'celery_task_id', 'blob', 'file_name', 'uploaded_file', 'submitted_at',
+                       'status_changed_at', 'processing_started_at', 'completed_at', 'page_count',
+                       'pdf_metadata', 'similarity_score', 'similar_submissions', 'extracted_text')
+    # Large columns the change list never shows
+    list_deferred_fields = ('extracted_text', 'pdf_metadata', 'similar_submissions')
+
+    def has_add_permission(self, request):
+        # Without an upload a new row would stay PENDING forever; submissions come in through the API
+        return False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.list_deferred_fields)
+        return queryset
+
+
+@admin.register(FailedTask)
+class FailedTaskAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'submission', 'exception', 'attempts', 'first_attempt_at', 'failed_at', 'requeued_at')
+    list_filter = ('task_name', 'exception', ('requeued_at', admin.EmptyFieldListFilter))
+    search_fields = ('task_id', 'message')
+    list_select_related = ('submission',)
+    readonly_fields = [field.name for field in FailedTask._meta.fields]
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected failed tasks")
+    def requeue(self, request, queryset):
+        queued = requeue_failed(queryset)
+        self.message_user(request, f"Queued {queued} task(s).", messages.SUCCESS)
\ No newline at end of file
@@ -0,0 +1,255 @@
+# submissions/admission.py
+"""
+Admission control for the submit endpoints, so a deadline surge is turned away
+early instead of piling up in waitress threads and the Celery queue:
+
+- token-bucket rate limits per client IP (before the body is parsed) and per
+  student (after validation, before anything is stored): 429 + Retry-After
+- load shedding: 503 + Retry-After while the broker queues are deeper than
+  SUBMISSION_MAX_QUEUE_DEPTH or SUBMISSION_MAX_INFLIGHT_UPLOADS requests are
+  already being handled
+- accepted submissions get their queue position and an ETA from the measured
+  processing throughput (submissions finished per second, recorded by the tasks)
+
+Buckets, in-flight slots and throughput live in Redis (SUBMISSION_ADMISSION_REDIS_URL),
+so the limits hold across every web and ASGI process. The checks are one round
+trip each (Lua scripts). If Redis is unreachable they let requests through:
+better to lose the limits than the endpoint.
+"""
+import functools
+import logging
+import math
+import random
+import time
+import uuid
+
+import redis
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import JsonResponse
+
+from .broker import queue_depths
+from .metrics import ADMISSION_REJECTED
+from .models import SubmissionStatusCount
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'admission:'
+THROUGHPUT_BUCKET = 10 # Seconds per finished-submissions counter
+QUEUE_DEPTH_TTL = 2 # Seconds a process reuses its last broker queue reading
+BROKER_TIMEOUT = 0.5 # Seconds to connect to and read from the broker for that reading
+
+# KEYS[1] bucket; ARGV rate (tokens/s), burst. Returns {allowed, seconds until a token as a string}
+TAKE_TOKEN = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1e6
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+tokens = math.min(burst, tokens + elapsed * rate)
+local allowed, wait = 0, (1 - tokens) / rate
+if tokens >= 1 then
+    allowed, wait, tokens = 1, 0, tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# KEYS[1] sorted set of in-flight requests; ARGV token, limit, stale seconds. Returns 1 if admitted.
+# Entries of processes that died mid-request are dropped once stale.
+TAKE_SLOT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1e6
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+_client = None
+_scripts = {}
+_queue_depth = (0.0, 0) # (read at, total messages) for this process
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.SUBMISSION_ADMISSION_REDIS_URL, socket_timeout=0.5)
+        _scripts['token'] = _client.register_script(TAKE_TOKEN)
+        _scripts['slot'] = _client.register_script(TAKE_SLOT)
+    return _client
+
+
+def client_ip(request):
+    """The client's address; X-Real-IP is trusted only from the proxy (SUBMISSION_TRUSTED_PROXIES)."""
+    remote = request.META.get('REMOTE_ADDR', '')
+    if remote in settings.SUBMISSION_TRUSTED_PROXIES:
+        return request.META.get('HTTP_X_REAL_IP') or remote
+    return remote
+
+
+def take_token(scope, identity, limit):
+    """
+    Takes a token from the (scope, identity) bucket; limit is (tokens per minute, burst).
+    Returns None if allowed, otherwise the seconds until the next token.
+    """
+    per_minute, burst = limit
+    _redis()
+    try:
+        allowed, wait = _scripts['token'](keys=[f'{KEY_PREFIX}bucket:{scope}:{identity}'], args=[per_minute / 60, burst])
+    except redis.RedisError as e:
+        logger.warning("Rate limiting skipped, Redis unavailable: %s", e)
+        return None
+    return None if allowed else float(wait)
+
+
+def queue_depth():
+    """
+    Messages waiting in the submission queues, re-read from the broker at most every QUEUE_DEPTH_TTL.
+    If the broker can't be read the queues count as empty for the next QUEUE_DEPTH_TTL too,
+    so an outage costs one BROKER_TIMEOUT per process every few seconds, not one per request.
+    """
+    global _queue_depth
+    read_at, depth = _queue_depth
+    if time.monotonic() - read_at > QUEUE_DEPTH_TTL:
+        _queue_depth = (time.monotonic(), depth) # Other threads keep using the last reading meanwhile
+        try:
+            depth = sum(queue_depths(timeout=BROKER_TIMEOUT).values())
+        except Exception as e:
+            logger.warning("Queue depth unavailable for load shedding: %s", e)
+            depth = 0
+        _queue_depth = (time.monotonic(), depth)
+    return depth
+
+
+def take_slot():
+    """Registers an in-flight request; returns its token, or None if SUBMISSION_MAX_INFLIGHT_UPLOADS are in flight."""
+    token = uuid.uuid4().hex
+    _redis()
+    try:
+        admitted = _scripts['slot'](keys=[f'{KEY_PREFIX}inflight'],
+                                    args=[token, settings.SUBMISSION_MAX_INFLIGHT_UPLOADS, settings.SUBMISSION_INFLIGHT_STALE])
+    except redis.RedisError as e:
+        logger.warning("In-flight limit skipped, Redis unavailable: %s", e)
+        return ''
+    return token if admitted else None
+
+
+def release_slot(token):
+    if not token:
+        return
+    try:
+        _redis().zrem(f'{KEY_PREFIX}inflight', token)
+    except redis.RedisError:
+        pass # The entry goes stale and is dropped by the next take_slot
+
+
+def record_finished(n=1):
+    """Called by the tasks for every submission that reaches COMPLETE or FAILED. Never raises."""
+    key = f'{KEY_PREFIX}finished:{int(time.time()) // THROUGHPUT_BUCKET}'
+    try:
+        with _redis().pipeline() as pipe:
+            pipe.incrby(key, n)
+            pipe.expire(key, settings.SUBMISSION_THROUGHPUT_WINDOW + THROUGHPUT_BUCKET)
+            pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not record throughput", exc_info=True)
+
+
+def throughput():
+    """Submissions finished per second over the last SUBMISSION_THROUGHPUT_WINDOW seconds."""
+    window = settings.SUBMISSION_THROUGHPUT_WINDOW
+    current = int(time.time()) // THROUGHPUT_BUCKET
+    keys = [f'{KEY_PREFIX}finished:{bucket}' for bucket in range(current - window // THROUGHPUT_BUCKET, current + 1)]
+    try:
+        finished = sum(int(n) for n in _redis().mget(keys) if n)
+    except redis.RedisError:
+        return None
+    return finished / window
+
+
+def queue_estimate():
+    """{'queue_position', 'eta_seconds'} for a just-accepted submission; the ETA is None until throughput is measured."""
+    try:
+        position = SubmissionStatusCount.objects.counts()['PENDING'] # Includes the new submission
+    except DatabaseError:
+        logger.warning("Could not read the queue position", exc_info=True)
+        return {'queue_position': None, 'eta_seconds': None} # The submission itself was accepted
+    rate = throughput()
+    return {
+        'queue_position': position,
+        'eta_seconds': math.ceil(position / rate) if rate else None,
+    }
+
+
+def reject(status, reason, message, retry_after):
+    ADMISSION_REJECTED.labels(reason).inc()
+    response = JsonResponse({'status': 'error', 'message': message, 'retry_after': retry_after}, status=status)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _shed_retry_after():
+    # Spread the retries so they don't all come back at the same moment
+    return math.ceil(settings.SUBMISSION_SHED_RETRY_AFTER * random.uniform(1, 2))
+
+
+def check_student(student_name):
+    """The per-student rate limit, checked once the form is valid; a 429 response or None."""
+    wait = take_token('student', student_name, settings.SUBMISSION_STUDENT_RATE_LIMIT)
+    if wait is not None:
+        return reject(429, 'student_rate', 'Too many submissions for this student. Please retry later.', math.ceil(wait))
+    return None
+
+
+def _admit(request):
+    """(rejection response or None, in-flight token) for a POST to a submit endpoint."""
+    wait = take_token('ip', client_ip(request), settings.SUBMISSION_IP_RATE_LIMIT)
+    if wait is not None:
+        return reject(429, 'ip_rate', 'Too many submissions from this address. Please retry later.', math.ceil(wait)), None
+    if queue_depth() >= settings.SUBMISSION_MAX_QUEUE_DEPTH:
+        return reject(503, 'queue_depth', 'The server is busy processing submissions. Please retry shortly.',
+                      _shed_retry_after()), None
+    token = take_slot()
+    if token is None:
+        return reject(503, 'inflight', 'The server is busy receiving submissions. Please retry shortly.',
+                      _shed_retry_after()), None
+    return None, token
+
+
+def admission_control(view):
+    """
+    Puts the IP rate limit and load shedding in front of a submit view (sync or async).
+    Other methods go straight to the view, which answers them with a 405.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return await view(request, *args, **kwargs)
+            rejection, token = await sync_to_async(_admit, thread_sensitive=False)(request)
+            if rejection is not None:
+                return rejection
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(release_slot, thread_sensitive=False)(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view(request, *args, **kwargs)
+            rejection, token = _admit(request)
+            if rejection is not None:
+                return rejection
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                release_slot(token)
+    return wrapper
\ No newline at end of file
@@ -0,0 +1,120 @@
+# submissions/async_submit.py
+"""
+Async variant of submit/, served by the ASGI process (uvicorn portalDC.asgi:application):
+
+    POST /submissions/submit-async/   same form fields and JSON responses as submit/
+
+Under waitress every in-flight upload holds one of a fixed number of threads while
+it writes to disk and publishes to the broker. Here the request is a coroutine:
+the multipart parse (copying, hashing and checking the PDF in the upload handler)
+runs in a worker thread, the INSERT goes through the async ORM, and the task is
+published from a worker thread (tasks.asave_and_enqueue). One event loop can then
+keep hundreds of uploads in flight, bounded by the thread pool only for the
+short stretches of blocking work.
+
+Django's ASGI handler spools the request body to a temporary file before the view
+runs, so a slow client never occupies a thread at all.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from . import admission
+from .forms import SubmissionForm
+from .tasks import asave_and_enqueue
+from .tracing import Trace
+from .uploadhandlers import StreamingPDFUploadHandler
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_body(request):
+    """Parses the multipart body through the streaming PDF handler (blocking file I/O)."""
+    upload_handler = StreamingPDFUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+    return upload_handler, request.POST, request.FILES
+
+
+@admission.admission_control
+async def async_submit_assignment_view(request):
+    """
+    Handles assignment submissions without blocking the event loop.
+    Returns the same JSON responses as submit_assignment_view, including its
+    rate limits and load shedding.
+    """
+    with Trace('http.submit_async', method=request.method) as trace:
+        response = await _submit_assignment(request, trace)
+        trace.set(status_code=response.status_code)
+        return response
+
+
+async def _submit_assignment(request, trace):
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed for this endpoint. Please use POST.'
+        }, status=405)
+
+    try:
+        # Parsing writes the file to the incoming directory; thread_sensitive=False lets
+        # several uploads be copied at once instead of queueing on one sync thread
+        with trace.phase('form_build'):
+            upload_handler, data, files = await sync_to_async(_parse_body, thread_sensitive=False)(request)
+    except Exception as e:
+        trace.fail(e)
+        logger.exception("Error while parsing an async submission")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Server error during form processing: {e}'
+        }, status=500)
+
+    if upload_handler.rejection:
+        trace.set(rejected=upload_handler.rejection)
+        return JsonResponse({
+            'status': 'error',
+            'message': upload_handler.rejection,
+            'errors': {'uploaded_file': [{'message': upload_handler.rejection, 'code': 'invalid'}]}
+        }, status=upload_handler.rejection_status)
+
+    # Validation only looks at field values and the file name: no I/O
+    with trace.phase('validation'):
+        form = SubmissionForm(data, files)
+        is_valid = form.is_valid()
+    if not is_valid:
+        errors = form.errors.get_json_data()
+        trace.set(form_errors=list(errors))
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Form validation failed.',
+            'errors': errors
+        }, status=400)
+
+    with trace.phase('admission'):
+        rejection = await sync_to_async(admission.check_student, thread_sensitive=False)(form.cleaned_data['student_name'])
+    if rejection is not None:
+        trace.set(rejected='student_rate')
+        return rejection
+
+    try:
+        submission_instance = form.save(commit=False)
+        task = await asave_and_enqueue(submission_instance, trace=trace)
+    except Exception as e:
+        trace.fail(e)
+        logger.exception("Error while saving/queuing a valid async submission")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Internal server error after validation: {e}'
+        }, status=500)
+
+    trace.set(submission_id=submission_instance.id, task_id=task.id, size=form.cleaned_data['uploaded_file'].size)
+    success_message = f"Assignment submitted successfully! ID: {submission_instance.id} (Task ID: {task.id}). Processing started."
+    with trace.phase('admission'):
+        estimate = await sync_to_async(admission.queue_estimate)()
+    return JsonResponse({
+        'status': 'success',
+        'message': success_message,
+        'submission_id': submission_instance.id,
+        'task_id': task.id,
+        **estimate,
+    }, status=201)
\ No newline at end of file
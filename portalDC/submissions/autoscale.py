@@ -0,0 +1,45 @@
+# submissions/autoscale.py
+import logging
+from time import monotonic
+
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+
+from .broker import queue_depths
+
+logger = logging.getLogger(__name__)
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    """
+    Celery's autoscaler only counts tasks this worker has already reserved. With
+    worker_prefetch_multiplier=1 that is at most one per process, so a backlog
+    never makes it grow. This version adds the number of messages waiting in the
+    queues the worker consumes, so the pool grows with queue depth up to
+    --autoscale=max and shrinks back (after the keepalive) once they drain.
+
+    Enabled through CELERY_WORKER_AUTOSCALER; prefork pool only.
+    """
+
+    depth_interval = 2.0 # Seconds between broker queries (qty is read every second)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._depth = 0
+        self._depth_checked = 0.0
+
+    def _queue_depth(self):
+        now = monotonic()
+        if now - self._depth_checked >= self.depth_interval:
+            self._depth_checked = now
+            names = list(self.worker.app.amqp.queues.consume_from)
+            try:
+                self._depth = sum(queue_depths(names, app=self.worker.app).values())
+            except Exception:
+                # Keep the last known depth; scaling must never take the worker down
+                logger.warning("Could not read queue depth for autoscaling", exc_info=True)
+        return self._depth
+
+    @property
+    def qty(self):
+        return len(state.reserved_requests) + self._queue_depth()
\ No newline at end of file
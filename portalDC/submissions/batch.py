@@ -0,0 +1,249 @@
+# submissions/batch.py
+"""
+Batch submissions, for instructors uploading a whole class in one request:
+
+    POST /submissions/batch/        multipart: a `manifest` field plus either one ZIP
+                                    archive of PDFs or several PDF file parts
+    GET  /submissions/batch/<id>/   the batch and how many of its submissions are in each status
+
+The manifest is JSON mapping file names to students, either
+{"alice.pdf": "Alice Smith", ...} or [{"file": "alice.pdf", "student_name": "Alice Smith"}, ...].
+Files are matched on their base name; folders inside the archive are ignored.
+
+Archive members are streamed one at a time into the incoming directory, so the
+archive is never unpacked in memory. Each file is validated like a single
+submission; the valid ones are created with one bulk_create and queued as one
+chord (see tasks.save_and_enqueue_batch), and the rest are reported per file.
+"""
+import hashlib
+import json
+import logging
+import os
+import zipfile
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import JsonResponse
+
+from . import admission
+from .forms import SubmissionForm
+from .models import Submission, SubmissionBatch
+from .tasks import save_and_enqueue_batch
+from .tracing import Trace
+from .uploadhandlers import PDF_MAGIC, ZIP_MAGIC, StreamedPDFUploadedFile, StreamingBatchUploadHandler
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_READ_SIZE = 64 * 1024 # Bytes copied at a time out of the archive
+
+
+def _error(message, status, **extra):
+    return JsonResponse({'status': 'error', 'message': message, **extra}, status=status)
+
+
+def parse_manifest(raw):
+    """{file name: student name} from the manifest JSON; ValueError if it is malformed."""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'Manifest is not valid JSON: {e}')
+    if isinstance(data, dict):
+        entries = data.items()
+    elif isinstance(data, list) and all(isinstance(entry, dict) for entry in data):
+        entries = [(entry.get('file'), entry.get('student_name')) for entry in data]
+    else:
+        raise ValueError('Manifest must be an object or a list of {"file", "student_name"} objects.')
+
+    manifest = {}
+    for file_name, student_name in entries:
+        if not isinstance(file_name, str) or not isinstance(student_name, str):
+            raise ValueError('Every manifest entry needs a file name and a student name.')
+        name = os.path.basename(file_name)
+        if name in manifest:
+            raise ValueError(f'{name} appears more than once in the manifest.')
+        manifest[name] = student_name
+    return manifest
+
+
+def _extract_member(archive, info):
+    """
+    Streams one archive member into the incoming directory, hashing it and enforcing
+    the PDF magic bytes and the single-upload size cap on the bytes actually read
+    (never trusting the sizes in the archive header). Returns (file, error).
+    """
+    max_size = settings.SUBMISSION_MAX_UPLOAD_SIZE
+    if info.file_size > max_size:
+        return None, f'File exceeds the {max_size // (1024 * 1024)} MB limit.'
+
+    extracted = StreamedPDFUploadedFile(os.path.basename(info.filename), 'application/pdf', 0, None)
+    hasher = hashlib.sha256()
+    size = 0
+    with archive.open(info) as member:
+        while True:
+            block = member.read(EXTRACT_READ_SIZE)
+            if not block:
+                break
+            if size == 0 and not block.startswith(PDF_MAGIC):
+                extracted.close()
+                return None, 'Unsupported file type. Only PDF files are allowed.'
+            size += len(block)
+            if size > max_size:
+                extracted.close()
+                return None, f'File exceeds the {max_size // (1024 * 1024)} MB limit.'
+            hasher.update(block)
+            extracted.write(block)
+    if size == 0:
+        extracted.close()
+        return None, 'The file is empty.'
+    extracted.seek(0)
+    extracted.size = size
+    extracted.sha256 = hasher.hexdigest()
+    return extracted, None
+
+
+def _is_zip(uploaded):
+    head = uploaded.read(len(ZIP_MAGIC))
+    uploaded.seek(0)
+    return head == ZIP_MAGIC
+
+
+def _collect_files(uploads, errors):
+    """
+    [(name, file)] from the uploaded parts, unpacking ZIP archives member by member.
+    Per-file problems are appended to errors; a broken archive or too many files
+    raises ValueError.
+    """
+    files = []
+    for uploaded in uploads:
+        if not _is_zip(uploaded):
+            files.append((os.path.basename(uploaded.name), uploaded))
+            continue
+        try:
+            with zipfile.ZipFile(uploaded) as archive:
+                for info in archive.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or name.startswith('.'):
+                        continue # Folders and OS metadata, not submissions
+                    if len(files) >= settings.SUBMISSION_BATCH_MAX_FILES:
+                        raise ValueError(f'At most {settings.SUBMISSION_BATCH_MAX_FILES} files per batch.')
+                    extracted, error = _extract_member(archive, info)
+                    if error:
+                        errors.append({'file': name, 'message': error})
+                    else:
+                        files.append((name, extracted))
+        except zipfile.BadZipFile as e:
+            raise ValueError(f'{uploaded.name} is not a valid ZIP archive: {e}')
+    if len(files) > settings.SUBMISSION_BATCH_MAX_FILES:
+        raise ValueError(f'At most {settings.SUBMISSION_BATCH_MAX_FILES} files per batch.')
+    return files
+
+
+@admission.admission_control
+def batch_submit_view(request):
+    """
+    Creates one submission per manifest entry from a single multipart request and
+    queues them together. Responds 201 with the batch id, the created submissions and
+    the files that were rejected (if any); 400 if nothing could be created.
+    The IP rate limit and load shedding apply as for submit/ (a batch is one request);
+    the per-student limit doesn't, since an instructor submits for the whole class.
+    """
+    with Trace('http.batch_submit', method=request.method) as trace:
+        response = _batch_submit(request, trace)
+        trace.set(status_code=response.status_code)
+        return response
+
+
+def _batch_submit(request, trace):
+    if request.method != 'POST':
+        return _error(f'Method {request.method} not allowed for this endpoint. Please use POST.', 405)
+
+    # Same streaming checks as submit/, but ZIP archives and a larger body are allowed
+    upload_handler = StreamingBatchUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+    with trace.phase('form_build'):
+        uploads = [f for key in request.FILES for f in request.FILES.getlist(key)]
+    files = []
+    try:
+        if upload_handler.rejection:
+            return _error(upload_handler.rejection, upload_handler.rejection_status)
+        try:
+            manifest = parse_manifest(request.POST.get('manifest', ''))
+        except ValueError as e:
+            return _error(str(e), 400)
+        if not uploads:
+            return _error('Attach a ZIP archive or one or more PDF files.', 400)
+
+        errors = []
+        with trace.phase('extract'):
+            try:
+                files = _collect_files(uploads, errors)
+            except ValueError as e:
+                return _error(str(e), 400)
+
+        submissions = []
+        sizes = []
+        seen = set()
+        with trace.phase('validation'):
+            for name, uploaded in files:
+                if name in seen:
+                    errors.append({'file': name, 'message': 'Duplicate file name in the upload.'})
+                    continue
+                seen.add(name)
+                if name not in manifest:
+                    errors.append({'file': name, 'message': 'File is not listed in the manifest.'})
+                    continue
+                form = SubmissionForm({'student_name': manifest[name]}, {'uploaded_file': uploaded})
+                if not form.is_valid():
+                    errors.append({'file': name, 'message': 'Form validation failed.', 'errors': form.errors.get_json_data()})
+                    continue
+                submissions.append(form.save(commit=False))
+                sizes.append(uploaded.size)
+            reported = seen | {error['file'] for error in errors}
+            errors += [{'file': name, 'message': 'File listed in the manifest was not uploaded.'}
+                       for name in manifest if name not in reported]
+        trace.set(files=len(files), rejected=len(errors))
+
+        if not submissions:
+            return _error('No valid submissions in the batch.', 400, errors=errors)
+
+        try:
+            batch = SubmissionBatch.objects.create(submitted_by=request.POST.get('submitted_by', '')[:100])
+            result = save_and_enqueue_batch(batch, submissions, trace=trace)
+        except Exception as e:
+            trace.fail(e)
+            logger.exception("Error while saving/queuing a batch")
+            return _error(f'Internal server error while saving the batch: {e}', 500)
+    finally:
+        for upload in uploads:
+            upload.close()
+        for _, extracted in files:
+            extracted.close()
+
+    trace.set(batch_id=batch.id, submissions=len(submissions), size=sizes)
+    return JsonResponse({
+        'status': 'success',
+        'message': f'Batch {batch.id} submitted: {len(submissions)} submission(s) queued for processing.',
+        'batch_id': batch.id,
+        'task_id': result.id,
+        'submissions': [{'id': s.id, 'student_name': s.student_name, 'task_id': s.celery_task_id} for s in submissions],
+        'errors': errors,
+    }, status=201)
+
+
+def batch_status_view(request, pk):
+    """The batch and the number of its submissions in each status (one grouped query)."""
+    if request.method != 'GET':
+        return _error(f'Method {request.method} not allowed. Please use GET.', 405)
+    batch = SubmissionBatch.objects.filter(pk=pk).first()
+    if batch is None:
+        return _error(f'Batch with ID {pk} not found.', 404)
+    counts = dict(Submission.objects.filter(batch_id=pk).values_list('status').annotate(n=Count('pk')).order_by())
+    return JsonResponse({
+        'status': 'success',
+        'batch_id': batch.id,
+        'submitted_by': batch.submitted_by,
+        'created_at': batch.created_at.isoformat(),
+        'total': batch.total,
+        'validated_at': batch.validated_at.isoformat() if batch.validated_at else None,
+        'counts': counts,
+    }, status=200)
\ No newline at end of file
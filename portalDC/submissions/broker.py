@@ -0,0 +1,32 @@
+# submissions/broker.py
+from celery import current_app
+from kombu.exceptions import ChannelError
+
+# Queues declared in settings.CELERY_TASK_QUEUES, in the order they are usually listed
+SUBMISSION_QUEUES = ('validation', 'extraction', 'similarity')
+
+
+def queue_depths(names=SUBMISSION_QUEUES, app=None, timeout=None):
+    """
+    Number of messages waiting in each named broker queue, e.g. {'extraction': 12}.
+    Uses a pooled broker connection, so it is cheap enough to call every few seconds.
+    With a timeout (seconds) it opens its own connection instead and raises at once if
+    the broker can't be reached, rather than retrying per broker_connection_max_retries.
+    """
+    app = app or current_app
+    if timeout is None:
+        connection = app.connection_or_acquire()
+    else:
+        connection = app.connection_for_read(transport_options={
+            'socket_connect_timeout': timeout, 'socket_timeout': timeout})
+    depths = {}
+    with connection as conn:
+        if timeout is not None:
+            conn.ensure_connection(max_retries=0)
+        channel = conn.default_channel
+        for name in names:
+            try:
+                depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+            except ChannelError:
+                depths[name] = 0 # Redis drops empty queues entirely
+    return depths
\ No newline at end of file
@@ -0,0 +1,161 @@
+# submissions/events.py
+"""
+Push-based status updates.
+
+process_submission publishes every status change on a Redis pub/sub channel
+(one per submission). The ASGI process runs a single StatusHub subscriber that
+fans those messages out to the Server-Sent Events streams of connected clients,
+so each client costs one idle coroutine instead of a poll every few seconds.
+
+Serve this under ASGI (uvicorn portalDC.asgi:application); under WSGI Django
+would have to buffer the endless stream.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import status_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'submission-status:'
+TERMINAL_STATUSES = ('COMPLETE', 'FAILED')
+HEARTBEAT_SECONDS = 15 # Keeps proxies from closing idle streams
+PUBLISH_TIMEOUT = 0.5 # Seconds; a stalled Redis must not hold up a task's status transition
+
+_publisher = None
+
+
+def channel(pk):
+    return f'{CHANNEL_PREFIX}{pk}'
+
+
+def publish_status(data):
+    """
+    Publishes a status payload (the same dict status/<pk>/ returns). Never raises and
+    never waits long: a missing subscriber or a stalled Redis must not fail or block
+    the task that changed the status, so the event is dropped (pollers still see it).
+    """
+    global _publisher
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(settings.SUBMISSION_EVENTS_REDIS_URL, socket_timeout=PUBLISH_TIMEOUT,
+                                              socket_connect_timeout=PUBLISH_TIMEOUT)
+        _publisher.publish(channel(data['id']), json.dumps(data))
+    except redis.RedisError:
+        logger.warning("Could not publish status event for submission %s", data['id'], exc_info=True)
+
+
+class StatusHub:
+    """
+    One pattern subscription per process, dispatching messages to per-submission
+    asyncio queues. Reconnects with backoff if Redis goes away.
+    """
+
+    def __init__(self):
+        self._listeners = defaultdict(set)
+        self._task = None
+        self._ready = None
+
+    async def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._ready = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        await self._ready.wait()
+
+    async def _run(self):
+        delay = 1
+        while True:
+            client = aioredis.Redis.from_url(settings.SUBMISSION_EVENTS_REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    delay = 1 # Events are flowing; the next loss starts the backoff over
+                    pk = int(message['channel'].decode().rsplit(':', 1)[1])
+                    data = json.loads(message['data'])
+                    for queue in self._listeners.get(pk, ()):
+                        queue.put_nowait(data)
+                logger.warning("Status event subscription ended; resubscribing in %ss", delay)
+            except (redis.RedisError, OSError):
+                logger.warning("Status event subscription lost; retrying in %ss", delay, exc_info=True)
+                self._ready.set() # Let streams run (heartbeats only) instead of hanging
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+            # Also after a clean end (e.g. the server closed the connection), or this would spin
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    @asynccontextmanager
+    async def listen(self, pk):
+        await self._ensure_running()
+        queue = asyncio.Queue()
+        self._listeners[pk].add(queue)
+        try:
+            yield queue
+        finally:
+            self._listeners[pk].discard(queue)
+            if not self._listeners[pk]:
+                del self._listeners[pk]
+
+
+hub = StatusHub()
+
+
+def _sse(data):
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+async def _status_stream(pk):
+    async with hub.listen(pk) as queue:
+        # Read the current status only after listening, so no change can slip in between
+        entry = await sync_to_async(status_cache.get_entry)(pk)
+        if entry is None:
+            return
+        yield _sse(entry['data'])
+        status = entry['data']['status']
+        while status not in TERMINAL_STATUSES:
+            try:
+                data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            status = data['status']
+            yield _sse(data)
+
+
+async def submission_events_view(request, pk):
+    """
+    GET events/<pk>/ -- Server-Sent Events stream of a submission's status. Sends the
+    current status immediately, then every change, and ends after COMPLETE/FAILED.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed. Please use GET.'
+        }, status=405)
+
+    entry = await sync_to_async(status_cache.get_entry)(pk)
+    if entry is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Submission with ID {pk} not found.'
+        }, status=404)
+
+    response = StreamingHttpResponse(_status_stream(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Don't let a proxy buffer the stream
+    return response
\ No newline at end of file
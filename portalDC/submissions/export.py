@@ -0,0 +1,185 @@
+# submissions/export.py
+"""
+Streaming ZIP export of submissions, for graders:
+
+    GET export/?status=COMPLETE&since=2026-05-01&until=2026-05-31   (staff only)
+    manage.py export_submissions --status COMPLETE --output grades.zip
+
+The archive holds every matching PDF as submissions/<student>/<id>-<file name>,
+stored uncompressed (PDFs barely compress), followed by manifest.csv with one row
+per submission. It is written while it is sent: rows are read in batches of
+SUBMISSION_EXPORT_BATCH with iterator(), each file is copied from its storage tier
+in FILE_CHUNK pieces, and zipfile writes to a sink the response drains after
+every piece. Memory stays constant and nothing touches the disk, however large
+the export; the only state kept is the array of exported ids (8 bytes each) for
+the manifest.
+"""
+import csv
+import io
+import logging
+import os
+import zipfile
+from array import array
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Submission, submission_upload_path
+from .storage import get_submission_storage
+
+logger = logging.getLogger(__name__)
+
+FILE_CHUNK = 1024 * 1024 # Bytes copied (and sent) at a time
+MANIFEST_FIELDS = ('id', 'student_name', 'status', 'submitted_at', 'completed_at', 'page_count',
+                   'similarity_score', 'blob_id')
+MANIFEST_HEADER = ['id', 'student_name', 'status', 'submitted_at', 'completed_at', 'page_count',
+                   'similarity_score', 'sha256', 'file']
+
+
+def parse_bound(value, end=False):
+    """
+    An aware datetime from an ISO date or datetime. A bare date is the start of that
+    day, or with end=True the start of the next one (so until=<date> includes the day).
+    Raises ValueError if the value is neither.
+    """
+    day = parse_date(value) # First: parse_datetime also accepts a bare date, as midnight
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"not an ISO date or datetime: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(statuses=None, student_name=None, since=None, until=None):
+    """Submissions to export: status in `statuses`, submitted in [since, until)."""
+    rows = Submission.objects.all()
+    if statuses:
+        rows = rows.filter(status__in=statuses)
+    if student_name:
+        rows = rows.filter(student_name=student_name)
+    if since is not None:
+        rows = rows.filter(submitted_at__gte=since)
+    if until is not None:
+        rows = rows.filter(submitted_at__lt=until)
+    return rows
+
+
+def archive_name(submission_id, student_name, file_name):
+    # Same layout as the old mediafiles/submissions/<student>/ tree; the id keeps resubmissions apart
+    instance = Submission(student_name=student_name)
+    return submission_upload_path(instance, f'{submission_id}-{os.path.basename(file_name)}')
+
+
+class _Sink:
+    """Write-only file for ZipFile; the bytes written so far are taken with pop()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def _zip_info(name, moment):
+    info = zipfile.ZipInfo(name, date_time=timezone.localtime(moment).timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return info
+
+
+def stream_archive(queryset):
+    """Yields the ZIP of the given submissions, piece by piece (see the module docstring)."""
+    storage = get_submission_storage()
+    sink = _Sink()
+    exported = array('q')
+    missing = set()
+    # Not seekable: zipfile writes each entry's sizes in a data descriptor after its bytes
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        files = (queryset.exclude(uploaded_file='').order_by('pk')
+                 .only('id', 'student_name', 'uploaded_file', 'file_name', 'submitted_at'))
+        for submission in files.iterator(chunk_size=settings.SUBMISSION_EXPORT_BATCH):
+            name = submission.uploaded_file.name
+            try:
+                source = storage.open(name)
+            except OSError:
+                logger.warning("Export: file of submission %s is missing (%s)", submission.id, name)
+                missing.add(submission.id)
+                exported.append(submission.id)
+                continue
+            entry = _zip_info(archive_name(submission.id, submission.student_name, submission.file_name or name),
+                              submission.submitted_at)
+            with source, archive.open(entry, 'w') as dest:
+                while chunk := source.read(FILE_CHUNK):
+                    dest.write(chunk)
+                    yield from sink.pop()
+            exported.append(submission.id)
+            yield from sink.pop()
+
+        manifest = _zip_info('manifest.csv', timezone.now())
+        manifest.compress_type = zipfile.ZIP_DEFLATED # Text; unlike the PDFs it compresses well
+        with archive.open(manifest, 'w') as dest:
+            line = io.StringIO()
+            writer = csv.writer(line)
+            writer.writerow(MANIFEST_HEADER)
+            batch = settings.SUBMISSION_EXPORT_BATCH
+            for start in range(0, len(exported), batch):
+                rows = (Submission.objects.filter(pk__in=exported[start:start + batch].tolist()).order_by('pk')
+                        .values_list(*MANIFEST_FIELDS, 'file_name', 'uploaded_file'))
+                for *fields, file_name, uploaded_file in rows:
+                    pk, student_name = fields[0], fields[1]
+                    path = '' if pk in missing else archive_name(pk, student_name, file_name or uploaded_file)
+                    writer.writerow([value.isoformat() if isinstance(value, datetime) else value
+                                     for value in fields] + [path])
+                dest.write(line.getvalue().encode('utf-8'))
+                line.seek(0)
+                line.truncate()
+                yield from sink.pop()
+            dest.write(line.getvalue().encode('utf-8')) # The header of an empty export
+    yield from sink.pop() # The central directory
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def export_view(request):
+    """
+    GET export/?status=...&student_name=...&since=...&until=... -- a ZIP of the matching
+    submissions plus manifest.csv, streamed (staff only; log in through the admin).
+    status may be repeated or comma-separated; since/until are ISO dates or datetimes.
+    """
+    if request.method != 'GET':
+        return _error(f'Method {request.method} not allowed. Please use GET.', 405)
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    if not request.user.is_staff:
+        return _error('Only staff may export submissions.', 403)
+
+    statuses = [status for value in request.GET.getlist('status') for status in value.split(',') if status]
+    known = {status for status, _ in Submission.STATUS_CHOICES}
+    if not set(statuses) <= known:
+        return _error(f'Unknown status; use one of {", ".join(sorted(known))}.', 400)
+    try:
+        since = parse_bound(request.GET['since']) if request.GET.get('since') else None
+        until = parse_bound(request.GET['until'], end=True) if request.GET.get('until') else None
+    except ValueError as e:
+        return _error(f'Invalid date range: {e}', 400)
+
+    queryset = export_queryset(statuses, request.GET.get('student_name'), since, until)
+    response = StreamingHttpResponse(stream_archive(queryset), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="submissions-{timezone.now():%Y%m%d-%H%M%S}.zip"'
+    return response
\ No newline at end of file
@@ -0,0 +1,139 @@
+# submissions/management/commands/bench_db_writes.py
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+
+TABLE = 'bench_db_writes'
+ALIAS = 'bench'
+
+
+def _use_database(db):
+    """Registers `db` under the ALIAS connection name in this process."""
+    if ALIAS in connections.settings:
+        # Forget the connection made for the previous configuration (also inherited by fork)
+        connections[ALIAS].close()
+        del connections[ALIAS]
+    connections.settings[ALIAS] = connections.configure_settings({'default': {}, ALIAS: dict(db)})[ALIAS]
+
+
+def _writer(db, writes, results):
+    """
+    One simulated web/worker process. Each iteration is the submission hot path:
+    an INSERT (submit) followed by a read-then-update transaction (a status change),
+    with the connection released in between as Django does at the end of a request.
+    """
+    _use_database(db)
+    connection = connections[ALIAS]
+    latencies, errors = [], 0
+    for i in range(writes):
+        start = time.perf_counter()
+        try:
+            with transaction.atomic(using=ALIAS), connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {TABLE} (status, counter) VALUES (%s, %s) RETURNING id", ['PENDING', 0])
+                row_id = cursor.fetchone()[0]
+            with transaction.atomic(using=ALIAS), connection.cursor() as cursor:
+                cursor.execute(f"SELECT counter FROM {TABLE} WHERE id = %s", [row_id])
+                counter = cursor.fetchone()[0]
+                cursor.execute(f"UPDATE {TABLE} SET status = %s, counter = %s WHERE id = %s AND status = %s",
+                               ['COMPLETE', counter + 1, row_id, 'PENDING'])
+            latencies.append(time.perf_counter() - start)
+        except DatabaseError:
+            errors += 1 # e.g. "database is locked"
+        connection.close_if_unusable_or_obsolete()
+    connection.close()
+    results.put((latencies, errors))
+
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1] if len(values) > 1 else (values or [0])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent write benchmark for the configured database: several processes run "
+        "the submission insert/status-update cycle at once. SQLite runs against a "
+        "temporary file, never db.sqlite3; PostgreSQL uses a scratch table that is "
+        "dropped afterwards. --compare also runs it with the backend's untuned defaults."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help="Concurrent writer processes (default: 4).")
+        parser.add_argument('--writes', type=int, default=200, help="Insert/update cycles per process (default: 200).")
+        parser.add_argument('--compare', action='store_true', help="Also run with untuned settings.")
+
+    def _configurations(self, compare):
+        tuned = dict(settings.DATABASES['default'])
+        configurations = [('configured', tuned)]
+        if compare:
+            if tuned['ENGINE'].endswith('sqlite3'):
+                # Rollback journal, full fsync, deferred transactions, 5s busy timeout
+                configurations.insert(0, ('sqlite defaults', {**tuned, 'OPTIONS': {}}))
+            else:
+                # A new connection per request, no pool
+                configurations.insert(0, ('no pooling', {**tuned, 'CONN_MAX_AGE': 0, 'OPTIONS': {}}))
+        return configurations
+
+    def _prepare(self, db):
+        if db['ENGINE'].endswith('sqlite3'):
+            handle, db['NAME'] = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+            id_column = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+        else:
+            id_column = 'BIGSERIAL PRIMARY KEY'
+        _use_database(db)
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            cursor.execute(f"CREATE TABLE {TABLE} (id {id_column}, status VARCHAR(10) NOT NULL, counter INTEGER NOT NULL)")
+        connections[ALIAS].close()
+
+    def _cleanup(self, db):
+        if db['ENGINE'].endswith('sqlite3'):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db['NAME'] + suffix):
+                    os.remove(db['NAME'] + suffix)
+        else:
+            _use_database(db)
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            connections[ALIAS].close()
+
+    def _run(self, db, processes, writes):
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_writer, args=(db, writes, results)) for _ in range(processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+        latencies = sorted(latency for worker_latencies, _ in outcomes for latency in worker_latencies)
+        return {
+            'elapsed': elapsed,
+            'ok': len(latencies),
+            'errors': sum(errors for _, errors in outcomes),
+            'p50': _percentile(latencies, 50) * 1000,
+            'p95': _percentile(latencies, 95) * 1000,
+            'p99': _percentile(latencies, 99) * 1000,
+        }
+
+    def handle(self, *args, **options):
+        processes, writes = options['processes'], options['writes']
+        self.stdout.write(f"{processes} processes x {writes} insert/update cycles")
+        for label, db in self._configurations(options['compare']):
+            self._prepare(db)
+            try:
+                stats = self._run(db, processes, writes)
+            finally:
+                self._cleanup(db)
+            self.stdout.write(
+                f"{label:>16}: {stats['ok'] / stats['elapsed']:8.1f} cycles/s, "
+                f"p50 {stats['p50']:.1f}ms p95 {stats['p95']:.1f}ms p99 {stats['p99']:.1f}ms, "
+                f"{stats['errors']} failed ({stats['errors'] / (processes * writes):.1%})"
+            )
\ No newline at end of file
@@ -0,0 +1,302 @@
+# submissions/management/commands/bench_submissions.py
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+WORDS = ('essay', 'analysis', 'theory', 'results', 'method', 'student', 'section', 'argument',
+         'evidence', 'figure', 'model', 'data', 'history', 'system', 'design', 'review')
+
+# (section, metric, higher is better) compared against a baseline run
+COMPARED = [
+    ('submit', 'throughput', True), ('submit', 'p50', False), ('submit', 'p95', False), ('submit', 'p99', False),
+    ('status', 'throughput', True), ('status', 'p50', False), ('status', 'p95', False), ('status', 'p99', False),
+    ('e2e', 'throughput', True), ('e2e', 'p50', False), ('e2e', 'p95', False), ('e2e', 'p99', False),
+]
+
+
+def synthetic_pdf(size, pages, seed):
+    """A valid PDF of roughly `size` bytes: `pages` pages of pseudo-random words (extractable text)."""
+    rng = random.Random(seed)
+    page_bytes = max(size // pages, 100)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{3 + 2 * i} 0 R' for i in range(pages))
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {pages} >>'.encode())
+    font = 3 + 2 * pages
+    for i in range(pages):
+        lines, length = [], 0
+        while length < page_bytes:
+            line = ' '.join(rng.choice(WORDS) for _ in range(12))
+            lines.append(f"({line}) '")
+            length += len(line) + 4
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {' '.join(lines)} ET".encode()
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {font} 0 R >> >> >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _multipart(fields, file_field, file_name, content):
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+                 f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def _request(url, data=None, headers=None, timeout=60):
+    """(status, headers, body, seconds); status 0 when the server could not be reached."""
+    request = urllib.request.Request(url, data=data, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, response_headers, body = response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e: # Includes 304 Not Modified
+        status, response_headers, body = e.code, e.headers, e.read()
+    except OSError:
+        status, response_headers, body = 0, {}, b''
+    return status, response_headers, body, time.perf_counter() - start
+
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1] if len(values) > 1 else (values or [0])[0]
+
+
+def _summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50': _percentile(latencies, 50) * 1000,
+        'p95': _percentile(latencies, 95) * 1000,
+        'p99': _percentile(latencies, 99) * 1000,
+    }
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass # One line per request would drown the report
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test for the submission hot paths: concurrent submit/ uploads of synthetic PDFs, "
+        "then concurrent status/<pk>/ polling (with ETags) until every submission is COMPLETE. "
+        "Reports p50/p95/p99 latency and throughput for both endpoints and the end-to-end "
+        "submitted-to-COMPLETE time. Without --url it runs offline: an in-process threaded "
+        "WSGI server, a temporary SQLite database and MEDIA_ROOT, the in-memory Celery broker "
+        "and one in-process worker (so compare offline end-to-end numbers with each other, "
+        "not with production). --save writes the results as JSON; --baseline compares "
+        "against a saved run and fails if a metric regressed by more than --tolerance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Benchmark a running deployment (e.g. http://localhost) instead of offline. "
+                                          "Creates real submissions.")
+        parser.add_argument('--submissions', type=int, default=50, help="Uploads to make (default: 50).")
+        parser.add_argument('--concurrency', type=int, default=10, help="Concurrent clients (default: 10).")
+        parser.add_argument('--pdf-kb', type=int, default=128, help="Size of each synthetic PDF in KB (default: 128).")
+        parser.add_argument('--pages', type=int, default=4, help="Pages per synthetic PDF (default: 4).")
+        parser.add_argument('--poll-interval', type=float, default=0.2, help="Seconds between status polls (default: 0.2).")
+        parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for every submission to finish.")
+        parser.add_argument('--save', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="JSON file from an earlier --save to compare against.")
+        parser.add_argument('--tolerance', type=float, default=0.10,
+                            help="Allowed relative regression per metric before failing (default: 0.10).")
+
+    @contextmanager
+    def _offline(self):
+        """Temporary database, media directory, broker and worker; yields the server's base URL."""
+        from celery.contrib.testing.worker import start_worker
+        from portalDC.celery import app
+
+        media = tempfile.mkdtemp(prefix='bench-submissions-')
+        overrides = {'MEDIA_ROOT': media, 'ALLOWED_HOSTS': ['127.0.0.1'],
+                     'CELERY_BROKER_URL': 'memory://', 'CELERY_RESULT_BACKEND': 'cache+memory://'}
+        for name in dir(settings):
+            value = getattr(settings, name)
+            if name.startswith('SUBMISSION') and isinstance(value, str) and value.startswith(str(settings.MEDIA_ROOT)):
+                overrides[name] = value.replace(str(settings.MEDIA_ROOT), media, 1)
+        connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(media, 'bench.sqlite3')
+        # Status events go to Redis pub/sub, which isn't there offline; that is expected
+        logging.getLogger('submissions.events').setLevel(logging.ERROR)
+
+        with override_settings(**overrides):
+            # The in-memory stand-ins poll where Redis would push: the transport checks for messages
+            # every second and chords without a Redis backend re-check their header every second.
+            # Poll far more often so hops aren't rounded up to whole seconds.
+            app.conf.update(broker_url='memory://', result_backend='cache+memory://',
+                            broker_transport_options={'polling_interval': 0.01}, result_chord_retry_interval=0.05)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                # Solo: tasks run on the consumer thread. A threads pool hands acks back to the
+                # consumer loop, which only runs every 2s with a polled transport; and extraction
+                # is GIL-bound in one process either way.
+                with start_worker(app, pool='solo', perform_ping_check=False,
+                                  queues=[queue.name for queue in settings.CELERY_TASK_QUEUES], shutdown_timeout=30):
+                    yield f'http://127.0.0.1:{server.server_port}'
+            finally:
+                server.shutdown()
+                server.server_close()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                shutil.rmtree(media, ignore_errors=True)
+
+    def _submit_phase(self, base_url, pdfs, concurrency):
+        run = uuid.uuid4().hex[:8]
+
+        def submit(i):
+            body, content_type = _multipart({'student_name': f'bench-{run}-{i}'}, 'uploaded_file', f'bench-{i}.pdf', pdfs[i])
+            status, _, response, seconds = _request(f'{base_url}/submissions/submit/', body, {'Content-Type': content_type})
+            submission_id = json.loads(response)['submission_id'] if status == 201 else None
+            return submission_id, seconds
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(submit, range(len(pdfs))))
+        elapsed = time.perf_counter() - start
+        ids = [submission_id for submission_id, _ in outcomes if submission_id is not None]
+        return ids, _summary([seconds for submission_id, seconds in outcomes if submission_id is not None],
+                             len(outcomes) - len(ids), elapsed)
+
+    def _status_phase(self, base_url, ids, concurrency, interval, timeout):
+        """Polls every pending submission each round, like the frontend does, until all have finished."""
+        etags, finished, latencies, errors = {}, {}, [], 0
+
+        def poll(pk):
+            headers = {'If-None-Match': etags[pk]} if pk in etags else {}
+            status, response_headers, body, seconds = _request(f'{base_url}/submissions/status/{pk}/', headers=headers)
+            return pk, status, response_headers, body, seconds
+
+        start = time.perf_counter()
+        pending = list(ids)
+        with ThreadPoolExecutor(concurrency) as executor:
+            while pending and time.perf_counter() - start < timeout:
+                for pk, status, response_headers, body, seconds in executor.map(poll, pending):
+                    if status not in (200, 304):
+                        errors += 1
+                        continue
+                    latencies.append(seconds)
+                    if status == 200:
+                        etags[pk] = response_headers.get('ETag')
+                        data = json.loads(body)
+                        if data['status'] in ('COMPLETE', 'FAILED'):
+                            finished[pk] = data
+                pending = [pk for pk in pending if pk not in finished]
+                time.sleep(interval)
+        return finished, len(pending), _summary(latencies, errors, time.perf_counter() - start)
+
+    def _e2e(self, finished, timed_out):
+        """Submitted-to-COMPLETE times from the server's own timestamps (not limited by the poll interval)."""
+        completed = [data for data in finished.values() if data['status'] == 'COMPLETE' and data['completed_at']]
+        durations = [(parse_datetime(d['completed_at']) - parse_datetime(d['submitted_at'])).total_seconds() for d in completed]
+        span = 0
+        if completed:
+            first = min(parse_datetime(d['submitted_at']) for d in completed)
+            last = max(parse_datetime(d['completed_at']) for d in completed)
+            span = (last - first).total_seconds()
+        summary = _summary(durations, len(finished) - len(completed), span)
+        summary['timed_out'] = timed_out
+        return summary
+
+    def _compare(self, results, baseline, tolerance):
+        regressions = []
+        self.stdout.write(f"\nCompared with {baseline.get('started', 'baseline')} (tolerance {tolerance:.0%}):")
+        for section, metric, higher_is_better in COMPARED:
+            old, new = baseline.get(section, {}).get(metric), results[section][metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  REGRESSION'
+                regressions.append(f'{section} {metric}')
+            self.stdout.write(f"  {section:>6} {metric:<10} {old:10.1f} -> {new:10.1f} ({change:+.1%}){flag}")
+        return regressions
+
+    def _report(self, results):
+        self.stdout.write(f"{results['submissions']} uploads of {results['pdf_kb']} KB, {results['concurrency']} concurrent clients")
+        for section, label, unit in (('submit', 'submit/', 'req/s'), ('status', 'status/<pk>/', 'req/s'),
+                                     ('e2e', 'submit -> COMPLETE', 'done/s')):
+            stats = results[section]
+            self.stdout.write(
+                f"{label:>20}: {stats['throughput']:8.1f} {unit}, p50 {stats['p50']:.1f}ms "
+                f"p95 {stats['p95']:.1f}ms p99 {stats['p99']:.1f}ms, {stats['count']} ok, {stats['errors']} failed"
+                + (f", {stats['timed_out']} timed out" if stats.get('timed_out') else '')
+            )
+
+    def handle(self, *args, **options):
+        count, concurrency = options['submissions'], options['concurrency']
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        # Generated before the clock starts; distinct text so dedup and similarity see real work
+        pdfs = [synthetic_pdf(options['pdf_kb'] * 1024, options['pages'], seed=i) for i in range(count)]
+
+        environment = nullcontext(options['url'].rstrip('/')) if options['url'] else self._offline()
+        with environment as base_url:
+            ids, submit = self._submit_phase(base_url, pdfs, concurrency)
+            if not ids:
+                raise CommandError(f"Every upload to {base_url}/submissions/submit/ failed.")
+            finished, timed_out, status = self._status_phase(base_url, ids, concurrency, options['poll_interval'], options['timeout'])
+
+        results = {
+            'started': timezone.now().isoformat(),
+            'target': options['url'] or 'offline',
+            'submissions': count,
+            'concurrency': concurrency,
+            'pdf_kb': options['pdf_kb'],
+            'submit': submit,
+            'status': status,
+            'e2e': self._e2e(finished, timed_out),
+        }
+        self._report(results)
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['save']}")
+        if baseline is not None:
+            regressions = self._compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(f"Regressed beyond {options['tolerance']:.0%}: {', '.join(regressions)}")
+            self.stdout.write(self.style.SUCCESS("No regressions."))
\ No newline at end of file
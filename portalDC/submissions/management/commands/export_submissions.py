@@ -0,0 +1,42 @@
+# submissions/management/commands/export_submissions.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from submissions.export import export_queryset, parse_bound, stream_archive
+from submissions.models import Submission
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes a ZIP of submissions (the PDFs plus manifest.csv) to a file or stdout, "
+        "streamed from storage in constant memory; the same archive as the export/ endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', required=True, help="ZIP file to write, or - for stdout.")
+        parser.add_argument('--status', action='append', choices=[status for status, _ in Submission.STATUS_CHOICES],
+                            help="Only submissions in this status (repeatable).")
+        parser.add_argument('--student-name', help="Only this student's submissions.")
+        parser.add_argument('--since', help="Submitted at or after this ISO date/datetime.")
+        parser.add_argument('--until', help="Submitted before this ISO datetime, or on or before this ISO date.")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_bound(options['since']) if options['since'] else None
+            until = parse_bound(options['until'], end=True) if options['until'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date range: {e}")
+        queryset = export_queryset(options['status'], options['student_name'], since, until)
+
+        written = 0
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in stream_archive(queryset):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if options['output'] != '-':
+            self.stderr.write(f"Wrote {written / 2**20:.1f} MB to {options['output']}.")
\ No newline at end of file
@@ -0,0 +1,54 @@
+# submissions/management/commands/measure_throughput.py
+import time
+
+from celery import group
+from django.core.management.base import BaseCommand, CommandError
+
+from portalDC.celery import app
+from submissions.broker import queue_depths
+from submissions.tasks import throughput_probe
+
+
+class Command(BaseCommand):
+    help = (
+        "Queues a burst of CPU-bound probe tasks on one queue and reports how fast the "
+        "running workers drain it. Run it again after changing the number of workers "
+        "(or --autoscale limits) to see how throughput scales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='extraction', help="Queue to measure (default: extraction).")
+        parser.add_argument('--tasks', type=int, default=200, help="Number of probe tasks (default: 200).")
+        parser.add_argument('--work-ms', type=int, default=50, help="CPU time per task in ms (default: 50).")
+        parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for all results.")
+
+    def _workers(self, queue):
+        """{worker hostname: max pool size} for the workers consuming the queue."""
+        inspect = app.control.inspect(timeout=2)
+        active = inspect.active_queues() or {}
+        stats = inspect.stats() or {}
+        consumers = [name for name, queues in active.items() if any(q['name'] == queue for q in queues)]
+        return {name: stats.get(name, {}).get('pool', {}).get('max-concurrency') for name in consumers}
+
+    def handle(self, *args, **options):
+        queue, count, work_ms = options['queue'], options['tasks'], options['work_ms']
+        workers = self._workers(queue)
+        if not workers:
+            raise CommandError(f"No running worker consumes the '{queue}' queue.")
+        if queue_depths([queue])[queue]:
+            self.stderr.write(self.style.WARNING(f"'{queue}' already has queued messages; results will be skewed."))
+
+        for name, concurrency in sorted(workers.items()):
+            self.stdout.write(f"  {name}: max concurrency {concurrency}")
+
+        start = time.perf_counter()
+        result = group(throughput_probe.s(work_ms) for _ in range(count)).apply_async(queue=queue)
+        result.get(timeout=options['timeout'], disable_sync_subtasks=False)
+        elapsed = time.perf_counter() - start
+
+        ideal = sum(c or 1 for c in workers.values()) * 1000 / work_ms # Tasks/s with zero overhead
+        throughput = count / elapsed
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} tasks of {work_ms}ms on '{queue}' with {len(workers)} worker(s): "
+            f"{elapsed:.2f}s, {throughput:.1f} tasks/s ({throughput / ideal:.0%} of ideal {ideal:.1f}/s)"
+        ))
\ No newline at end of file
@@ -0,0 +1,78 @@
+# submissions/management/commands/profile_report.py
+import glob
+import io
+import json
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregates the slow-request captures written by ProfilingMiddleware "
+        "(SUBMISSION_PROFILE_DIR): the slowest requests with their SQL/CPU/waiting "
+        "breakdown, then the top-N hot functions across all of their profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Capture directory (default: SUBMISSION_PROFILE_DIR).")
+        parser.add_argument('--view', help="Only captures of this view name (e.g. submission_status).")
+        parser.add_argument('--since', help="Only captures started at or after this ISO datetime.")
+        parser.add_argument('--top', type=int, default=25, help="Functions to list (default: 25).")
+        parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                            help="pstats sort key (default: cumulative).")
+
+    def _captures(self, directory, view, since):
+        """[(summary, .prof path or None)] matching the filters, slowest first."""
+        captures = []
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            with open(path) as f:
+                summary = json.load(f)
+            if view and summary['view'] != view:
+                continue
+            if since and parse_datetime(summary['started']) < since:
+                continue
+            profile = path[:-len('.json')] + '.prof'
+            # No .prof: the request overlapped another profiled one
+            captures.append((summary, profile if os.path.exists(profile) else None))
+        return sorted(captures, key=lambda capture: capture[0]['wall_ms'], reverse=True)
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.SUBMISSION_PROFILE_DIR
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"--since: not an ISO datetime: {options['since']}")
+        if not os.path.isdir(directory):
+            raise CommandError(f"No captures: {directory} does not exist (is SUBMISSION_PROFILE_SAMPLE_RATE > 0?).")
+
+        captures = self._captures(directory, options['view'], since)
+        if not captures:
+            raise CommandError("No captures match.")
+
+        self.stdout.write(f"{len(captures)} slow request(s) in {directory}; slowest:")
+        for summary, _ in captures[:10]:
+            self.stdout.write(
+                f"  {summary['wall_ms']:8.0f}ms {summary['method']} {summary['path']} -> {summary['status']}: "
+                f"sql {summary['sql_ms']:.0f}ms/{summary['queries']}q, cpu {summary['cpu_ms']:.0f}ms, "
+                f"waiting {summary['waiting_ms']:.0f}ms, peak alloc {summary['alloc_peak_bytes'] // 1024} KB"
+            )
+            if summary['slowest_queries']:
+                query = summary['slowest_queries'][0]
+                self.stdout.write(f"             slowest query {query['ms']:.1f}ms: {query['sql'][:150]}")
+
+        profiles = [profile for _, profile in captures if profile]
+        if not profiles:
+            self.stdout.write("\nNone of these requests has a profile.")
+            return
+        # pstats merges the profiles, summing calls and times per function
+        output = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=output)
+        stats.files = [] # Don't list every capture file in the header
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(f"\nTop {options['top']} functions by {options['sort']} across {len(profiles)} profile(s):")
+        self.stdout.write(output.getvalue())
\ No newline at end of file
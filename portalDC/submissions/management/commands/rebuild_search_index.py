@@ -0,0 +1,16 @@
+# submissions/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from submissions import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search index from the extracted text of every submission. "
+        "The index is maintained as submissions complete; run this after changing "
+        "SUBMISSION_SEARCH_CONFIG or to repair it."
+    )
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} submission(s)."))
\ No newline at end of file
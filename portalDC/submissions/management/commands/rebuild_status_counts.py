@@ -0,0 +1,18 @@
+# submissions/management/commands/rebuild_status_counts.py
+from django.core.management.base import BaseCommand
+
+from submissions.models import ALL_STUDENTS, SubmissionStatusCount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the per-student/per-status submission counters from the Submission "
+        "table. The counters are maintained incrementally; run this only to repair drift "
+        "(e.g. after editing rows by hand)."
+    )
+
+    def handle(self, *args, **options):
+        SubmissionStatusCount.objects.rebuild()
+        counts = SubmissionStatusCount.objects.counts(ALL_STUDENTS)
+        summary = ', '.join(f"{status}: {n}" for status, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt submission counters ({summary})."))
\ No newline at end of file
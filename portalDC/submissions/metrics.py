@@ -0,0 +1,167 @@
+# submissions/metrics.py
+"""
+Prometheus metrics, served at /metrics.
+
+Histograms are recorded where the work happens:
+
+- MetricsMiddleware times every request per view and counts its database queries
+  (and the time spent in them)
+- every Trace (views and tasks) records its total duration and each phase's when
+  it ends, so the phases already traced (file_save, enqueue, db_update,
+  extraction, ...) show whether a slowdown is disk, database or broker
+
+With PROMETHEUS_MULTIPROC_DIR set (runservers.py sets it for every child), each
+waitress, uvicorn and Celery process writes its samples to files in that
+directory and /metrics adds them all up, so one scrape of any web worker covers
+every process.
+
+Submissions by status and queue depths are read when /metrics is scraped instead
+(from SubmissionStatusCount and the broker), so they cost nothing on the hot path.
+"""
+import logging
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = tuple(16 * 1024 * 4 ** n for n in range(9)) # 16 KB .. 1 GB
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_SECONDS = Histogram('portal_http_request_duration_seconds', 'Time to build the response, per view.',
+                            ['view', 'method', 'status'], buckets=LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram('portal_http_request_db_queries', 'Database queries per request, per view.',
+                            ['view'], buckets=QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram('portal_http_request_db_seconds', 'Time spent in database queries per request, per view.',
+                               ['view'], buckets=LATENCY_BUCKETS)
+UPLOAD_BYTES = Histogram('portal_upload_bytes', 'Size of uploaded submission files.', ['trace'], buckets=SIZE_BUCKETS)
+TRACE_SECONDS = Histogram('portal_trace_duration_seconds', 'Duration of traced requests and tasks.',
+                          ['trace'], buckets=LATENCY_BUCKETS)
+PHASE_SECONDS = Histogram('portal_trace_phase_duration_seconds', 'Time spent in each phase of traced requests and tasks.',
+                          ['trace', 'phase'], buckets=LATENCY_BUCKETS)
+TRACE_ERRORS = Counter('portal_trace_errors_total', 'Traced requests and tasks that ended with an error.', ['trace'])
+ADMISSION_REJECTED = Counter('portal_admission_rejected_total', 'Submissions turned away by rate limits or load shedding.',
+                             ['reason'])
+
+
+def observe_trace(trace, duration):
+    """Called by Trace.emit for every trace, sampled out of the logs or not."""
+    TRACE_SECONDS.labels(trace.name).observe(duration)
+    for name, ms in trace.phases.items():
+        PHASE_SECONDS.labels(trace.name, name).observe(ms / 1000)
+    size = trace.fields.get('size') # Bytes of the uploaded file; a list of them for a batch
+    for upload_size in size if isinstance(size, list) else [size]:
+        if isinstance(upload_size, int):
+            UPLOAD_BYTES.labels(trace.name).observe(upload_size)
+    if trace.error is not None:
+        TRACE_ERRORS.labels(trace.name).inc()
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper that counts queries and the time spent in them;
+    with keep=N it also remembers the N slowest as (seconds, sql).
+    """
+
+    def __init__(self, keep=0):
+        self.count = 0
+        self.seconds = 0.0
+        self.keep = keep
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.keep:
+                self.slowest = sorted(self.slowest + [(elapsed, sql)], key=lambda q: q[0], reverse=True)[:self.keep]
+
+
+def view_name(request):
+    match = request.resolver_match
+    return match.view_name if match is not None else 'unresolved'
+
+
+class MetricsMiddleware:
+    """
+    Records REQUEST_SECONDS for every request, and REQUEST_QUERIES/REQUEST_DB_SECONDS
+    for sync views. Streaming responses are timed up to the first byte. Async views
+    run their queries on other threads' connections, so they get latency only.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        view = view_name(request)
+        REQUEST_SECONDS.labels(view, request.method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_SECONDS.labels(view).observe(queries.seconds)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        REQUEST_SECONDS.labels(view_name(request), request.method, response.status_code).observe(time.perf_counter() - start)
+        return response
+
+
+class SnapshotCollector:
+    """Gauges read at scrape time: submissions per status (SubmissionStatusCount) and broker queue depths."""
+
+    def describe(self):
+        return [] # Don't collect (and query) at registration
+
+    def collect(self):
+        from .broker import queue_depths
+        from .models import SubmissionStatusCount
+
+        statuses = GaugeMetricFamily('portal_submissions', 'Submissions by status.', labels=['status'])
+        for status, count in SubmissionStatusCount.objects.counts().items():
+            statuses.add_metric([status], count)
+        yield statuses
+
+        depths = GaugeMetricFamily('portal_queue_depth', 'Messages waiting in each Celery queue.', labels=['queue'])
+        try:
+            for queue, depth in queue_depths().items():
+                depths.add_metric([queue], depth)
+        except Exception:
+            logger.warning("Could not read queue depths for /metrics", exc_info=True) # Broker down: omit the gauge
+        yield depths
+
+
+_snapshot_registry = CollectorRegistry(auto_describe=False)
+_snapshot_registry.register(SnapshotCollector())
+
+
+def metrics_view(request):
+    """Prometheus text exposition of every process's samples plus the scrape-time gauges."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY # Single process (e.g. runserver): this process's own samples
+    output = generate_latest(registry) + generate_latest(_snapshot_registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
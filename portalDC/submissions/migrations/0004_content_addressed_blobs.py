@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 07:22
+
+import django.db.models.deletion
+import django.utils.timezone
+import submissions.models
+import submissions.storage
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_file_name(apps, schema_editor):
+    # Files uploaded before the blob store keep their per-student path as both names
+    Submission = apps.get_model('submissions', 'Submission')
+    Submission.objects.filter(file_name='').update(file_name=F('uploaded_file'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0003_alter_submission_uploaded_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='file_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='uploaded_file',
+            field=models.FileField(storage=submissions.storage.get_submission_storage, upload_to=submissions.models.submission_upload_path),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='submissions', to='submissions.blob'),
+        ),
+        migrations.RunPython(backfill_file_name, migrations.RunPython.noop),
+    ]
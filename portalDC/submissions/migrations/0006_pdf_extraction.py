@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0005_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='extracted_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='pdf_metadata',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
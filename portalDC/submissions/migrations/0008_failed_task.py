@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 07:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0007_similarity_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(max_length=255, unique=True)),
+                ('task_name', models.CharField(max_length=255)),
+                ('args', models.JSONField(default=list)),
+                ('kwargs', models.JSONField(default=dict)),
+                ('exception', models.CharField(max_length=255)),
+                ('message', models.TextField(blank=True)),
+                ('traceback', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('first_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('failed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_attempt_ms', models.FloatField(blank=True, null=True)),
+                ('requeued_at', models.DateTimeField(blank=True, null=True)),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='failed_tasks', to='submissions.submission')),
+            ],
+            options={
+                'ordering': ['-failed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 07:36
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_status_changed_at(apps, schema_editor):
+    # Best available guess for existing rows: the status last changed when they were submitted
+    Submission = apps.get_model('submissions', 'Submission')
+    Submission.objects.update(status_changed_at=F('submitted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0008_failed_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_status_changed_at, migrations.RunPython.noop),
+    ]
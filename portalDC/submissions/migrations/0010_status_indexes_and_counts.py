@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+def backfill_status_counts(apps, schema_editor):
+    # Same as SubmissionStatusCount.objects.rebuild(), against the historical models
+    Submission = apps.get_model('submissions', 'Submission')
+    SubmissionStatusCount = apps.get_model('submissions', 'SubmissionStatusCount')
+    totals = {}
+    counters = []
+    for student_name, status, n in Submission.objects.values_list('student_name', 'status').annotate(n=models.Count('pk')).order_by():
+        counters.append(SubmissionStatusCount(student_name=student_name, status=status, count=n))
+        totals[status] = totals.get(status, 0) + n
+    counters += [SubmissionStatusCount(student_name='', status=status, count=n) for status, n in totals.items()]
+    SubmissionStatusCount.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0009_status_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_name', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], max_length=10)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['status', 'submitted_at'], name='submission_status_submitted'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student_name', 'submitted_at'], name='submission_student_submitted'),
+        ),
+        migrations.AddConstraint(
+            model_name='submissionstatuscount',
+            constraint=models.UniqueConstraint(fields=('student_name', 'status'), name='unique_student_status_count'),
+        ),
+        migrations.RunPython(backfill_status_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 08:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0012_submission_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='tier',
+            field=models.CharField(choices=[('hot', 'Local disk'), ('cold', 'Object storage')], default='hot', max_length=4),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='tier_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['tier', 'tier_changed_at'], name='blob_tier_changed'),
+        ),
+    ]
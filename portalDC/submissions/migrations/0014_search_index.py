@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 08:20
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Not a model: the index is an FTS5 virtual table on SQLite and a tsvector table on
+    # PostgreSQL (see submissions/search.py). Backfilled from the text extracted so far.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE submission_search ("
+            " submission_id bigint PRIMARY KEY REFERENCES submissions_submission (id) ON DELETE CASCADE,"
+            " document tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX submission_search_document ON submission_search USING GIN (document)")
+        schema_editor.execute(
+            "INSERT INTO submission_search (submission_id, document) "
+            "SELECT id, to_tsvector(%s::regconfig, left(extracted_text, 1000000)) FROM submissions_submission "
+            "WHERE extracted_text <> ''", [settings.SUBMISSION_SEARCH_CONFIG]
+        )
+    else:
+        schema_editor.execute("CREATE VIRTUAL TABLE submission_search USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')")
+        schema_editor.execute(
+            "INSERT INTO submission_search (rowid, body) "
+            "SELECT id, extracted_text FROM submissions_submission WHERE extracted_text <> ''"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute("DROP TABLE submission_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0013_blob_tier'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
\ No newline at end of file
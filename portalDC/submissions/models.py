@@ -1,8 +1,12 @@
 # submissions/models.py
-from django.db import models
+from collections import Counter
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.utils.text import slugify
 import os
+import uuid
+from .storage import get_submission_storage
 # Optional: Define a validator for file extensions if needed more broadly
 # from django.core.exceptions import ValidationError
 # def validate_pdf(value):
@@ -19,13 +23,123 @@ def submission_upload_path(instance, filename):
     # Construct the path: submissions/<safe_student_name>/<original_filename>
     # os.path.join handles path separators correctly
     return os.path.join('submissions', safe_student_name, filename)
+
+
+ALL_STUDENTS = '' # SubmissionStatusCount row holding the totals over every student
+
+
+class BlobManager(models.Manager):
+    def acquire(self, digest, size):
+        """
+        Take a reference on the blob with this digest, creating its row if needed.
+        Called before the upload's bytes are stored (see Submission.store_upload);
+        they are then written locally, so a demoted blob is hot again.
+        """
+        hot = {'ref_count': F('ref_count') + 1, 'tier': Blob.HOT}
+        if self.filter(pk=digest, tier=Blob.HOT).update(ref_count=F('ref_count') + 1):
+            return digest
+        if self.filter(pk=digest).update(tier_changed_at=timezone.now(), **hot):
+            return digest
+        try:
+            with transaction.atomic():
+                self.create(sha256=digest, size=size, ref_count=1)
+        except IntegrityError:
+            # Another request created it first; just take our reference
+            self.filter(pk=digest).update(**hot)
+        return digest
+
+    def release(self, digest):
+        """
+        Drop a reference. The last one leaves the row at ref_count 0; once that commits,
+        purge() deletes the stored bytes and the row unless an upload took it again.
+        """
+        self.filter(pk=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if self.filter(pk=digest, ref_count=0).exists():
+            transaction.on_commit(lambda: self.purge(digest), using=self.db, robust=True)
+
+    def purge(self, digest):
+        """
+        Deletes an unreferenced blob with its row locked until the bytes are gone:
+        acquire() waits for the lock, then creates a new row, and the upload writes the
+        bytes again. Returns True if it was deleted.
+        """
+        with transaction.atomic(using=self.db):
+            if not self.select_for_update().filter(pk=digest, ref_count=0).exists():
+                return False # Referenced again (or already purged)
+            self.filter(pk=digest).delete() # First: PROTECT stops it while a Submission still points here
+            storage = get_submission_storage()
+            storage.delete(storage.blob_name(digest))
+        return True
+
+    def purge_unreferenced(self):
+        """Purges blobs left at ref_count 0 (a purge that failed, or a process that died before it)."""
+        return sum(self.purge(digest) for digest in self.filter(ref_count=0).values_list('pk', flat=True))
+
+
+class Blob(models.Model):
+    # One row per distinct file content, shared by every Submission with the same bytes
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0) # Number of Submissions pointing here
+    created_at = models.DateTimeField(default=timezone.now)
+    # Storage tier (see tiering.py): hot blobs are on the local disk (and maybe also
+    # in the cold tier), cold ones only in the cold tier
+    HOT = 'hot'
+    COLD = 'cold'
+    TIER_CHOICES = [(HOT, 'Local disk'), (COLD, 'Object storage')]
+    tier = models.CharField(max_length=4, choices=TIER_CHOICES, default=HOT)
+    tier_changed_at = models.DateTimeField(default=timezone.now) # Demoted once hot for SUBMISSION_COLD_AFTER
+
+    objects = BlobManager()
+
+    class Meta:
+        indexes = [
+            # The tiering mover's scan: hot blobs, least recently promoted first
+            models.Index(fields=['tier', 'tier_changed_at'], name='blob_tier_changed'),
+        ]
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class SubmissionQuerySet(models.QuerySet):
+    def transition(self, to, **fields):
+        """
+        Moves the selected submissions to status `to` with a conditional
+        UPDATE ... WHERE status IN (<states allowed to move to `to`>), stamping the
+        status timestamps, and adjusts SubmissionStatusCount in the same transaction.
+        Only the pk, student and old status of the rows are read; returns the number
+        moved, so 0 means another worker got there first (or the move isn't allowed).
+        """
+        now = timezone.now()
+        fields.update(status=to, status_changed_at=now)
+        if to == 'PROCESSING':
+            fields.setdefault('processing_started_at', now)
+        elif to in ('COMPLETE', 'FAILED'):
+            fields.setdefault('completed_at', now)
+        with transaction.atomic(using=self.db):
+            # Locked until commit (SQLite's IMMEDIATE transaction already holds the write lock)
+            moving = list(self.filter(status__in=Submission.sources(to)).select_for_update()
+                          .values_list('pk', 'student_name', 'status'))
+            if not moving:
+                return 0
+            moved = self.model.objects.filter(pk__in=[pk for pk, _, _ in moving]).update(**fields)
+            for (student_name, status), n in Counter((name, old) for _, name, old in moving).items():
+                SubmissionStatusCount.objects.move(student_name, status, to, n)
+        return moved
+
+
 class Submission(models.Model):
     # AutoField provides the automatic unique submission ID (pk)
     student_name = models.CharField(max_length=100)
     # FileField handles file uploads. `upload_to` specifies a subdirectory within MEDIA_ROOT.
     # 'submissions/%Y/%m/%d/' will organize files by date uploaded.
     # You can add validators=[validate_pdf] here too, but form validation is often preferred.
-    uploaded_file = models.FileField(upload_to=submission_upload_path)
+    # The bytes live in the content-addressed blob store (see storage.py); identical
+    # uploads share one blob. `file_name` keeps the per-student path as a logical name.
+    uploaded_file = models.FileField(upload_to=submission_upload_path, storage=get_submission_storage)
+    file_name = models.CharField(max_length=255, blank=True)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='submissions')
     submitted_at = models.DateTimeField(default=timezone.now)
     # Add status field for tracking Celery task progress
     STATUS_CHOICES = [
@@ -35,8 +149,231 @@ class Submission(models.Model):
         ('FAILED', 'Failed'),
     ]
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    # Allowed moves; every status change goes through SubmissionQuerySet.transition()
+    TRANSITIONS = {
+        'PENDING': ('PROCESSING', 'FAILED'),
+        'PROCESSING': ('PROCESSING', 'COMPLETE', 'FAILED'), # PROCESSING again: a retry re-claiming it
+        'FAILED': ('PENDING', 'PROCESSING'), # Requeued
+        'COMPLETE': (),
+    }
+    status_changed_at = models.DateTimeField(default=timezone.now) # Last change to the status payload (Last-Modified)
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True) # Reached COMPLETE or FAILED
     celery_task_id = models.CharField(max_length=255, blank=True, null=True) # Store Celery task ID
+    # Filled in by process_submission
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    pdf_metadata = models.JSONField(default=dict, blank=True) # Title, author, producer, dates...
+    extracted_text = models.TextField(blank=True) # Pages separated by form feeds
+    # Filled in by check_similarity (see similarity.py); null until it has run
+    similarity_score = models.FloatField(null=True, blank=True) # Best match's estimated Jaccard similarity
+    similar_submissions = models.JSONField(default=list, blank=True) # [{'id', 'student_name', 'score'}, ...]
+    batch = models.ForeignKey('SubmissionBatch', on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions')
+
+    objects = SubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Operations queues (all PENDING/FAILED, oldest first) and date-ordered listings
+            models.Index(fields=['status', 'submitted_at'], name='submission_status_submitted'),
+            # A student's submissions, latest first
+            models.Index(fields=['student_name', 'submitted_at'], name='submission_student_submitted'),
+            # Keyset pagination of the list endpoint and the admin: ORDER BY submitted_at, id
+            models.Index(fields=['submitted_at', 'id'], name='submission_submitted_id'),
+        ]
 
     def __str__(self):
         # String representation for admin or debugging
-        return f"Submission {self.id} by {self.student_name}"
\ No newline at end of file
+        return f"Submission {self.id} by {self.student_name}"
+
+    @classmethod
+    def sources(cls, to):
+        """States a submission may move to `to` from."""
+        return [state for state, targets in cls.TRANSITIONS.items() if to in targets]
+
+    def store_upload(self):
+        """
+        Moves a new (uncommitted) upload into the blob store and takes a reference on
+        its Blob, without writing the Submission row. save() calls it first so the row
+        is written once, already linked to its blob; bulk creation calls it per object.
+
+        The reference is taken before the bytes are stored: the store skips bytes it
+        already has, and only a held reference keeps a concurrent release() from
+        purging them in between. Returns True if a reference was taken.
+        """
+        upload = self.uploaded_file
+        if upload and not upload._committed:
+            field = self._meta.get_field('uploaded_file')
+            self.file_name = field.generate_filename(self, os.path.basename(upload.name))
+            content = upload.file
+            content.sha256 = upload.storage.hash_content(content) # Hashed once; _save() reuses it
+            self.blob_id = Blob.objects.acquire(content.sha256, upload.size)
+            try:
+                upload.save(upload.name, content, save=False)
+            except BaseException:
+                Blob.objects.release(self.blob_id)
+                self.blob_id = None
+                raise
+            return True
+        return False
+
+    def save(self, *args, **kwargs):
+        acquired = self.store_upload()
+        try:
+            # A savepoint, so the reference can still be released inside a caller's transaction
+            with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+                super().save(*args, **kwargs)
+        except BaseException:
+            if acquired:
+                Blob.objects.release(self.blob_id) # No row points at the blob: don't leak the reference
+                self.blob_id = None
+            raise
+
+
+class SubmissionStatusCountManager(models.Manager):
+    def _add(self, student_name, status, delta):
+        if not self.filter(student_name=student_name, status=status).update(count=F('count') + delta):
+            try:
+                with transaction.atomic():
+                    self.create(student_name=student_name, status=status, count=delta)
+            except IntegrityError:
+                # Created concurrently; apply our delta to it
+                self.filter(student_name=student_name, status=status).update(count=F('count') + delta)
+
+    def adjust(self, student_name, status, delta):
+        """Adds delta to the (student, status) and (all students, status) counters."""
+        for name in (student_name, ALL_STUDENTS):
+            self._add(name, status, delta)
+
+    def add_created(self, submissions):
+        """Counts submissions created with bulk_create(), which sends no post_save."""
+        for (student_name, status), n in Counter((s.student_name, s.status) for s in submissions).items():
+            self._add(student_name, status, n)
+        for status, n in Counter(s.status for s in submissions).items():
+            self._add(ALL_STUDENTS, status, n)
+
+    def move(self, student_name, old_status, new_status, n=1):
+        if old_status != new_status:
+            self.adjust(student_name, old_status, -n)
+            self.adjust(student_name, new_status, n)
+
+    def counts(self, student_name=ALL_STUDENTS):
+        """{status: count} for one student, or for everyone by default; one indexed read."""
+        counts = dict.fromkeys((status for status, _ in Submission.STATUS_CHOICES), 0)
+        counts.update(self.filter(student_name=student_name).values_list('status', 'count'))
+        return counts
+
+    def rebuild(self):
+        """Recomputes every counter from Submission with one GROUP BY (repairs drift)."""
+        rows = Submission.objects.values_list('student_name', 'status').annotate(n=models.Count('pk')).order_by()
+        totals = {}
+        counters = []
+        for student_name, status, n in rows:
+            counters.append(self.model(student_name=student_name, status=status, count=n))
+            totals[status] = totals.get(status, 0) + n
+        counters += [self.model(student_name=ALL_STUDENTS, status=status, count=n) for status, n in totals.items()]
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(counters, batch_size=1000)
+
+
+class SubmissionStatusCount(models.Model):
+    """
+    Number of submissions per (student, status), kept up to date on every create,
+    status transition and delete, so dashboards read counters instead of running
+    COUNT(*). The row with student_name == ALL_STUDENTS ('') holds the totals.
+    """
+    student_name = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=Submission.STATUS_CHOICES)
+    count = models.BigIntegerField(default=0)
+
+    objects = SubmissionStatusCountManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student_name', 'status'], name='unique_student_status_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_name or 'All students'}: {self.count} {self.status}"
+
+
+class SubmissionBatch(models.Model):
+    """
+    A whole class uploaded in one request (see batch.py). Its submissions are queued
+    as one Celery chord whose callback, finalize_batch, records when all of them
+    have been validated.
+    """
+    submitted_by = models.CharField(max_length=100, blank=True) # Instructor, as given in the request
+    created_at = models.DateTimeField(default=timezone.now)
+    total = models.PositiveIntegerField(default=0) # Submissions created
+    validated_at = models.DateTimeField(null=True, blank=True) # Set by finalize_batch
+    summary = models.JSONField(default=dict, blank=True) # {status: count} when finalize_batch ran
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.total} submissions)"
+
+
+class SubmissionSignature(models.Model):
+    # MinHash signature of a submission's text: NUM_PERM uint32 values as raw bytes
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+
+
+class LSHBucket(models.Model):
+    # One row per (submission, LSH band); submissions sharing a key are similarity candidates
+    key = models.BigIntegerField(db_index=True)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='lsh_buckets')
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload in progress (see resumable.py). Chunks are kept in
+    the staging area on disk, not in the DB, so PUTting a chunk never writes a row.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) # The upload id
+    student_name = models.CharField(max_length=100)
+    original_name = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True) # Set once finalize claims the upload
+    submission = models.OneToOneField(Submission, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.total_size // self.chunk_size)) # Ceiling division
+
+    def expected_chunk_size(self, index):
+        if index < self.total_chunks - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.total_chunks - 1)
+
+    def __str__(self):
+        return f"Upload {self.id} by {self.student_name}"
+
+
+class FailedTask(models.Model):
+    """
+    Dead letter: a task that failed for good, either with a permanent error or after
+    exhausting its retries. Keeps enough to re-dispatch it from the admin.
+    """
+    task_id = models.CharField(max_length=255, unique=True)
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, blank=True, related_name='failed_tasks')
+    exception = models.CharField(max_length=255) # Exception class name
+    message = models.TextField(blank=True)
+    traceback = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=1) # Runs including retries
+    first_attempt_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(default=timezone.now)
+    last_attempt_ms = models.FloatField(null=True, blank=True) # Duration of the final run
+    requeued_at = models.DateTimeField(null=True, blank=True) # Set by the admin "requeue" action
+
+    class Meta:
+        ordering = ['-failed_at']
+
+    def __str__(self):
+        return f"{self.task_name} [{self.task_id}] failed after {self.attempts} attempt(s)"
\ No newline at end of file
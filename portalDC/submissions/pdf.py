@@ -0,0 +1,44 @@
+# submissions/pdf.py
+"""
+Thin wrapper around pypdf used by the processing tasks. The reader works from the
+open file and parses objects on demand, so only the pages being extracted are
+ever held in memory -- never the whole document.
+"""
+from pypdf import PdfReader
+
+PAGE_SEPARATOR = '\f' # Form feed between pages, like pdftotext
+
+# Document info keys worth keeping on the Submission
+METADATA_KEYS = {
+    '/Title': 'title',
+    '/Author': 'author',
+    '/Subject': 'subject',
+    '/Creator': 'creator',
+    '/Producer': 'producer',
+    '/CreationDate': 'created',
+    '/ModDate': 'modified',
+}
+
+
+def _open(f):
+    reader = PdfReader(f)
+    if reader.is_encrypted:
+        # Many "protected" PDFs only restrict editing and open with an empty password
+        reader.decrypt('')
+    return reader
+
+
+def read_info(path):
+    """Returns (page_count, metadata dict) without touching page contents."""
+    with open(path, 'rb') as f:
+        reader = _open(f)
+        info = reader.metadata or {}
+        metadata = {name: str(info[key]) for key, name in METADATA_KEYS.items() if info.get(key)}
+        return len(reader.pages), metadata
+
+
+def extract_text(path, start, stop):
+    """Text of pages [start, stop), one page at a time, joined with PAGE_SEPARATOR."""
+    with open(path, 'rb') as f:
+        reader = _open(f)
+        return PAGE_SEPARATOR.join(reader.pages[i].extract_text() or '' for i in range(start, stop))
\ No newline at end of file
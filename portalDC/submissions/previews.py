@@ -0,0 +1,223 @@
+# submissions/previews.py
+"""
+First-page previews of submitted PDFs, so graders can recognise a submission
+without downloading it:
+
+    GET previews/<sha256>/thumb.jpg     ~200 px wide, for lists (a few KB)
+    GET previews/<sha256>/preview.jpg   ~800 px wide
+
+Previews are rendered with pypdfium2 (plus Pillow for JPEG), either ahead of time
+by the render_previews task that process_submission queues, or on the first
+request. Both sizes come from one render and are kept in SUBMISSION_PREVIEW_DIR,
+named by the blob's content hash:
+
+- concurrent requests for the same PDF render it once: the first takes a lock
+  file, the others wait for its output
+- the cache is bounded by SUBMISSION_PREVIEW_CACHE_SIZE; every hit refreshes the
+  file's mtime and evict() deletes the least recently used files
+- the URLs name the content, so responses are cacheable forever (immutable)
+"""
+import io
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.urls import reverse
+
+from . import tiering
+from .models import Blob
+from .storage import get_submission_storage
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {'thumb': 200, 'preview': 800} # Width in pixels
+JPEG_QUALITY = 70
+RENDER_TIMEOUT = 60 # Seconds before another process's render lock counts as abandoned
+CACHE_CONTROL = 'private, max-age=31536000, immutable' # Staff only, and the content never changes
+
+_pdfium_lock = threading.Lock() # PDFium is not thread-safe
+_written = 0 # Bytes this process added since its last eviction
+_written_lock = threading.Lock()
+
+
+class PreviewError(Exception):
+    """The PDF can't be rendered (encrypted, corrupt), or no renderer is installed."""
+
+
+def cache_path(digest, variant):
+    return os.path.join(settings.SUBMISSION_PREVIEW_DIR, digest[:2], f'{digest}.{variant}.jpg')
+
+
+def preview_url(digest, variant='thumb'):
+    return reverse('submission_preview', args=[digest, variant])
+
+
+def render(source_path):
+    """{variant: JPEG bytes} of the document's first page, all sizes from a single render."""
+    try:
+        import pypdfium2
+    except ImportError:
+        raise PreviewError("Previews need pypdfium2 and Pillow (pip install pypdfium2 pillow).")
+
+    widest = max(VARIANTS.values())
+    with _pdfium_lock:
+        try:
+            document = pypdfium2.PdfDocument(source_path)
+        except pypdfium2.PdfiumError as e:
+            raise PreviewError(f"Cannot open the PDF: {e}")
+        try:
+            if len(document) == 0:
+                raise PreviewError("The PDF has no pages.")
+            page = document[0]
+            # Scale is pixels per point
+            image = page.render(scale=widest / page.get_width()).to_pil().convert('RGB')
+        finally:
+            document.close()
+
+    rendered = {}
+    for variant, width in VARIANTS.items():
+        sized = image if width == widest else image.resize((width, max(1, round(image.height * width / image.width))))
+        out = io.BytesIO()
+        sized.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        rendered[variant] = out.getvalue()
+    return rendered
+
+
+def _store(digest, rendered):
+    global _written
+    size = 0
+    for variant, data in rendered.items():
+        path = cache_path(digest, variant)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        size += len(data)
+    with _written_lock:
+        _written += size
+        due = _written > settings.SUBMISSION_PREVIEW_CACHE_SIZE * 0.05
+        if due:
+            _written = 0
+    if due:
+        evict()
+
+
+def _lock(digest, path):
+    """Takes the render lock for digest; returns False if another renderer produced `path` meanwhile."""
+    lock_path = os.path.join(os.path.dirname(path), f'{digest}.lock')
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        if os.path.exists(path):
+            return False
+        try:
+            if time.time() - os.path.getmtime(lock_path) > RENDER_TIMEOUT:
+                os.remove(lock_path) # Its renderer died; take over
+        except FileNotFoundError:
+            pass
+        time.sleep(0.05)
+
+
+def _unlock(digest, path):
+    try:
+        os.remove(os.path.join(os.path.dirname(path), f'{digest}.lock'))
+    except FileNotFoundError:
+        pass
+
+
+def get_preview(digest, variant, source_path=None):
+    """
+    Path of the cached preview, rendering it first if needed (see the module docstring).
+    source_path defaults to the blob's file, brought back from the cold tier if necessary.
+    """
+    path = cache_path(digest, variant)
+    try:
+        os.utime(path) # Hit: now the most recently used
+        return path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not _lock(digest, path):
+        return path
+    try:
+        if not os.path.exists(path): # Rendered by someone else between our check and the lock
+            if source_path is None:
+                storage = get_submission_storage()
+                source_path = tiering.local_path(storage.path(storage.blob_name(digest)))
+            _store(digest, render(source_path))
+    finally:
+        _unlock(digest, path)
+    return path
+
+
+def evict(max_size=None):
+    """
+    Deletes the least recently used previews until the cache is under 90% of max_size
+    (default SUBMISSION_PREVIEW_CACHE_SIZE). Returns the number of files deleted.
+    """
+    max_size = max_size or settings.SUBMISSION_PREVIEW_CACHE_SIZE
+    directory = settings.SUBMISSION_PREVIEW_DIR
+    if not os.path.isdir(directory):
+        return 0
+    files = []
+    for shard in os.scandir(directory):
+        if shard.is_dir():
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.jpg'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    if total <= max_size:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_size * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def preview_view(request, digest, variant):
+    """A JPEG preview of a submitted PDF (staff only); see the module docstring."""
+    if request.method != 'GET':
+        return _error(f'Method {request.method} not allowed. Please use GET.', 405)
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    if not request.user.is_staff:
+        return _error('Only staff may view submissions.', 403)
+    if variant not in VARIANTS:
+        return _error(f'Unknown preview size; use one of {", ".join(VARIANTS)}.', 404)
+
+    etag = f'"{digest}.{variant}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        if not Blob.objects.filter(pk=digest, ref_count__gt=0).exists():
+            return _error('No submission has this content.', 404)
+        try:
+            path = get_preview(digest, variant)
+        except PreviewError as e:
+            return _error(str(e), 422)
+        except FileNotFoundError:
+            return _error('The file of this submission is missing.', 404)
+        with open(path, 'rb') as f:
+            response = HttpResponse(f.read(), content_type='image/jpeg')
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
\ No newline at end of file
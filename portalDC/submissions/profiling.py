@@ -0,0 +1,183 @@
+# submissions/profiling.py
+"""
+Opt-in request profiler for finding out *why* a request was slow.
+
+For a sampled fraction of requests (SUBMISSION_PROFILE_SAMPLE_RATE) ProfilingMiddleware
+runs the view under cProfile and records:
+
+- SQL query count and time, and the slowest queries
+- the request thread's CPU time; wall time minus SQL and CPU is time spent
+  waiting (disk, broker, locks, the GIL)
+- Python allocations while the request ran (tracemalloc; process-wide, so
+  approximate when other requests run at the same time)
+
+Only one cProfile profiler can be active per process (Python 3.12+ refuses a
+second), so a sampled request that overlaps another one records the numbers
+above without a .prof.
+
+Sampled requests slower than SUBMISSION_PROFILE_SLOW_MS are written to
+SUBMISSION_PROFILE_DIR as <name>.prof (pstats) plus <name>.json (the numbers above),
+and logged. `manage.py profile_report` aggregates the captures into the top-N
+hot functions.
+
+With a sample rate of 0 the middleware removes itself at startup, so it costs
+nothing; otherwise unsampled requests cost one random() call.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from .metrics import QueryCounter, view_name
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_QUERIES = 5 # Per capture
+
+_profiler_lock = threading.Lock() # Held by the request being run under cProfile
+
+
+class _Allocations:
+    """
+    Keeps tracemalloc running while at least one sampled request is in flight.
+    Tracing started by someone else (PYTHONTRACEMALLOC, a debugging tool) is left running.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._started = False # Whether we started the current tracing
+
+    def start(self):
+        with self._lock:
+            if self._active == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._active += 1
+        return tracemalloc.get_traced_memory()[0]
+
+    def stop(self, start_bytes):
+        """(net bytes still allocated, peak bytes above the start) for the request."""
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self._active -= 1
+            if self._active == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+        return current - start_bytes, max(peak - start_bytes, 0)
+
+
+_allocations = _Allocations()
+
+
+def capture_name(started, view, wall_ms):
+    return f"{started:%Y%m%d-%H%M%S-%f}-{view.replace(':', '.')}-{wall_ms:.0f}ms"
+
+
+def _prune(directory, keep):
+    """Deletes the oldest captures beyond `keep` (captures are rare; a directory scan is fine)."""
+    captures = sorted(entry.path[:-len('.json')] for entry in os.scandir(directory) if entry.name.endswith('.json'))
+    for stale in captures[:-keep] if keep else []:
+        for suffix in ('.json', '.prof'):
+            if os.path.exists(stale + suffix):
+                os.remove(stale + suffix)
+
+
+class ProfilingMiddleware:
+    """
+    Samples requests as described in the module docstring. Async views pass through
+    unprofiled: cProfile follows one thread, and their work hops between threads.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.SUBMISSION_PROFILE_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed # Disabled: not even a function call per request
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.slow_seconds = settings.SUBMISSION_PROFILE_SLOW_MS / 1000
+        self.directory = settings.SUBMISSION_PROFILE_DIR
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request) # A coroutine; the caller awaits it
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        queries = QueryCounter(keep=SLOWEST_QUERIES)
+        profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+        started = timezone.now()
+        alloc_start = _allocations.start()
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                if profiler is not None:
+                    try:
+                        profiler.enable()
+                    except ValueError:
+                        # Another profiling tool (a debugger, sys.monitoring user) is active
+                        logger.debug("cProfile unavailable for this request", exc_info=True)
+                        _profiler_lock.release()
+                        profiler = None
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            net_bytes, peak_bytes = _allocations.stop(alloc_start)
+            if profiler is not None:
+                _profiler_lock.release()
+
+        if wall >= self.slow_seconds:
+            summary = {
+                'started': started.isoformat(),
+                'view': view_name(request),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'wall_ms': round(wall * 1000, 3),
+                'sql_ms': round(queries.seconds * 1000, 3),
+                'cpu_ms': round(cpu * 1000, 3),
+                'waiting_ms': round(max(wall - queries.seconds - cpu, 0) * 1000, 3),
+                'queries': queries.count,
+                'slowest_queries': [{'ms': round(seconds * 1000, 3), 'sql': sql} for seconds, sql in queries.slowest],
+                'alloc_net_bytes': net_bytes,
+                'alloc_peak_bytes': peak_bytes,
+                'profiled': profiler is not None,
+            }
+            self._capture(profiler, summary, started)
+        return response
+
+    def _capture(self, profiler, summary, started):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, capture_name(started, summary['view'], summary['wall_ms']))
+            if profiler is not None:
+                profiler.dump_stats(path + '.prof')
+            with open(path + '.json', 'w') as f:
+                json.dump(summary, f, indent=2)
+            _prune(self.directory, settings.SUBMISSION_PROFILE_MAX_CAPTURES)
+        except OSError:
+            logger.warning("Could not write profile capture to %s", self.directory, exc_info=True)
+            path = None
+        logger.warning("Slow request %s %s: %.0fms (sql %.0fms in %d queries, cpu %.0fms, waiting %.0fms)",
+                       summary['method'], summary['path'], summary['wall_ms'], summary['sql_ms'], summary['queries'],
+                       summary['cpu_ms'], summary['waiting_ms'], extra={'fields': {**summary, 'capture': path}})
\ No newline at end of file
@@ -0,0 +1,316 @@
+# submissions/resumable.py
+"""
+Resumable, chunked uploads for large PDFs on unreliable connections:
+
+    POST /submissions/uploads/                          start; returns upload_id and the chunk layout
+    PUT  /submissions/uploads/<upload_id>/chunks/<n>/   store chunk n (any order, may run in parallel)
+    GET  /submissions/uploads/<upload_id>/              which chunks are received / still missing
+    POST /submissions/uploads/<upload_id>/complete/     assemble, create the Submission, queue the task
+
+Each chunk is written to its own file in the staging area and renamed into place
+only once it is complete, so after a dropped connection the client asks which
+chunks are missing and sends just those.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import admission
+from .forms import SubmissionForm
+from .models import UploadSession
+from .tasks import enqueue, save_pending
+from .tracing import Trace
+from .uploadhandlers import PDF_MAGIC, StreamedPDFUploadedFile
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024 # Bytes read from the request body at a time
+ASSEMBLE_READ_SIZE = 1024 * 1024 # Bytes copied at a time when joining chunks
+
+
+def staging_dir(upload_id):
+    return os.path.join(settings.SUBMISSION_STAGING_DIR, str(upload_id))
+
+
+def chunk_path(upload_id, index):
+    return os.path.join(staging_dir(upload_id), f'{index:06d}.part')
+
+
+def received_chunks(upload):
+    """Indexes of the chunks fully stored for this upload (read from disk, not the DB)."""
+    try:
+        names = os.listdir(staging_dir(upload.id))
+    except FileNotFoundError:
+        return set()
+    return {int(name[:-len('.part')]) for name in names if name.endswith('.part')}
+
+
+def purge_expired_uploads(now=None):
+    """Deletes expired upload sessions and their staged chunks. Returns how many were removed."""
+    expired = UploadSession.objects.filter(expires_at__lte=now or timezone.now())
+    for upload_id in expired.values_list('id', flat=True).iterator():
+        shutil.rmtree(staging_dir(upload_id), ignore_errors=True)
+    deleted, _ = expired.delete()
+    return deleted
+
+
+def _error(message, status, **extra):
+    return JsonResponse({'status': 'error', 'message': message, **extra}, status=status)
+
+
+def _method_not_allowed(request, allowed):
+    return _error(f'Method {request.method} not allowed for this endpoint. Please use {allowed}.', 405)
+
+
+def _get_active_upload(upload_id):
+    """Returns (upload, None) or (None, error response)."""
+    try:
+        upload = UploadSession.objects.get(pk=upload_id)
+    except UploadSession.DoesNotExist:
+        return None, _error(f'Upload {upload_id} not found.', 404)
+    if upload.expires_at <= timezone.now():
+        return None, _error('Upload has expired. Please start a new upload.', 410)
+    return upload, None
+
+
+def _upload_state(upload):
+    received = received_chunks(upload)
+    return {
+        'status': 'success',
+        'upload_id': str(upload.id),
+        'chunk_size': upload.chunk_size,
+        'total_size': upload.total_size,
+        'total_chunks': upload.total_chunks,
+        'received_chunks': sorted(received),
+        'missing_chunks': [i for i in range(upload.total_chunks) if i not in received],
+        'expires_at': upload.expires_at.isoformat(),
+        'submission_id': upload.submission_id,
+    }
+
+
+def start_upload_view(request):
+    """
+    Starts a resumable upload. Accepts JSON or form data with
+    student_name, file_name and size (bytes).
+    """
+    if request.method != 'POST':
+        return _method_not_allowed(request, 'POST')
+
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return _error('Request body is not valid JSON.', 400)
+    else:
+        data = request.POST
+
+    student_name = str(data.get('student_name') or '').strip()
+    file_name = os.path.basename(str(data.get('file_name') or ''))
+    try:
+        total_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        total_size = 0
+
+    errors = {}
+    if not student_name:
+        errors['student_name'] = 'This field is required.'
+    elif len(student_name) > 100:
+        errors['student_name'] = 'Ensure this value has at most 100 characters.'
+    if os.path.splitext(file_name)[1].lower() != '.pdf':
+        errors['file_name'] = 'Unsupported file type. Only PDF files are allowed.'
+    if total_size <= 0:
+        errors['size'] = 'Size must be a positive number of bytes.'
+    elif total_size > settings.SUBMISSION_MAX_UPLOAD_SIZE:
+        errors['size'] = f'Upload exceeds the {settings.SUBMISSION_MAX_UPLOAD_SIZE // (1024 * 1024)} MB limit.'
+    if errors:
+        return _error('Upload validation failed.', 400, errors=errors)
+
+    upload = UploadSession.objects.create(
+        student_name=student_name,
+        original_name=file_name,
+        total_size=total_size,
+        chunk_size=settings.SUBMISSION_RESUMABLE_CHUNK_SIZE,
+        expires_at=timezone.now() + timedelta(seconds=settings.SUBMISSION_RESUMABLE_EXPIRY),
+    )
+    os.makedirs(staging_dir(upload.id), exist_ok=True)
+    logger.info("Started resumable upload %s (%d bytes, %d chunks)", upload.id, total_size, upload.total_chunks)
+    return JsonResponse(_upload_state(upload), status=201)
+
+
+def upload_status_view(request, upload_id):
+    """Reports received and missing chunks so an interrupted client can resume."""
+    if request.method != 'GET':
+        return _method_not_allowed(request, 'GET')
+    upload, error = _get_active_upload(upload_id)
+    if error:
+        return error
+    return JsonResponse(_upload_state(upload))
+
+
+def upload_chunk_view(request, upload_id, index):
+    """
+    Stores one chunk from the raw request body. The chunk is streamed to a temp file
+    and renamed into place only when complete, so a dropped connection never leaves
+    a partial chunk that looks received. An optional X-Chunk-SHA256 header is verified.
+    """
+    if request.method != 'PUT':
+        return _method_not_allowed(request, 'PUT')
+    upload, error = _get_active_upload(upload_id)
+    if error:
+        return error
+    if upload.completed_at:
+        return _error('Upload has already been finalized.', 409)
+    if not 0 <= index < upload.total_chunks:
+        return _error(f'Chunk index must be between 0 and {upload.total_chunks - 1}.', 400)
+
+    expected = upload.expected_chunk_size(index)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length and content_length != expected:
+        return _error(f'Chunk {index} must be exactly {expected} bytes.', 400)
+
+    directory = staging_dir(upload.id)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    hasher = hashlib.sha256()
+    written = 0
+    head = b''
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                data = request.read(READ_SIZE)
+                if not data:
+                    break
+                written += len(data)
+                if written > expected:
+                    return _error(f'Chunk {index} must be exactly {expected} bytes.', 400)
+                if index == 0 and len(head) < len(PDF_MAGIC):
+                    head += data[:len(PDF_MAGIC)]
+                    if len(head) >= len(PDF_MAGIC) and not head.startswith(PDF_MAGIC):
+                        return _error('Unsupported file type. Only PDF files are allowed.', 400)
+                hasher.update(data)
+                f.write(data)
+
+        if written != expected:
+            return _error(f'Chunk {index} is incomplete ({written} of {expected} bytes).', 400)
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if checksum and checksum.lower() != hasher.hexdigest():
+            return _error(f'Chunk {index} checksum mismatch.', 400)
+        os.replace(tmp_path, chunk_path(upload.id, index)) # Re-sending a chunk simply overwrites it
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return JsonResponse({'status': 'success', 'upload_id': str(upload.id), 'chunk': index, 'size': written})
+
+
+def _assemble(upload):
+    """Joins the staged chunks into one upload file in the incoming directory, hashing as it goes."""
+    assembled = StreamedPDFUploadedFile(upload.original_name, 'application/pdf', 0, None)
+    hasher = hashlib.sha256()
+    for index in range(upload.total_chunks):
+        with open(chunk_path(upload.id, index), 'rb') as f:
+            while True:
+                block = f.read(ASSEMBLE_READ_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+                assembled.write(block)
+    assembled.seek(0)
+    assembled.size = upload.total_size
+    assembled.sha256 = hasher.hexdigest()
+    return assembled
+
+
+@admission.admission_control
+def complete_upload_view(request, upload_id):
+    """
+    Assembles the chunks and creates the Submission + process_submission job the same
+    way submit_assignment_view does, behind the same rate limits and load shedding.
+    Safe to retry: a finalized upload returns its submission, and one whose task
+    could not be queued queues it for the same row.
+    """
+    with Trace('http.upload_complete', method=request.method) as trace:
+        response = _complete_upload(request, upload_id, trace)
+        trace.set(status_code=response.status_code)
+        return response
+
+
+def _complete_upload(request, upload_id, trace):
+    if request.method != 'POST':
+        return _method_not_allowed(request, 'POST')
+    upload, error = _get_active_upload(upload_id)
+    if error:
+        return error
+
+    if upload.submission_id and upload.completed_at:
+        # The client lost our previous response; answer it again
+        return JsonResponse({
+            'status': 'success',
+            'message': f"Assignment already submitted. ID: {upload.submission_id}.",
+            'submission_id': upload.submission_id,
+            'task_id': upload.submission.celery_task_id,
+        }, status=200)
+
+    state = _upload_state(upload)
+    if state['missing_chunks'] and not upload.submission_id:
+        return _error('Upload is missing chunks.', 409, missing_chunks=state['missing_chunks'])
+    if not upload.submission_id:
+        rejection = admission.check_student(upload.student_name)
+        if rejection is not None:
+            trace.set(rejected='student_rate')
+            return rejection
+
+    # Claim the upload so concurrent finalize calls can't create two submissions
+    claimed = UploadSession.objects.filter(pk=upload.pk, completed_at__isnull=True).update(completed_at=timezone.now())
+    if not claimed:
+        return _error('Upload is already being finalized.', 409)
+
+    assembled = None
+    try:
+        if upload.submission_id:
+            # An earlier finalize stored the submission but could not queue its task
+            submission_instance = upload.submission
+        else:
+            with trace.phase('assemble'):
+                assembled = _assemble(upload)
+            form = SubmissionForm({'student_name': upload.student_name}, {'uploaded_file': assembled})
+            if not form.is_valid():
+                UploadSession.objects.filter(pk=upload.pk).update(completed_at=None)
+                return _error('Form validation failed.', 400, errors=form.errors.get_json_data())
+
+            submission_instance = form.save(commit=False)
+            save_pending(submission_instance, trace)
+            # Linked before queueing: if the broker is down, the retry re-queues this row
+            UploadSession.objects.filter(pk=upload.pk).update(submission=submission_instance)
+        task = enqueue(submission_instance, trace)
+    except Exception as e:
+        trace.fail(e)
+        UploadSession.objects.filter(pk=upload.pk).update(completed_at=None) # Let the client retry
+        logger.exception("Finalizing upload %s failed", upload.pk)
+        return _error(f'Internal server error while finalizing upload: {e}', 500)
+    finally:
+        if assembled is not None:
+            assembled.close()
+
+    shutil.rmtree(staging_dir(upload.id), ignore_errors=True)
+    trace.set(submission_id=submission_instance.id, task_id=task.id, size=upload.total_size)
+    estimate = admission.queue_estimate()
+    success_message = f"Assignment submitted successfully! ID: {submission_instance.id} (Task ID: {task.id}). Processing started."
+    return JsonResponse({
+        'status': 'success',
+        'message': success_message,
+        'submission_id': submission_instance.id,
+        'task_id': task.id,
+        **estimate, # queue_position, eta_seconds
+    }, status=201)
\ No newline at end of file
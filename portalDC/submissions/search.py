@@ -0,0 +1,180 @@
+# submissions/search.py
+"""
+Full-text search over the text extracted from submissions:
+
+    GET search/?q="binary search" recursion&limit=20&offset=0&status=...&student_name=...
+
+The index is the submission_search table (migration 0014), one row per processed
+submission, kept up to date by the index_submission_text task that
+merge_extracted_text queues when a submission completes:
+
+- SQLite: an FTS5 table ranked with bm25(), snippets from snippet()
+- PostgreSQL: a tsvector column with a GIN index (SUBMISSION_SEARCH_CONFIG),
+  ranked with ts_rank_cd(), snippets from ts_headline() on the page of hits only
+
+Words are ANDed; "quoted phrases" must appear in that order, so a line of code
+can be searched for. Queries never read files or scan extracted_text. Snippets
+are plain (unescaped) text with matches between SNIPPET_START and SNIPPET_END.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import JsonResponse
+
+from . import previews
+from .models import Submission
+
+TABLE = 'submission_search'
+SNIPPET_START = '[['
+SNIPPET_END = ']]'
+SNIPPET_WORDS = 16
+POSTGRES_MAX_CHARS = 1000000 # Text indexed per submission (a tsvector is limited to 1 MB)
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+HIT_FIELDS = ('id', 'student_name', 'status', 'submitted_at', 'blob_id')
+
+
+def fts5_query(query):
+    """
+    The user's query as an FTS5 expression: every word or "phrase" becomes a quoted
+    phrase, so operators and punctuation in it are never FTS5 syntax. '' if nothing
+    searchable is left.
+    """
+    terms = [phrase or word for phrase, word in _TERM_RE.findall(query)]
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms if re.search(r'\w', term))
+
+
+def index_submission(submission_id, text):
+    """(Re)indexes one submission's text; idempotent, so a retried task is harmless."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE {_key()} = %s', [submission_id])
+        if not text:
+            return
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'INSERT INTO {TABLE} (submission_id, document) VALUES (%s, to_tsvector(%s::regconfig, %s))',
+                           [submission_id, settings.SUBMISSION_SEARCH_CONFIG, text[:POSTGRES_MAX_CHARS]])
+        else:
+            cursor.execute(f'INSERT INTO {TABLE} (rowid, body) VALUES (%s, %s)', [submission_id, text])
+
+
+def remove(submission_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE {_key()} = %s', [submission_id])
+
+
+def rebuild():
+    """Re-indexes every submission that has extracted text with one INSERT ... SELECT; returns the row count."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"INSERT INTO {TABLE} (submission_id, document) "
+                           f"SELECT id, to_tsvector(%s::regconfig, left(extracted_text, %s)) FROM submissions_submission "
+                           f"WHERE extracted_text <> ''", [settings.SUBMISSION_SEARCH_CONFIG, POSTGRES_MAX_CHARS])
+        else:
+            cursor.execute(f"INSERT INTO {TABLE} (rowid, body) "
+                           f"SELECT id, extracted_text FROM submissions_submission WHERE extracted_text <> ''")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _key():
+    return 'submission_id' if connection.vendor == 'postgresql' else 'rowid'
+
+
+def _filters(status, student_name):
+    sql, params = '', []
+    if status:
+        sql += ' AND s.status = %s'
+        params.append(status)
+    if student_name:
+        sql += ' AND s.student_name = %s'
+        params.append(student_name)
+    return sql, params
+
+
+def search(query, limit, offset=0, status=None, student_name=None):
+    """
+    [(submission id, score, snippet)] best match first (higher scores are better),
+    at most `limit` of them starting at `offset`.
+    """
+    where, params = _filters(status, student_name)
+    if connection.vendor == 'postgresql':
+        config = settings.SUBMISSION_SEARCH_CONFIG
+        # Rank and page on the index first; ts_headline re-reads the text of this page's hits only
+        sql = (
+            f"SELECT hits.id, hits.score, ts_headline(%s::regconfig, t.extracted_text, hits.query, %s) "
+            f"FROM (SELECT s.id, q.query, ts_rank_cd(i.document, q.query) AS score "
+            f"      FROM {TABLE} i CROSS JOIN websearch_to_tsquery(%s::regconfig, %s) AS q(query) "
+            f"      JOIN submissions_submission s ON s.id = i.submission_id "
+            f"      WHERE i.document @@ q.query{where} ORDER BY score DESC, s.id LIMIT %s OFFSET %s) hits "
+            f"JOIN submissions_submission t ON t.id = hits.id ORDER BY hits.score DESC, hits.id"
+        )
+        options = (f'StartSel="{SNIPPET_START}", StopSel="{SNIPPET_END}", MaxWords={SNIPPET_WORDS}, '
+                   f'MinWords={SNIPPET_WORDS // 2}, MaxFragments=2, FragmentDelimiter=" … "')
+        params = [config, options, config, query, *params, limit, offset]
+    else:
+        expression = fts5_query(query)
+        if not expression:
+            return []
+        sql = (
+            f"SELECT s.id, -bm25({TABLE}), snippet({TABLE}, 0, %s, %s, ' … ', %s) "
+            f"FROM {TABLE} JOIN submissions_submission s ON s.id = {TABLE}.rowid "
+            f"WHERE {TABLE} MATCH %s{where} ORDER BY bm25({TABLE}), s.id LIMIT %s OFFSET %s"
+        )
+        params = [SNIPPET_START, SNIPPET_END, SNIPPET_WORDS, expression, *params, limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def search_view(request):
+    """
+    GET search/?q=...&limit=20&offset=0&status=...&student_name=... -- ranked hits with
+    snippets (staff only). next_offset continues with the next page, None on the last.
+    """
+    if request.method != 'GET':
+        return _error(f'Method {request.method} not allowed. Please use GET.', 405)
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    if not request.user.is_staff:
+        return _error('Only staff may search submissions.', 403)
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return _error('Missing search query (q).', 400)
+    try:
+        limit = int(request.GET.get('limit', settings.SUBMISSION_SEARCH_DEFAULT_LIMIT))
+        offset = int(request.GET.get('offset', 0))
+    except ValueError:
+        return _error('limit and offset must be integers.', 400)
+    if not 1 <= limit <= settings.SUBMISSION_SEARCH_MAX_LIMIT or offset < 0:
+        return _error(f'limit must be between 1 and {settings.SUBMISSION_SEARCH_MAX_LIMIT}, offset >= 0.', 400)
+
+    # One extra row tells whether there is another page
+    hits = search(query, limit + 1, offset, request.GET.get('status'), request.GET.get('student_name'))
+    rows = Submission.objects.only(*HIT_FIELDS).in_bulk([pk for pk, _, _ in hits[:limit]])
+    results = []
+    for pk, score, snippet in hits[:limit]:
+        submission = rows.get(pk)
+        if submission is None:
+            continue # Deleted since the query ran
+        results.append({
+            'id': pk,
+            'student_name': submission.student_name,
+            'status': submission.status,
+            'submitted_at': submission.submitted_at,
+            'score': round(score, 4),
+            'snippet': snippet,
+            'thumbnail_url': previews.preview_url(submission.blob_id) if submission.blob_id else None,
+        })
+    return JsonResponse({
+        'status': 'success',
+        'query': query,
+        'hits': results,
+        'next_offset': offset + limit if len(hits) > limit else None,
+    })
\ No newline at end of file
@@ -0,0 +1,35 @@
+# submissions/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .models import Blob, Submission, SubmissionStatusCount
+
+
+@receiver(post_delete, sender=Submission)
+def release_submission_blob(sender, instance, **kwargs):
+    # Drop this submission's reference; the blob file is removed with the last one
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
+@receiver(post_delete, sender=Submission)
+def unindex_submission(sender, instance, **kwargs):
+    # FTS5 tables have no foreign keys (PostgreSQL's index row goes with ON DELETE CASCADE)
+    if instance.extracted_text or 'extracted_text' in instance.get_deferred_fields():
+        search.remove(instance.pk)
+
+
+@receiver(post_save, sender=Submission)
+def count_new_submission(sender, instance, created, **kwargs):
+    # Status changes are counted by Submission.objects.transition()
+    if created:
+        SubmissionStatusCount.objects.adjust(instance.student_name, instance.status, 1)
+
+
+@receiver(pre_delete, sender=Submission)
+def uncount_submission(sender, instance, **kwargs):
+    # Runs inside the delete's transaction; the instance's own status may be stale
+    status = Submission.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    if status is not None:
+        SubmissionStatusCount.objects.adjust(instance.student_name, status, -1)
\ No newline at end of file
@@ -0,0 +1,115 @@
+# submissions/similarity.py
+"""
+Near-duplicate detection over submission text with MinHash + LSH.
+
+Each submission's text is cut into word shingles and summarised by a MinHash
+signature of NUM_PERM 32-bit values (a NumPy array, stored as bytes). The
+signature is split into BANDS bands; every band is hashed to a bucket key and
+indexed in LSHBucket. A new submission is compared only against submissions
+sharing at least one bucket, so a check costs a few indexed lookups plus one
+vectorised comparison, regardless of how many submissions are indexed.
+
+With 32 bands of 4 rows, pairs around 0.42 Jaccard similarity have a 50%
+chance of becoming candidates; pairs above 0.6 almost always do.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import LSHBucket, Submission, SubmissionSignature
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+BATCH = 4096 # Shingles hashed per NumPy step; bounds memory to BATCH x NUM_PERM
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: every process must draw the same permutations for signatures to be comparable
+_rng = np.random.RandomState(20250401)
+_A = _rng.randint(1, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def shingle_hashes(text):
+    """Unique 32-bit hashes of the SHINGLE_WORDS-word shingles of the text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = [' '.join(words)] if words else []
+    else:
+        shingles = (' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    return np.unique(np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64))
+
+
+def minhash(text):
+    """MinHash signature (uint32 array of NUM_PERM values), or None if the text has no words."""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    with np.errstate(over='ignore'): # The universal hash relies on uint64 wrap-around
+        for start in range(0, len(hashes), BATCH):
+            batch = hashes[start:start + BATCH, np.newaxis]
+            permuted = np.bitwise_and((batch * _A + _B) % _MERSENNE_PRIME, _MAX_HASH)
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def band_keys(signature):
+    """One signed 64-bit bucket key per band (band index is mixed in so bands never collide)."""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8,
+                                 salt=band.to_bytes(2, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def find_similar(signature, keys, exclude_student):
+    """[(submission_id, estimated Jaccard)] for indexed submissions sharing a bucket, best first."""
+    candidates = (LSHBucket.objects.filter(key__in=keys)
+                  .exclude(submission__student_name=exclude_student)
+                  .values_list('submission_id', flat=True).distinct())
+    rows = list(SubmissionSignature.objects.filter(submission_id__in=candidates).values_list('submission_id', 'minhash'))
+    if not rows:
+        return []
+    ids = np.array([row[0] for row in rows])
+    matrix = np.frombuffer(b''.join(bytes(row[1]) for row in rows), dtype=np.uint32).reshape(len(rows), NUM_PERM)
+    scores = (matrix == signature).mean(axis=1)
+    order = np.argsort(-scores)
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def index_submission(submission):
+    """
+    Compares the submission against the index, stores the result on it and adds it
+    to the index. Returns the list of matches stored in similar_submissions.
+    """
+    signature = minhash(submission.extracted_text)
+    if signature is None:
+        submission.similarity_score = None
+        submission.similar_submissions = []
+        return []
+
+    keys = band_keys(signature)
+    threshold = settings.SUBMISSION_SIMILARITY_THRESHOLD
+    scored = [(pk, score) for pk, score in find_similar(signature, keys, submission.student_name) if score >= threshold]
+    scored = scored[:settings.SUBMISSION_SIMILARITY_MAX_MATCHES]
+    names = dict(Submission.objects.filter(pk__in=[pk for pk, _ in scored]).values_list('id', 'student_name'))
+    matches = [{'id': pk, 'student_name': names.get(pk), 'score': round(score, 3)} for pk, score in scored]
+
+    with transaction.atomic():
+        SubmissionSignature.objects.update_or_create(submission=submission, defaults={'minhash': signature.tobytes()})
+        LSHBucket.objects.filter(submission=submission).delete() # Re-indexing replaces old buckets
+        LSHBucket.objects.bulk_create(LSHBucket(key=key, submission=submission) for key in keys)
+
+    submission.similarity_score = matches[0]['score'] if matches else 0.0
+    submission.similar_submissions = matches
+    return matches
\ No newline at end of file
@@ -0,0 +1,89 @@
+# submissions/status_cache.py
+"""
+Cache of the JSON served by the status endpoints, keyed by submission id.
+
+Each entry holds the response data plus its ETag and Last-Modified time, so a
+poll carrying a matching If-None-Match is answered with a 304 straight from the
+cache. Tasks call refresh() once a status change has committed.
+
+Readers only fill missing entries (cache.add) and refresh() always overwrites, so a
+poller that read the row just before a change committed can't cache the old state
+over the new one: its add either comes before the refresh (and is overwritten) or
+after it (and is refused).
+"""
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Submission
+
+# Columns needed to build a status entry; the rest of the row is never loaded
+STATUS_FIELDS = ('id', 'student_name', 'status', 'file_name', 'uploaded_file', 'submitted_at',
+                 'status_changed_at', 'completed_at', 'similarity_score', 'similar_submissions')
+
+
+def cache_key(pk):
+    return f'submission-status:{pk}'
+
+
+def build_entry(submission):
+    # file_name is the logical per-student path; uploaded_file points at the shared blob
+    file_name = os.path.basename(submission.file_name or submission.uploaded_file.name) if submission.uploaded_file else None
+    data = {
+        'id': submission.id,
+        'student_name': submission.student_name,
+        'status': submission.status, # This is the submission status itself
+        'file_name': file_name,
+        'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
+        'status_changed_at': submission.status_changed_at.isoformat(),
+        'completed_at': submission.completed_at.isoformat() if submission.completed_at else None,
+        'similarity_score': submission.similarity_score, # None until the similarity check has run
+        'similar_submissions': submission.similar_submissions,
+    }
+    etag = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return {'data': data, 'etag': f'"{etag}"', 'last_modified': submission.status_changed_at.timestamp()}
+
+
+def get_entry(pk):
+    """Returns the cached status entry for one submission, or None if it doesn't exist."""
+    entry = cache.get(cache_key(pk))
+    if entry is None:
+        submission = Submission.objects.only(*STATUS_FIELDS).filter(pk=pk).first()
+        if submission is None:
+            return None
+        entry = build_entry(submission)
+        cache.add(cache_key(pk), entry, settings.SUBMISSION_STATUS_CACHE_TIMEOUT)
+    return entry
+
+
+def get_entries(pks):
+    """Returns {pk: entry} for the given ids with one cache round trip and at most one query."""
+    keys = {cache_key(pk): pk for pk in pks}
+    entries = {keys[key]: entry for key, entry in cache.get_many(keys).items()}
+    missing = [pk for pk in pks if pk not in entries]
+    if missing:
+        for submission in Submission.objects.only(*STATUS_FIELDS).filter(pk__in=missing):
+            entries[submission.id] = build_entry(submission)
+            # add, not set_many: there is no multi-key add, and a refresh() may have won meanwhile
+            cache.add(cache_key(submission.id), entries[submission.id], settings.SUBMISSION_STATUS_CACHE_TIMEOUT)
+    return entries
+
+
+def refresh_many(pks):
+    """
+    Re-caches the entries of these submissions from their committed rows, overwriting
+    whatever is cached; call it after the transaction that changed them. Returns {pk: entry}.
+    """
+    entries = {submission.id: build_entry(submission)
+               for submission in Submission.objects.only(*STATUS_FIELDS).filter(pk__in=pks)}
+    cache.set_many({cache_key(pk): entry for pk, entry in entries.items()}, settings.SUBMISSION_STATUS_CACHE_TIMEOUT)
+    cache.delete_many([cache_key(pk) for pk in pks if pk not in entries]) # Deleted meanwhile
+    return entries
+
+
+def refresh(pk):
+    """refresh_many for one submission; returns its entry, or None if it doesn't exist."""
+    return refresh_many([pk]).get(pk)
\ No newline at end of file
@@ -0,0 +1,158 @@
+# submissions/storage.py
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.functional import cached_property
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under a name derived from its SHA-256:
+
+        blobs/<aa>/<bb>/<sha256>.pdf
+
+    Identical bytes therefore land on the same name and are stored once. The
+    two-level shard keeps directories small, and since a name can only ever
+    hold one content there is nothing to probe for in get_available_name().
+    Reference counting lives in the Blob model; this class only moves bytes.
+
+    Blobs are written to the local disk (the hot tier). With SUBMISSION_COLD_STORAGE
+    set, old blobs can be copied to a second Django storage (the cold tier, usually
+    S3-compatible object storage) under the same name and dropped locally; reads
+    fall back to the cold copy and local_path() brings it back. Which tier a blob
+    is in, and when it moves, is decided by submissions/tiering.py.
+    """
+
+    blob_prefix = 'blobs'
+    blob_suffix = '.pdf'
+
+    def blob_name(self, digest):
+        return '/'.join([self.blob_prefix, digest[:2], digest[2:4], digest + self.blob_suffix])
+
+    @staticmethod
+    def digest_from_name(name):
+        return os.path.splitext(os.path.basename(name))[0]
+
+    @staticmethod
+    def hash_content(content):
+        # Uploads coming through StreamingPDFUploadHandler were hashed while streaming
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            return digest
+        hasher = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return hasher.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        # Constant time: the name is replaced by the content address in _save()
+        return name
+
+    def _save(self, name, content):
+        name = self.blob_name(self.hash_content(content))
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Same bytes already stored; the upload is simply dropped. The caller holds a
+            # reference on the Blob (Submission.store_upload), so they can't be purged now.
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # Streamed uploads live on the same filesystem, so this is a rename
+                file_move_safe(content.temporary_file_path(), full_path)
+            else:
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+                # Atomic; a concurrent writer of the same blob wrote the same bytes
+                os.replace(tmp_path, full_path)
+        except FileExistsError:
+            pass  # Lost a race against an identical upload, which is fine
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    @cached_property
+    def cold(self):
+        """The cold tier's storage (a STORAGES alias), or None when everything stays local."""
+        alias = settings.SUBMISSION_COLD_STORAGE
+        return storages[alias] if alias else None
+
+    def is_local(self, name):
+        return os.path.exists(self.path(name))
+
+    def _open(self, name, mode='rb'):
+        if self.cold is not None and not self.is_local(name):
+            return self.cold.open(name, mode) # Demoted; stream it from the cold tier
+        return super()._open(name, mode)
+
+    def exists(self, name):
+        return super().exists(name) or (self.cold is not None and self.cold.exists(name))
+
+    def size(self, name):
+        if self.cold is not None and not self.is_local(name):
+            return self.cold.size(name)
+        return super().size(name)
+
+    def delete(self, name):
+        super().delete(name)
+        if self.cold is not None:
+            self.cold.delete(name)
+
+    def copy_to_cold(self, name):
+        """Uploads the local blob to the cold tier unless an earlier demotion left it there."""
+        if self.cold.exists(name):
+            return
+        with open(self.path(name), 'rb') as f:
+            stored = self.cold.save(name, f)
+        if stored != name:
+            # The cold storage renamed it (e.g. FileSystemStorage probing for a free name)
+            self.cold.delete(stored)
+            raise RuntimeError(f"Cold storage stored {name} as {stored}; it must keep names as given")
+
+    def delete_local(self, name):
+        super().delete(name)
+
+    def local_path(self, name):
+        """
+        Path of the blob on the local disk, downloading it from the cold tier first
+        if it was demoted. Raises FileNotFoundError if neither tier has it.
+        """
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return full_path
+        if self.cold is None or not self.cold.exists(name):
+            raise FileNotFoundError(f"File not found at path: {full_path}")
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f, self.cold.open(name, 'rb') as source:
+                shutil.copyfileobj(source, f, 1024 * 1024)
+            os.replace(tmp_path, full_path) # Concurrent recalls write the same bytes
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return full_path
+
+
+submission_storage = ContentAddressedStorage()
+
+
+def get_submission_storage():
+    """Storage used by Submission.uploaded_file (a callable keeps migrations stable)."""
+    return submission_storage
\ No newline at end of file
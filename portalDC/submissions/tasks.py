@@ -1,72 +1,436 @@
 # submissions/tasks.py
-import time
+import inspect
+import logging
 import os # Import os if needed for path manipulation
-from celery import shared_task
-from .models import Submission # Import the model
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from celery import Task, chord, group, shared_task
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from kombu.exceptions import OperationalError as BrokerOperationalError
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from . import admission, events, pdf, previews, search, similarity, status_cache, tiering
+from .models import Blob, FailedTask, Submission, SubmissionBatch, SubmissionStatusCount # Import the model
+from .tracing import Trace, phase
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: a locked/unreachable database, a file not visible yet on a
+# shared filesystem, a broker or Redis blip. Anything else (e.g. a corrupt PDF) fails at once.
+TRANSIENT_ERRORS = (
+    OperationalError, InterfaceError, OSError,
+    BrokerOperationalError, RedisConnectionError, RedisTimeoutError,
+)
+
+
+class SubmissionTask(Task):
+    """
+    Base class of the processing tasks. Retries transient errors with jittered
+    exponential backoff (2s, 4s, 8s ... capped at SUBMISSION_TASK_RETRY_BACKOFF_MAX)
+    and records tasks that fail for good as FailedTask dead letters. Messages are
+    acknowledged only after the task ends (CELERY_TASK_ACKS_LATE), so the tasks
+    must be safe to run twice.
+
+    Tasks declared with marks_failed=True also set their submission to FAILED.
+    """
+    autoretry_for = TRANSIENT_ERRORS
+    retry_backoff = 2
+    retry_backoff_max = settings.SUBMISSION_TASK_RETRY_BACKOFF_MAX
+    retry_jitter = True
+    max_retries = settings.SUBMISSION_TASK_MAX_RETRIES
+    marks_failed = False
+
+    def before_start(self, task_id, args, kwargs):
+        self.request.started = time.perf_counter()
+        self.request.started_at = timezone.now().isoformat()
+
+    def first_attempt_at(self):
+        """When the first run of this task started; carried across retries in a message header."""
+        return getattr(self.request, 'first_attempt_at', None) or self.request.started_at
+
+    def retry(self, *args, **kwargs):
+        kwargs['headers'] = {**(kwargs.get('headers') or {}), 'first_attempt_at': self.first_attempt_at()}
+        return super().retry(*args, **kwargs)
 
-@shared_task(bind=True) # Use bind=True to access task instance (self) if needed
+    def submission_id(self, args, kwargs):
+        try:
+            return inspect.signature(self.run).bind(*args, **kwargs).arguments.get('submission_id')
+        except TypeError:
+            return None
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        submission_id = self.submission_id(args, kwargs)
+        started = getattr(self.request, 'started', None)
+        try:
+            FailedTask.objects.update_or_create(task_id=task_id, defaults={
+                'task_name': self.name,
+                'args': list(args),
+                'kwargs': kwargs,
+                'submission_id': submission_id if submission_id and Submission.objects.filter(pk=submission_id).exists() else None,
+                'exception': type(exc).__name__,
+                'message': str(exc),
+                'traceback': str(einfo),
+                'attempts': self.request.retries + 1,
+                'first_attempt_at': parse_datetime(self.first_attempt_at()),
+                'failed_at': timezone.now(),
+                'last_attempt_ms': round((time.perf_counter() - started) * 1000, 3) if started else None,
+                'requeued_at': None,
+            })
+            if self.marks_failed and submission_id:
+                _mark_failed(submission_id)
+        except Exception:
+            # The database may be what failed in the first place; the worker log still has it
+            logger.exception("Could not record dead letter for task %s [%s]", self.name, task_id)
+
+
+@shared_task(bind=True, base=SubmissionTask, marks_failed=True) # Use bind=True to access task instance (self) if needed
 def process_submission(self, submission_id, student_name, file_path):
     """
-    Processes an assignment submission using its ID and file path.
+    Validates an assignment submission using its ID and file path: reads the page
+    count and metadata, then queues text extraction in page-range tasks of
+    SUBMISSION_PAGES_PER_TASK pages that run in parallel on the extraction queue;
+    merge_extracted_text then stores the text and completes the submission.
+    Logs one trace record with the time spent on DB updates and on processing.
+
+    Only runs if it can claim the submission (see _claim), so duplicate deliveries
+    and re-runs of finished submissions are no-ops.
+    """
+    with Trace('task.process_submission', task_id=self.request.id, submission_id=submission_id,
+               attempt=self.request.retries + 1) as trace:
+        result = _process_submission(submission_id, self.request.id, file_path, trace)
+        trace.set(outcome=result)
+        return result
+
+
+def _status_changed(submission_id):
+    # Re-reads just the status columns and overwrites the cached entry, so pollers see the change
+    entry = status_cache.refresh(submission_id)
+    if entry is not None:
+        events.publish_status(entry['data']) # Push to SSE listeners
+
+
+def _transition(submission_id, to, trace=None, **fields):
+    """Conditional status change (Submission.TRANSITIONS); publishes it if the row moved."""
+    with phase(trace, 'db_update'):
+        moved = Submission.objects.filter(pk=submission_id).transition(to, **fields)
+    if moved:
+        _status_changed(submission_id)
+        if to in ('COMPLETE', 'FAILED'):
+            admission.record_finished(moved) # Measured throughput behind the submit ETA
+    return moved
+
+
+def _mark_failed(submission_id):
+    return _transition(submission_id, 'FAILED') # No-op once COMPLETE
+
+
+def _claim(submission_id, task_id, trace=None):
+    """
+    Per-submission lock: atomically moves the submission to PROCESSING under this
+    task id. Succeeds for a PENDING or FAILED submission, or for one this same task
+    already holds (a retry, or a redelivery after a worker died mid-task).
+    """
+    with phase(trace, 'db_update'):
+        claimable = Q(status__in=['PENDING', 'FAILED']) | Q(celery_task_id=task_id)
+        moved = Submission.objects.filter(claimable, pk=submission_id).transition('PROCESSING', celery_task_id=task_id)
+    if moved:
+        _status_changed(submission_id)
+    return moved
+
+
+def _page_ranges(page_count):
+    step = settings.SUBMISSION_PAGES_PER_TASK
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def _process_submission(submission_id, task_id, file_path, trace):
+    if not _claim(submission_id, task_id, trace):
+        current = Submission.objects.filter(pk=submission_id).values_list('status', 'celery_task_id').first()
+        if current is None:
+            # No submission object to update status on
+            result = f"Failed to process: Submission with ID {submission_id} not found."
+            trace.fail(result)
+            return result # Return failure message
+        return f"Skipped submission {submission_id}: already {current[0].lower()} (task {current[1]})."
+
+    # --- Actual Processing Logic ---
+    # Errors propagate: transient ones are retried, anything else ends up as a dead
+    # letter and FAILED status (SubmissionTask.on_failure)
+    with trace.phase('processing'):
+        # Check if the file actually exists at the given path (downloading it again
+        # if it has been moved to the cold tier since the task was queued)
+        file_path = tiering.local_path(file_path)
+
+        # Only parses the document structure; no page content is loaded yet
+        page_count, pdf_metadata = pdf.read_info(file_path)
+        ranges = _page_ranges(page_count)
+    trace.set(pages=page_count, page_tasks=len(ranges))
+
+    # Text extraction always runs on the 'extraction' queue (see CELERY_TASK_ROUTES), so
+    # this worker is free for the next validation. The callback stores the page info
+    # together with the text and completes the submission in a single UPDATE.
+    with trace.phase('enqueue'):
+        callback = merge_extracted_text.s(submission_id, page_count, pdf_metadata)
+        chord(
+            extract_page_range.s(submission_id, file_path, start, stop) for start, stop in ranges
+        )(callback.on_error(mark_submission_failed.s(submission_id)))
+        if settings.SUBMISSION_PREVIEW_PRERENDER:
+            blob_id = Submission.objects.filter(pk=submission_id).values_list('blob_id', flat=True).first()
+            if blob_id is not None: # Files stored before the blob store have no preview cache entry
+                render_previews.delay(blob_id) # So graders' first look is a cache hit
+    # --- End Processing Logic ---
+    return f"Split submission {submission_id} into {len(ranges)} page-range task(s)."
+
+
+@shared_task(base=SubmissionTask)
+def extract_page_range(submission_id, file_path, start, stop):
+    """Text of pages [start, stop) of one submission; one chord member of process_submission."""
+    with Trace('task.extract_page_range', submission_id=submission_id, start=start, stop=stop) as trace:
+        with trace.phase('processing'):
+            return pdf.extract_text(tiering.local_path(file_path), start, stop)
+
+
+@shared_task(base=SubmissionTask, marks_failed=True)
+def merge_extracted_text(texts, submission_id, page_count=None, pdf_metadata=None):
+    """Chord callback: joins the page-range texts in order and completes the submission."""
+    with Trace('task.merge_extracted_text', submission_id=submission_id) as trace:
+        completed = _transition(submission_id, 'COMPLETE', trace, extracted_text=pdf.PAGE_SEPARATOR.join(texts),
+                                page_count=page_count, pdf_metadata=pdf_metadata or {})
+        if not completed:
+            return f"Skipped submission {submission_id}: no longer processing."
+        check_similarity.delay(submission_id)
+        index_submission_text.delay(submission_id)
+        return f"Successfully processed submission {submission_id}."
+
+
+@shared_task(base=SubmissionTask)
+def check_similarity(submission_id):
+    """Compares a processed submission against the MinHash-LSH index and stores the matches."""
+    with Trace('task.check_similarity', submission_id=submission_id) as trace:
+        with trace.phase('db_update'):
+            submission = Submission.objects.only('id', 'student_name', 'extracted_text').get(pk=submission_id)
+        with trace.phase('similarity'):
+            matches = similarity.index_submission(submission)
+        trace.set(matches=len(matches))
+        with trace.phase('db_update'):
+            # Not a status change, but the status payload changed: move Last-Modified too
+            Submission.objects.filter(pk=submission_id).update(
+                similarity_score=submission.similarity_score,
+                similar_submissions=submission.similar_submissions,
+                status_changed_at=timezone.now(),
+            )
+        _status_changed(submission_id)
+        return matches
+
+
+@shared_task(base=SubmissionTask)
+def index_submission_text(submission_id):
+    """Adds a processed submission's text to the full-text search index (see search.py)."""
+    with Trace('task.index_submission_text', submission_id=submission_id) as trace:
+        with trace.phase('db_update'):
+            text = Submission.objects.filter(pk=submission_id).values_list('extracted_text', flat=True).first()
+            if text is None:
+                return False # Deleted meanwhile
+            search.index_submission(submission_id, text)
+        trace.set(chars=len(text))
+        return True
+
+
+@shared_task(base=SubmissionTask)
+def render_previews(digest):
+    """Renders a blob's first-page previews into the preview cache (see previews.py)."""
+    try:
+        previews.get_preview(digest, 'thumb')
+    except previews.PreviewError as e:
+        logger.info("No preview for blob %s: %s", digest, e) # Served as a 422 on request; not a task failure
+        return False
+    return True
+
+
+@shared_task
+def evict_previews():
+    """Periodic trim of the preview cache to SUBMISSION_PREVIEW_CACHE_SIZE (scheduled by celery beat)."""
+    return previews.evict()
+
+
+@shared_task
+def mark_submission_failed(request, exc, traceback, submission_id):
+    """Error callback of the extraction chord."""
+    logger.error("Page extraction failed for submission %s: %s", submission_id, exc)
+    _mark_failed(submission_id)
+
+
+@shared_task
+def purge_expired_uploads():
+    """Periodic cleanup of resumable uploads that were never finished (scheduled by celery beat)."""
+    from .resumable import purge_expired_uploads as purge # Imported lazily: resumable imports this module
+    removed = purge()
+    logger.info("Purged %d expired upload(s).", removed)
+    return removed
+
+
+@shared_task
+def migrate_blob_tiers():
+    """Periodic move of old blobs to the cold storage tier (see tiering.py; scheduled by celery beat)."""
+    purged = Blob.objects.purge_unreferenced()
+    if purged:
+        logger.info("Purged %d unreferenced blob(s).", purged)
+    demoted = tiering.migrate_blob_tiers()
+    logger.info("Moved %d blob(s) to the cold tier.", demoted)
+    return demoted
+
+
+@shared_task
+def throughput_probe(work_ms):
+    """Burns work_ms of CPU and returns; queued in bulk by the measure_throughput command."""
+    deadline = time.perf_counter() + work_ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+    return work_ms
+
+
+def _processing_signature(submission):
+    # Uses the task id already stored on the row, so it never has to be written again
+    return process_submission.signature(
+        (submission.id, submission.student_name, submission.uploaded_file.path),
+        task_id=submission.celery_task_id,
+    )
+
+
+def save_pending(submission, trace=None):
+    """
+    Saves a new (unsaved) Submission as PENDING. The task id is chosen up front and
+    stored with the row, so the submission is written exactly once (a single INSERT).
+    """
+    with phase(trace, 'file_save'):
+        submission.status = 'PENDING' # Set initial status
+        submission.celery_task_id = str(uuid.uuid4()) # Store Celery task ID with the row
+        submission.save() # Save to DB (also saves file)
+
+    # Ensure file path is accessible (critical for Celery)
+    if not submission.uploaded_file:
+        raise ValueError("File not found on submission instance after save.")
+
+
+def enqueue(submission, trace=None):
+    """Queues process_submission for a saved submission under its stored task id. Returns the AsyncResult."""
+    with phase(trace, 'enqueue'):
+        return _processing_signature(submission).apply_async()
+
+
+def save_and_enqueue(submission, trace=None):
+    """
+    Saves a new (unsaved) Submission as PENDING and queues process_submission for it.
+    Shared by every entry point that creates submissions. Returns the AsyncResult.
+    """
+    save_pending(submission, trace)
+    return enqueue(submission, trace)
+
+
+async def asave_and_enqueue(submission, trace=None):
+    """
+    save_and_enqueue for async views: the INSERT goes through the async ORM and the
+    broker publish runs in a worker thread, so neither blocks the event loop.
+    """
+    with phase(trace, 'file_save'):
+        submission.status = 'PENDING'
+        submission.celery_task_id = str(uuid.uuid4())
+        await submission.asave() # Also moves the file into the blob store
+
+    if not submission.uploaded_file:
+        raise ValueError("File not found on submission instance after save.")
+
+    with phase(trace, 'enqueue'):
+        # kombu's publish is blocking socket I/O; thread_sensitive=False keeps it off the
+        # request's ORM thread so it overlaps with other requests' database work
+        task = await sync_to_async(_processing_signature(submission).apply_async, thread_sensitive=False)()
+    return task
+
+
+def save_and_enqueue_batch(batch, submissions, trace=None):
+    """
+    Batch version of save_and_enqueue: stores every upload, inserts all rows with one
+    bulk_create in a single transaction, then queues their process_submission tasks
+    as one chord whose callback is finalize_batch. Returns the chord's AsyncResult.
+
+    The files are stored before that transaction, each upload committing its own
+    blob reference, so no database lock is held while up to SUBMISSION_BATCH_MAX_UPLOAD_SIZE
+    bytes are copied. If anything fails the references are released again.
     """
-    print(f"Task ID: {self.request.id} - Received submission ID: {submission_id}")
+    stored = []
     try:
-        # Fetch the submission object from the database
-        submission = Submission.objects.get(pk=submission_id)
-        submission.status = 'PROCESSING'
-        submission.save(update_fields=['status']) # Update status immediately
-        print(f"Processing submission {submission.id} from {submission.student_name}...")
-        print(f"File expected at: {submission.uploaded_file.path}") # Path from DB
-        print(f"File path received by task: {file_path}") # Path passed as argument
-
-        # --- Actual Processing Logic ---
-        # Check if the file actually exists at the given path
-        if not os.path.exists(file_path):
-             raise FileNotFoundError(f"File not found at path: {file_path}")
-
-        # Simulate work (e.g., read file content, plagiarism check)
-        print(f"Simulating work on {os.path.basename(file_path)}...")
-        # with open(file_path, 'rb') as f:
-        #     content = f.read() # Example: reading file content
-        #     print(f"Read {len(content)} bytes.")
-        time.sleep(10) # Simulate long processing
-
-        result = f"Successfully processed submission {submission_id}."
-        print(result)
-        submission.status = 'COMPLETE'
-        # --- End Processing Logic ---
-
-    except Submission.DoesNotExist:
-        result = f"Failed to process: Submission with ID {submission_id} not found."
-        print(result)
-        # No submission object to update status on
-        # Potentially log this error more formally
-        # You might want Celery to retry or just log the failure
-        return result # Return failure message
-
-    except FileNotFoundError as e:
-        result = f"Failed to process submission {submission_id}: {e}"
-        print(result)
-        if 'submission' in locals(): # Check if submission object was fetched
-            submission.status = 'FAILED'
-            submission.save(update_fields=['status'])
-        # Log error
-        return result # Return failure message
-
-    except Exception as e:
-        # Catch any other unexpected errors during processing
-        result = f"Unexpected error processing submission {submission_id}: {e}"
-        print(result)
-        if 'submission' in locals():
-            submission.status = 'FAILED'
-            submission.save(update_fields=['status'])
-        # Log error, maybe re-raise to let Celery handle retries if configured
-        # raise self.retry(exc=e, countdown=60) # Example retry
-        return result # Return failure message
-
-    finally:
-        # Ensure final status is saved if processing completed or failed expectedly
-        if 'submission' in locals() and submission.status != 'PENDING': # Avoid overwriting if error happened before fetch
-             submission.save(update_fields=['status'])
-
-    return result # Return success message
\ No newline at end of file
+        with phase(trace, 'file_save'):
+            for submission in submissions:
+                submission.batch = batch
+                submission.status = 'PENDING'
+                submission.celery_task_id = str(uuid.uuid4())
+                if submission.store_upload(): # Moves the file into the blob store
+                    stored.append(submission.blob_id)
+            with transaction.atomic():
+                Submission.objects.bulk_create(submissions, batch_size=500)
+                SubmissionStatusCount.objects.add_created(submissions) # bulk_create sends no post_save
+                batch.total = len(submissions)
+                batch.save(update_fields=['total'])
+    except BaseException:
+        for digest in stored:
+            Blob.objects.release(digest) # Purges the bytes no other submission uses
+        raise
+
+    with phase(trace, 'enqueue'):
+        callback = finalize_batch.s(batch.id).on_error(finalize_batch_failed.s(batch.id))
+        return chord(_processing_signature(submission) for submission in submissions)(callback)
+
+
+def _finalize_batch(batch_id):
+    rows = Submission.objects.filter(batch_id=batch_id).values_list('status').annotate(n=Count('pk')).order_by()
+    summary = dict(rows)
+    SubmissionBatch.objects.filter(pk=batch_id).update(validated_at=timezone.now(), summary=summary)
+    return summary
+
+
+@shared_task
+def finalize_batch(results, batch_id):
+    """Chord callback of save_and_enqueue_batch: every submission in the batch has been validated."""
+    summary = _finalize_batch(batch_id)
+    logger.info("Batch %s validated: %s", batch_id, summary)
+    return summary
+
+
+@shared_task
+def finalize_batch_failed(request, exc, traceback, batch_id):
+    """Error callback: a submission failed validation for good (it is FAILED and dead-lettered)."""
+    logger.warning("Batch %s: a submission failed validation: %s", batch_id, exc)
+    return _finalize_batch(batch_id)
+
+
+# Dead letters of these tasks restart the whole pipeline; a lone page range can't be resumed
+RESTARTED_BY_PROCESSING = {process_submission.name, extract_page_range.name, merge_extracted_text.name}
+
+
+def requeue_failed(dead_letters):
+    """
+    Re-dispatches the given FailedTask rows in one group: extraction failures restart
+    process_submission (once per submission), other tasks are re-sent with their
+    original arguments. Returns the number of tasks queued.
+    """
+    dead_letters = list(dead_letters.filter(requeued_at__isnull=True))
+    restart_ids = {d.submission_id for d in dead_letters if d.task_name in RESTARTED_BY_PROCESSING and d.submission_id}
+    signatures = [
+        process_submission.app.signature(d.task_name, args=d.args, kwargs=d.kwargs)
+        for d in dead_letters if d.task_name not in RESTARTED_BY_PROCESSING
+    ]
+    if restart_ids:
+        # FAILED -> PENDING so process_submission can claim them again
+        Submission.objects.filter(pk__in=restart_ids).transition('PENDING')
+        status_cache.refresh_many(restart_ids)
+        for submission in Submission.objects.filter(pk__in=restart_ids, status='PENDING').only('id', 'student_name', 'uploaded_file'):
+            signatures.append(process_submission.s(submission.id, submission.student_name, submission.uploaded_file.path))
+
+    if signatures:
+        group(signatures).apply_async() # One producer/connection for the whole batch
+    FailedTask.objects.filter(pk__in=[d.pk for d in dead_letters]).update(requeued_at=timezone.now())
+    return len(signatures)
\ No newline at end of file
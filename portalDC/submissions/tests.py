@@ -1,3 +1,626 @@
-from django.test import TestCase
+# submissions/tests.py
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from kombu.exceptions import OperationalError as BrokerOperationalError
+import redis
+from prometheus_client import REGISTRY
+
+from . import admission, events, export, search, status_cache, tiering
+from .models import Blob, Submission, SubmissionBatch, SubmissionStatusCount, UploadSession
+from .storage import get_submission_storage
+from .tasks import _transition, save_and_enqueue_batch
+from .tracing import Trace
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def pdf_bytes(filler=b'x' * 1000):
+    return b'%PDF-1.4\n' + filler
+
+
+class MediaTestCase(TestCase):
+    """Runs against a throwaway MEDIA_ROOT (blobs, incoming uploads, staged chunks)."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            SUBMISSION_INCOMING_DIR=os.path.join(cls.media_root, '.incoming'),
+            SUBMISSION_STAGING_DIR=os.path.join(cls.media_root, '.staging'),
+            SUBMISSION_PREVIEW_DIR=os.path.join(cls.media_root, '.previews'),
+        )
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def submit(self, student_name, content, name='a.pdf'):
+        submission = Submission(student_name=student_name, uploaded_file=ContentFile(content, name=name))
+        submission.save()
+        return submission
+
+    def blob_path(self, digest):
+        storage = get_submission_storage()
+        return storage.path(storage.blob_name(digest))
+
+
+class BlobStoreTests(MediaTestCase):
+    def test_identical_uploads_share_one_blob(self):
+        first = self.submit('Ann', pdf_bytes())
+        second = self.submit('Bob', pdf_bytes(), name='b.pdf')
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(Blob.objects.get(pk=first.blob_id).ref_count, 2)
+        self.assertEqual(first.file_name, 'submissions/ann/a.pdf')
+        self.assertEqual(second.file_name, 'submissions/bob/b.pdf')
+        self.assertEqual(first.uploaded_file.name, second.uploaded_file.name)
+
+    def test_last_release_purges_row_and_bytes(self):
+        first = self.submit('Ann', pdf_bytes())
+        second = self.submit('Bob', pdf_bytes())
+        digest, path = first.blob_id, self.blob_path(first.blob_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.filter(pk=digest).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_between_release_and_purge_keeps_the_bytes(self):
+        first = self.submit('Ann', pdf_bytes())
+        digest, path = first.blob_id, self.blob_path(first.blob_id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete() # Last reference: the purge waits for the commit
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 0)
+        second = self.submit('Bob', pdf_bytes()) # Finds the bytes already stored
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(second.uploaded_file.read(), pdf_bytes())
+
+    def test_upload_after_purge_rewrites_the_bytes(self):
+        first = self.submit('Ann', pdf_bytes())
+        digest, path = first.blob_id, self.blob_path(first.blob_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.submit('Bob', pdf_bytes())
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+    def test_purge_refuses_a_referenced_blob(self):
+        submission = self.submit('Ann', pdf_bytes())
+        self.assertFalse(Blob.objects.purge(submission.blob_id))
+        self.assertTrue(os.path.exists(self.blob_path(submission.blob_id)))
+
+    def test_failed_store_drops_its_reference(self):
+        storage = get_submission_storage()
+        with mock.patch.object(type(storage), '_save', side_effect=OSError('disk full')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(OSError):
+                self.submit('Ann', pdf_bytes())
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(Submission.objects.exists())
+
+    def test_failed_insert_drops_its_reference(self):
+        kept = self.submit('Ann', pdf_bytes())
+        with mock.patch.object(Submission, 'save_base', side_effect=IntegrityError('locked')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+                self.submit('Bob', pdf_bytes())
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+                self.submit('Cy', pdf_bytes(b'other'))
+        self.assertEqual(list(Blob.objects.values_list('pk', 'ref_count')), [(kept.blob_id, 1)])
+
+
+class BatchStoreTests(MediaTestCase):
+    def batch_of(self, *contents):
+        return [Submission(student_name=f'Student {i}', uploaded_file=ContentFile(content, name=f'{i}.pdf'))
+                for i, content in enumerate(contents)]
+
+    def test_failed_insert_leaves_no_blob_behind(self):
+        kept = self.submit('Ann', pdf_bytes())
+        batch = SubmissionBatch.objects.create()
+        submissions = self.batch_of(pdf_bytes(), pdf_bytes(b'other'), pdf_bytes(b'other'))
+        with mock.patch.object(Submission.objects, 'bulk_create', side_effect=IntegrityError('locked')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(IntegrityError):
+                save_and_enqueue_batch(batch, submissions)
+        self.assertEqual(list(Blob.objects.values_list('pk', 'ref_count')), [(kept.blob_id, 1)])
+        self.assertFalse(os.path.exists(self.blob_path(hashlib.sha256(pdf_bytes(b'other')).hexdigest())))
+        self.assertTrue(os.path.exists(self.blob_path(kept.blob_id)))
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(SubmissionStatusCount.objects.counts()['PENDING'], 1)
+
+    def test_batch_is_stored_and_queued(self):
+        batch = SubmissionBatch.objects.create()
+        with mock.patch('submissions.tasks.chord') as chord:
+            save_and_enqueue_batch(batch, self.batch_of(pdf_bytes(), pdf_bytes()))
+        self.assertEqual(len(list(chord.call_args.args[0])), 2)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(SubmissionBatch.objects.get().total, 2)
+        self.assertEqual(SubmissionStatusCount.objects.counts()['PENDING'], 2)
+
+    def test_batch_trace_records_every_member(self):
+        before = upload_bytes('http.batch_submit')
+        with Trace('http.batch_submit', size=[100, 250]):
+            pass
+        self.assertEqual(upload_bytes('http.batch_submit'), before + 350)
+
+
+class TransitionTests(TestCase):
+    def setUp(self):
+        self.submission = Submission.objects.create(student_name='Ann')
+
+    def move(self, to, **filters):
+        return Submission.objects.filter(pk=self.submission.pk, **filters).transition(to)
+
+    def test_allowed_transition_stamps_and_counts(self):
+        self.assertEqual(self.move('PROCESSING'), 1)
+        self.assertEqual(self.move('COMPLETE'), 1)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'COMPLETE')
+        self.assertIsNotNone(self.submission.processing_started_at)
+        self.assertIsNotNone(self.submission.completed_at)
+        self.assertEqual(SubmissionStatusCount.objects.counts('Ann'),
+                         {'PENDING': 0, 'PROCESSING': 0, 'COMPLETE': 1, 'FAILED': 0})
+        self.assertEqual(SubmissionStatusCount.objects.counts()['COMPLETE'], 1)
+
+    def test_disallowed_transition_moves_nothing(self):
+        self.assertEqual(self.move('COMPLETE'), 0) # PENDING can't complete without processing
+        self.move('PROCESSING')
+        self.move('COMPLETE')
+        self.assertEqual(self.move('PROCESSING'), 0) # COMPLETE is final
+        self.assertEqual(self.move('FAILED'), 0)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'COMPLETE')
+        self.assertEqual(SubmissionStatusCount.objects.counts('Ann')['COMPLETE'], 1)
+
+    def test_only_one_claim_of_a_pending_submission_wins(self):
+        self.assertEqual(self.move('PROCESSING', status='PENDING'), 1)
+        self.assertEqual(self.move('PROCESSING', status='PENDING'), 0)
+        self.assertEqual(SubmissionStatusCount.objects.counts('Ann')['PROCESSING'], 1)
+
+    def test_failed_submission_can_be_requeued(self):
+        self.move('FAILED')
+        self.assertEqual(self.move('PENDING'), 1)
+        self.assertEqual(SubmissionStatusCount.objects.counts('Ann'),
+                         {'PENDING': 1, 'PROCESSING': 0, 'COMPLETE': 0, 'FAILED': 0})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@mock.patch('submissions.events.publish_status')
+class StatusCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.submission = Submission.objects.create(student_name='Ann')
+
+    def get_status(self, **headers):
+        return self.client.get(f'/submissions/status/{self.submission.pk}/', headers=headers)
+
+    def test_matching_etag_gets_304(self, publish_status):
+        response = self.get_status()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'PENDING')
+        with self.assertNumQueries(0): # Served from the cache
+            response = self.get_status(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_transition_refreshes_the_cached_entry(self, publish_status):
+        etag = self.get_status()['ETag']
+        stale = status_cache.build_entry(Submission.objects.get(pk=self.submission.pk))
+        _transition(self.submission.pk, 'PROCESSING')
+        publish_status.assert_called_once()
+        # A poller that read the row before the change can no longer cache it
+        self.assertFalse(cache.add(status_cache.cache_key(self.submission.pk), stale))
+        response = self.get_status(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'PROCESSING')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_lists_missing_ids(self, publish_status):
+        other = Submission.objects.create(student_name='Bob')
+        status_cache.get_entry(other.pk) # One cached, one not
+        missing = other.pk + 100
+        entries = status_cache.get_entries([self.submission.pk, missing, other.pk])
+        self.assertEqual(set(entries), {self.submission.pk, other.pk})
+
+        ids = f'{missing},{self.submission.pk},{other.pk},{self.submission.pk}'
+        response = self.client.get('/submissions/status/', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['id'] for entry in response.json()['submissions']], [self.submission.pk, other.pk])
+        self.assertEqual(response.json()['not_found'], [missing])
+        response = self.client.get('/submissions/status/', {'ids': ids}, headers={'if_none_match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class ListCursorTests(TestCase):
+    def setUp(self):
+        moment = timezone.now()
+        self.ids = []
+        for i in range(7):
+            submission = Submission.objects.create(student_name=f'Student {i}')
+            # Five share one timestamp, so only the id orders them
+            submitted_at = moment if i < 5 else moment - timedelta(minutes=i)
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=submitted_at)
+            self.ids.append(submission.pk)
+
+    def page(self, **params):
+        response = self.client.get('/submissions/list/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen = []
+        params = {'limit': 2}
+        while True:
+            page = self.page(**params)
+            seen += [row['id'] for row in page['submissions']]
+            if page['next_cursor'] is None:
+                break
+            params['cursor'] = page['next_cursor']
+        expected = sorted(self.ids[:5], reverse=True) + self.ids[5:]
+        self.assertEqual(seen, expected)
+
+    def test_exact_last_page_has_no_cursor(self):
+        self.assertIsNone(self.page(limit=7)['next_cursor'])
+        self.assertIsNotNone(self.page(limit=6)['next_cursor'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/submissions/list/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+def without_admission(cls):
+    """Lets every request past admission control, so these tests need neither Redis nor a broker."""
+    for name, value in (('_admit', (None, '')), ('check_student', None), ('throughput', None)):
+        cls = mock.patch(f'submissions.admission.{name}', return_value=value)(cls)
+    return cls
+
+
+def upload_bytes(trace_name):
+    """Total observed by the portal_upload_bytes histogram for one trace name."""
+    return REGISTRY.get_sample_value('portal_upload_bytes_sum', {'trace': trace_name}) or 0
+
+
+@without_admission
+class UploadHandlerTests(MediaTestCase):
+    def test_non_pdf_upload_is_rejected(self, *mocks):
+        response = self.client.post('/submissions/submit/', {
+            'student_name': 'Ann',
+            'uploaded_file': SimpleUploadedFile('a.pdf', b'GIF89a' + b'x' * 100, 'application/pdf'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, '.incoming')), [])
+
+    def test_oversized_upload_is_rejected(self, *mocks):
+        with override_settings(SUBMISSION_MAX_UPLOAD_SIZE=100):
+            response = self.client.post('/submissions/submit/', {
+                'student_name': 'Ann',
+                'uploaded_file': SimpleUploadedFile('a.pdf', pdf_bytes(), 'application/pdf'),
+            })
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Submission.objects.exists())
+
+
+@without_admission
+class ResumableUploadTests(MediaTestCase):
+    def start_upload(self, content):
+        response = self.client.post('/submissions/uploads/', json.dumps({
+            'student_name': 'Ann', 'file_name': 'a.pdf', 'size': len(content),
+        }), content_type='application/json')
+        upload_id = response.json()['upload_id']
+        response = self.client.put(f'/submissions/uploads/{upload_id}/chunks/0/', content,
+                                   content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 200)
+        return upload_id
+
+    def test_finalize_retry_after_broker_failure_reuses_the_submission(self, *mocks):
+        upload_id = self.start_upload(pdf_bytes())
+        url = f'/submissions/uploads/{upload_id}/complete/'
+        with mock.patch('celery.canvas.Signature.apply_async', side_effect=BrokerOperationalError('broker down')):
+            self.assertEqual(self.client.post(url).status_code, 500)
+        submission = Submission.objects.get()
+        self.assertEqual(UploadSession.objects.get().submission_id, submission.pk)
+
+        with mock.patch('celery.canvas.Signature.apply_async') as apply_async:
+            apply_async.return_value.id = submission.celery_task_id
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['submission_id'], submission.pk)
+            self.assertEqual(self.client.post(url).status_code, 200) # Already finalized
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(SubmissionStatusCount.objects.counts()['PENDING'], 1)
+
+    def test_finalize_records_the_upload_size(self, *mocks):
+        content = pdf_bytes()
+        upload_id = self.start_upload(content)
+        before = upload_bytes('http.upload_complete')
+        with mock.patch('celery.canvas.Signature.apply_async') as apply_async:
+            apply_async.return_value.id = 'task-id'
+            self.assertEqual(self.client.post(f'/submissions/uploads/{upload_id}/complete/').status_code, 201)
+        self.assertEqual(upload_bytes('http.upload_complete'), before + len(content))
+
+    def test_finalize_with_missing_chunks_is_refused(self, *mocks):
+        content = pdf_bytes()
+        response = self.client.post('/submissions/uploads/', json.dumps({
+            'student_name': 'Ann', 'file_name': 'a.pdf', 'size': len(content),
+        }), content_type='application/json')
+        upload_id = response.json()['upload_id']
+        response = self.client.post(f'/submissions/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['missing_chunks'], [0])
+        self.assertIsNone(UploadSession.objects.get().completed_at)
+
+@skipUnless(fakeredis, "fakeredis[lua] is needed to run the admission scripts")
+@mock.patch('submissions.admission.throughput', return_value=None)
+@mock.patch('submissions.admission.check_student', return_value=None)
+@mock.patch('submissions.admission.queue_depths', return_value={'validation': 0})
+class AdmissionTests(TestCase):
+    """An empty POST gets a 400 from the view once it is past admission."""
+
+    def setUp(self):
+        client = fakeredis.FakeRedis()
+        self.enterContext(mock.patch.multiple(admission, _client=client, _queue_depth=(0.0, 0), _scripts={
+            'token': client.register_script(admission.TAKE_TOKEN),
+            'slot': client.register_script(admission.TAKE_SLOT),
+        }))
+
+    def post(self):
+        return self.client.post('/submissions/submit/')
+
+    @override_settings(SUBMISSION_IP_RATE_LIMIT=(60, 2))
+    def test_ip_over_its_burst_gets_429(self, *mocks):
+        self.assertEqual([self.post().status_code for _ in range(2)], [400, 400])
+        response = self.post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1') # One token a second
+        self.assertEqual(self.client.post('/submissions/submit/', REMOTE_ADDR='10.0.0.2').status_code, 400)
+
+    @override_settings(SUBMISSION_MAX_INFLIGHT_UPLOADS=1)
+    def test_inflight_limit_sheds_with_503(self, *mocks):
+        token = admission.take_slot()
+        self.assertTrue(token)
+        self.assertIsNone(admission.take_slot())
+        response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        admission.release_slot(token)
+        self.assertEqual(self.post().status_code, 400)
+        self.assertEqual(self.post().status_code, 400) # The request released its own slot
+
+    @override_settings(SUBMISSION_MAX_QUEUE_DEPTH=10)
+    def test_deep_queue_sheds_with_503(self, queue_depths, *mocks):
+        queue_depths.return_value = {'validation': 4, 'extraction': 6}
+        self.assertEqual(self.post().status_code, 503)
+
+    def test_unreachable_broker_admits_and_is_not_asked_again(self, queue_depths, *mocks):
+        queue_depths.side_effect = BrokerOperationalError('broker down')
+        self.assertEqual([self.post().status_code for _ in range(3)], [400, 400, 400])
+        queue_depths.assert_called_once_with(timeout=admission.BROKER_TIMEOUT)
+
+    def test_unreachable_redis_admits(self, *mocks):
+        for script in admission._scripts.values():
+            script.registered_client = mock.Mock(evalsha=mock.Mock(side_effect=redis.ConnectionError('down')))
+        self.assertIsNone(admission.take_token('ip', '10.0.0.1', (1, 1)))
+        self.assertEqual(admission.take_slot(), '')
+        self.assertEqual(self.post().status_code, 400)
+
+class TieringTests(MediaTestCase):
+    """The cold tier is a second FileSystemStorage, standing in for the object store."""
+
+    def setUp(self):
+        cold_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cold_root, ignore_errors=True)
+        self.enterContext(override_settings(SUBMISSION_COLD_STORAGE='cold', STORAGES={
+            **settings.STORAGES,
+            'cold': {'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                     'OPTIONS': {'location': cold_root, 'base_url': '/cold/'}},
+        }))
+        self.storage = get_submission_storage()
+        self.storage.__dict__.pop('cold', None) # cached_property of the shared instance
+        self.addCleanup(self.storage.__dict__.pop, 'cold', None)
+        self.submission = self.submit('Ann', pdf_bytes())
+        self.name = self.submission.uploaded_file.name
+
+    def demote(self):
+        self.submission.status = 'COMPLETE'
+        self.submission.save(update_fields=['status'])
+        return tiering.demote(Blob.objects.get())
+
+    def download(self, **user):
+        if user:
+            self.client.force_login(User.objects.create_user('staff', **user))
+        return self.client.get(f'/submissions/download/{self.submission.pk}/')
+
+    def test_demote_and_promote_round_trip(self):
+        self.assertTrue(self.demote())
+        self.assertFalse(self.storage.is_local(self.name))
+        self.assertTrue(self.storage.cold.exists(self.name))
+        self.assertEqual(Blob.objects.get().tier, Blob.COLD)
+
+        path = tiering.local_path(self.storage.path(self.name)) # A task reading a demoted file
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), pdf_bytes())
+        self.assertEqual(Blob.objects.get().tier, Blob.HOT)
+
+    def test_active_submission_is_not_demoted(self):
+        self.assertFalse(tiering.demote(Blob.objects.get())) # Still PENDING
+        self.assertTrue(self.storage.is_local(self.name))
+        self.assertEqual(Blob.objects.get().tier, Blob.HOT)
+
+    def test_demoted_file_is_read_from_the_cold_tier(self):
+        self.demote()
+        with Submission.objects.get().uploaded_file.open('rb') as f:
+            self.assertEqual(f.read(), pdf_bytes())
+        self.assertFalse(self.storage.is_local(self.name)) # Reading doesn't promote
+
+    def test_download_is_for_staff_only(self):
+        self.assertEqual(self.download().status_code, 401)
+        self.assertEqual(self.download(is_staff=False).status_code, 403)
+
+    @override_settings(SUBMISSION_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_hot_download_is_sent_by_the_proxy(self):
+        response = self.download(is_staff=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], settings.SUBMISSION_SENDFILE_PREFIX + self.name)
+        self.assertIn('a.pdf', response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+
+    def test_cold_download_redirects_to_the_object_store(self):
+        self.demote()
+        response = self.download(is_staff=True)
+        self.assertRedirects(response, '/cold/' + self.name, fetch_redirect_response=False)
+
+        presigned = 'https://cold.example/blob?X-Amz-Signature=abc'
+        with mock.patch.object(self.storage.cold, 'url', return_value=presigned) as url:
+            response = self.client.get(f'/submissions/download/{self.submission.pk}/')
+        self.assertRedirects(response, presigned, fetch_redirect_response=False)
+        self.assertIn('a.pdf', url.call_args.kwargs['parameters']['ResponseContentDisposition'])
+
+class ExportTests(MediaTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.first = self.submit('Ann', pdf_bytes(b'first'))
+        self.second = self.submit('Bob', pdf_bytes(b'second'), name='b.pdf')
+
+    def export(self, **params):
+        response = self.client.get('/submissions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        with archive.open('manifest.csv') as f:
+            manifest = list(csv.DictReader(io.TextIOWrapper(f, 'utf-8')))
+        return archive, manifest
+
+    def test_archive_holds_every_submission_and_a_manifest(self):
+        archive, manifest = self.export()
+        first_name = export.archive_name(self.first.pk, 'Ann', 'a.pdf')
+        second_name = export.archive_name(self.second.pk, 'Bob', 'b.pdf')
+        self.assertEqual(archive.namelist(), [first_name, second_name, 'manifest.csv'])
+        self.assertEqual(archive.read(first_name), pdf_bytes(b'first'))
+        self.assertEqual(archive.read(second_name), pdf_bytes(b'second'))
+        self.assertEqual([(row['id'], row['student_name'], row['file']) for row in manifest],
+                         [(str(self.first.pk), 'Ann', first_name), (str(self.second.pk), 'Bob', second_name)])
+        self.assertEqual(manifest[0]['sha256'], self.first.blob_id)
+
+    def test_missing_file_is_listed_without_a_path(self):
+        os.remove(self.blob_path(self.second.blob_id))
+        archive, manifest = self.export()
+        self.assertEqual(archive.namelist(), [export.archive_name(self.first.pk, 'Ann', 'a.pdf'), 'manifest.csv'])
+        self.assertEqual([(row['id'], row['file'] == '') for row in manifest],
+                         [(str(self.first.pk), False), (str(self.second.pk), True)])
+
+    def test_status_filter(self):
+        Submission.objects.filter(pk=self.second.pk).update(status='COMPLETE')
+        archive, manifest = self.export(status='COMPLETE')
+        self.assertEqual([row['id'] for row in manifest], [str(self.second.pk)])
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertEqual(self.client.get('/submissions/export/', {'status': 'DONE'}).status_code, 400)
+
+class SearchTests(TestCase):
+    TEXTS = {
+        'Ann': 'Binary search halves the range. print("hi") ends the program.',
+        'Bob': 'A search that is binary? No: this one is linear search over the list.',
+        'Cid': 'Recursion AND iteration, OR neither; NOT the point.',
+    }
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.ids = {}
+        for student_name, text in self.TEXTS.items():
+            submission = Submission.objects.create(student_name=student_name, extracted_text=text)
+            search.index_submission(submission.pk, text)
+            self.ids[student_name] = submission.pk
+
+    def find(self, q, **params):
+        response = self.client.get('/submissions/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def students(self, q, **params):
+        pk_names = {pk: name for name, pk in self.ids.items()}
+        return sorted(pk_names[hit['id']] for hit in self.find(q, **params)['hits'])
+
+    def test_words_are_anded(self):
+        self.assertEqual(self.students('binary search'), ['Ann', 'Bob'])
+        self.assertEqual(self.students('binary linear'), ['Bob'])
+
+    def test_phrase_must_appear_in_order(self):
+        self.assertEqual(self.students('"binary search"'), ['Ann'])
+        hit = self.find('"binary search"')['hits'][0]
+        self.assertIn(f'{search.SNIPPET_START}Binary search{search.SNIPPET_END}', hit['snippet'])
+
+    def test_operators_are_plain_words(self):
+        self.assertEqual(self.students('AND OR NOT'), ['Cid'])
+        self.assertEqual(self.students('NOT'), ['Cid'])
+        self.assertEqual(search.fts5_query('" ( * -'), '')
+        self.assertEqual(self.find('" ( * -')['hits'], [])
+
+    def test_punctuation_is_searchable(self):
+        self.assertEqual(self.students('print("hi")'), ['Ann'])
+        self.assertEqual(self.students('"program." search'), ['Ann'])
+
+    def test_status_filter(self):
+        Submission.objects.filter(pk=self.ids['Bob']).update(status='COMPLETE')
+        self.assertEqual(self.students('search', status='COMPLETE'), ['Bob'])
+        self.assertEqual(self.students('search', student_name='Ann'), ['Ann'])
+
+    def test_pages_follow_next_offset(self):
+        first = self.find('search', limit=1)
+        self.assertEqual(first['next_offset'], 1)
+        second = self.find('search', limit=1, offset=first['next_offset'])
+        self.assertIsNone(second['next_offset'])
+        self.assertNotEqual(first['hits'][0]['id'], second['hits'][0]['id'])
+        self.assertIsNone(self.find('search', limit=2)['next_offset'])
+        self.assertEqual(self.client.get('/submissions/search/', {'q': 'search', 'limit': 0}).status_code, 400)
+
+
+class StatusHubTests(SimpleTestCase):
+    def test_subscription_that_ends_cleanly_is_retried_with_backoff(self):
+        async def no_messages(): # The server closed the connection without an error
+            return
+            yield
+
+        async def sleep(delay):
+            delays.append(delay)
+            if len(delays) == 3:
+                raise asyncio.CancelledError
+
+        delays = []
+        pubsub = mock.AsyncMock(listen=mock.Mock(side_effect=no_messages))
+        client = mock.AsyncMock(pubsub=mock.Mock(return_value=pubsub))
+        hub = events.StatusHub()
+        hub._ready = asyncio.Event()
+        with mock.patch('redis.asyncio.Redis.from_url', return_value=client), \
+                mock.patch('submissions.events.asyncio.sleep', sleep), self.assertRaises(asyncio.CancelledError):
+            asyncio.run(hub._run())
+        self.assertEqual(delays, [1, 2, 4])
+        self.assertEqual(pubsub.psubscribe.await_count, 3)
\ No newline at end of file
@@ -0,0 +1,141 @@
+# submissions/tiering.py
+"""
+Hot and cold storage tiers for submission blobs, and the download view.
+
+New uploads are stored on the local disk (hot). With SUBMISSION_COLD_STORAGE set,
+the migrate_blob_tiers task (celery beat) copies blobs that have been hot for
+SUBMISSION_COLD_AFTER_DAYS to the cold tier (S3-compatible object storage) and
+deletes the local copy, as long as none of their submissions is still being
+processed. Blobs come back on demand: a task that needs a demoted file downloads
+it again (local_path), and re-uploading the same bytes makes the blob hot.
+
+Downloads never stream bytes through Python: hot blobs are handed to the proxy
+with an X-Accel-Redirect (or X-Sendfile) header and cold ones redirect to a
+short-lived presigned URL of the object store.
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .models import Blob, Submission
+from .storage import get_submission_storage
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('PENDING', 'PROCESSING') # Their files are about to be read by a task
+
+
+def demote(blob):
+    """
+    Moves one hot blob to the cold tier. The row is switched to COLD only if no
+    reference was taken and no submission became active while the bytes were
+    uploading; the local copy is deleted after that. Returns True if it moved.
+    """
+    storage = get_submission_storage()
+    name = storage.blob_name(blob.sha256)
+    if storage.is_local(name):
+        storage.copy_to_cold(name)
+    elif not storage.cold.exists(name):
+        logger.error("Blob %s is in neither storage tier", blob.sha256)
+        return False
+    moved = (Blob.objects.filter(pk=blob.pk, tier=Blob.HOT, ref_count=blob.ref_count)
+             .exclude(submissions__status__in=ACTIVE_STATUSES)
+             .update(tier=Blob.COLD, tier_changed_at=timezone.now()))
+    if moved:
+        storage.delete_local(name)
+    return bool(moved)
+
+
+def promote(digest):
+    """Downloads a demoted blob back to the local disk and marks it hot; returns its path."""
+    storage = get_submission_storage()
+    path = storage.local_path(storage.blob_name(digest))
+    Blob.objects.filter(pk=digest, tier=Blob.COLD).update(tier=Blob.HOT, tier_changed_at=timezone.now())
+    return path
+
+
+def local_path(file_path):
+    """
+    A task's file_path, promoting the blob first if the mover demoted it after the
+    task was queued (e.g. a FAILED submission requeued weeks later).
+    """
+    if os.path.exists(file_path):
+        return file_path
+    return promote(get_submission_storage().digest_from_name(file_path))
+
+
+def migrate_blob_tiers(limit=None):
+    """
+    Demotes up to `limit` (default SUBMISSION_TIERING_BATCH) blobs that have been hot
+    for SUBMISSION_COLD_AFTER_DAYS, oldest first. Returns the number demoted.
+    """
+    if get_submission_storage().cold is None:
+        return 0 # Single tier: everything stays local
+    cutoff = timezone.now() - timedelta(days=settings.SUBMISSION_COLD_AFTER_DAYS)
+    candidates = (Blob.objects.filter(tier=Blob.HOT, tier_changed_at__lt=cutoff, ref_count__gt=0)
+                  .exclude(submissions__status__in=ACTIVE_STATUSES)
+                  .order_by('tier_changed_at')[:limit or settings.SUBMISSION_TIERING_BATCH])
+    demoted = 0
+    for blob in candidates:
+        try:
+            demoted += demote(blob)
+        except Exception:
+            # Object store unreachable, disk error...: the blob stays hot; retry next run
+            logger.warning("Could not demote blob %s", blob.sha256, exc_info=True)
+    return demoted
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def _sendfile(path, name, disposition):
+    header = settings.SUBMISSION_SENDFILE_HEADER
+    if not header:
+        # No proxy in front (runserver): Django streams the file itself
+        return FileResponse(open(path, 'rb'), content_type='application/pdf', headers={'Content-Disposition': disposition})
+    response = HttpResponse(content_type='application/pdf', headers={'Content-Disposition': disposition})
+    if header == 'X-Accel-Redirect':
+        response[header] = settings.SUBMISSION_SENDFILE_PREFIX + name # An internal URI of the proxy
+    else:
+        response[header] = path # X-Sendfile and friends take the file's path
+    return response
+
+
+def _cold_url(cold, name, disposition):
+    try:
+        # Presigned S3 URL; the object store serves the download under the student's file name
+        return cold.url(name, parameters={'ResponseContentDisposition': disposition})
+    except TypeError:
+        return cold.url(name) # A storage without presigned URLs (e.g. FileSystemStorage)
+
+
+def download_view(request, pk):
+    """
+    The submitted PDF, for staff users (log in through the admin). The proxy or the
+    object store sends the bytes; see the module docstring.
+    """
+    if request.method != 'GET':
+        return _error(f'Method {request.method} not allowed. Please use GET.', 405)
+    if not request.user.is_authenticated:
+        return _error('Authentication required.', 401)
+    if not request.user.is_staff:
+        return _error('Only staff may download submissions.', 403)
+
+    submission = Submission.objects.only('id', 'uploaded_file', 'file_name').filter(pk=pk).first()
+    if submission is None or not submission.uploaded_file:
+        return _error(f'Submission with ID {pk} not found.', 404)
+
+    storage = get_submission_storage()
+    name = submission.uploaded_file.name
+    disposition = content_disposition_header(True, os.path.basename(submission.file_name or name))
+    if storage.is_local(name):
+        return _sendfile(storage.path(name), name, disposition)
+    if storage.cold is not None:
+        return HttpResponseRedirect(_cold_url(storage.cold, name, disposition))
+    return _error(f'File of submission {pk} not found.', 404)
\ No newline at end of file
@@ -0,0 +1,82 @@
+# submissions/tracing.py
+import logging
+import random
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('submissions.trace')
+
+
+class Trace:
+    """
+    Collects per-phase timings for one request or task and logs them as a single
+    structured record when the trace ends:
+
+        with Trace('http.submit', method=request.method) as trace:
+            with trace.phase('validation'):
+                ...
+            trace.set(status_code=201)
+
+    Only a sample of successful traces is logged (SUBMISSION_TRACE_SAMPLE_RATE);
+    traces that end with an error or a 5xx status are always logged.
+    """
+
+    def __init__(self, name, sample_rate=None, **fields):
+        if sample_rate is None:
+            sample_rate = settings.SUBMISSION_TRACE_SAMPLE_RATE
+        self.name = name
+        self.sampled = sample_rate >= 1 or random.random() < sample_rate
+        self.fields = fields
+        self.phases = {}
+        self.error = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.phases[name] = round(self.phases.get(name, 0) + elapsed, 3)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def fail(self, error):
+        """Marks the trace as failed so it is logged regardless of sampling."""
+        self.error = str(error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(exc)
+        self.emit()
+        return False
+
+    def emit(self):
+        duration = time.perf_counter() - self._start
+        metrics.observe_trace(self, duration) # Every trace, not just the logged sample
+        failed = self.error is not None or self.fields.get('status_code', 0) >= 500
+        if not (self.sampled or failed):
+            return
+        record = {
+            'trace': self.name,
+            'duration_ms': round(duration * 1000, 3),
+            'phases_ms': self.phases,
+            **self.fields,
+        }
+        if self.error is not None:
+            record['error'] = self.error
+        logger.log(logging.ERROR if failed else logging.INFO, self.name, extra={'fields': record})
+
+
+def phase(trace, name):
+    """trace.phase(name), or a no-op when the caller has no trace (helpers shared by several entry points)."""
+    return trace.phase(name) if trace is not None else nullcontext()
\ No newline at end of file
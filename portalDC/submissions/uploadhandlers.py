@@ -0,0 +1,153 @@
+# submissions/uploadhandlers.py
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+PDF_MAGIC = b'%PDF-'
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+def incoming_dir():
+    """
+    Directory (inside MEDIA_ROOT) where uploads are streamed while they arrive.
+    Living on the same filesystem as the final location means the storage
+    backend can move the finished file into place with a rename instead of a copy.
+    """
+    path = settings.SUBMISSION_INCOMING_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StreamedPDFUploadedFile(TemporaryUploadedFile):
+    """
+    A TemporaryUploadedFile that lives in the incoming directory and carries the
+    SHA-256 digest computed while the bytes were streamed in.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload.pdf', dir=incoming_dir())
+        # Skip TemporaryUploadedFile.__init__, which would create a second temp file
+        super(TemporaryUploadedFile, self).__init__(
+            file, name, content_type, size, charset, content_type_extra
+        )
+        self.sha256 = None
+
+
+class StreamingPDFUploadHandler(FileUploadHandler):
+    """
+    Streams uploaded PDFs chunk by chunk straight into MEDIA_ROOT.
+
+    - rejects the request before reading the body if Content-Length is over the cap
+    - checks the %PDF- magic bytes as soon as the first bytes arrive
+    - enforces the size cap on every chunk, not after the whole body has arrived
+    - hashes the file with SHA-256 while writing it
+
+    On rejection the upload is stopped without draining the rest of the body and
+    the reason is left on ``self.rejection`` for the view to report.
+    """
+
+    chunk_size = 64 * 2**10
+    type_error = 'Unsupported file type. Only PDF files are allowed.'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.SUBMISSION_MAX_UPLOAD_SIZE
+        self.chunk_size = settings.SUBMISSION_UPLOAD_CHUNK_SIZE
+        self.rejection = None
+        self.rejection_status = 400
+
+    def file_types(self):
+        """{magic bytes: max size of a file starting with them}."""
+        return {PDF_MAGIC: self.max_size}
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Cheapest possible rejection: don't read a single byte of the body
+        if content_length and content_length > self.max_size:
+            self.rejection = f'Upload exceeds the {self.max_size // (1024 * 1024)} MB limit.'
+            self.rejection_status = 413
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = StreamedPDFUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.hasher = hashlib.sha256()
+        self.head = b''  # First bytes of the file, kept until the magic check is done
+        self.file_max_size = self.max_size # Narrowed once the file type is known
+        self.magic = None
+
+    def _reject(self, message, status=400):
+        self.rejection = message
+        self.rejection_status = status
+        self._discard()
+        raise StopUpload(connection_reset=True)
+
+    def _check_head(self):
+        for magic, max_size in self.file_types().items():
+            if self.head.startswith(magic):
+                self.magic, self.file_max_size = magic, max_size
+                return
+        self._reject(self.type_error)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.magic is None:
+            self.head += raw_data[:len(PDF_MAGIC)]
+            if len(self.head) >= len(PDF_MAGIC):
+                self._check_head()
+
+        if start + len(raw_data) > self.file_max_size:
+            self._reject(f'Upload exceeds the {self.file_max_size // (1024 * 1024)} MB limit.', status=413)
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None  # This handler consumes every chunk
+
+    def file_complete(self, file_size):
+        if self.magic is None:
+            # Files shorter than the magic header never reached the check above
+            self.rejection = self.type_error
+            self._discard()
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+    def _discard(self):
+        if hasattr(self, 'file'):
+            self.file.close()  # NamedTemporaryFile removes itself on close
+            del self.file
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def upload_complete(self):
+        # A StopUpload skips upload_interrupted(), so clean up here as well
+        if self.rejection:
+            self._discard()
+
+
+class StreamingBatchUploadHandler(StreamingPDFUploadHandler):
+    """
+    Same streaming checks for the batch endpoint, which also accepts ZIP archives of
+    PDFs: the request may be up to SUBMISSION_BATCH_MAX_UPLOAD_SIZE and so may an
+    archive, while each PDF keeps the single-upload cap.
+    """
+
+    type_error = 'Unsupported file type. Only PDF files or a ZIP archive of PDFs are allowed.'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.pdf_max_size = self.max_size
+        self.max_size = settings.SUBMISSION_BATCH_MAX_UPLOAD_SIZE
+
+    def file_types(self):
+        return {PDF_MAGIC: self.pdf_max_size, ZIP_MAGIC: self.max_size}
\ No newline at end of file
@@ -1,9 +1,34 @@
 # submissions/urls.py
 from django.urls import path
-from . import views
+from . import async_submit, batch, events, export, previews, resumable, search, tiering, views
 
 urlpatterns = [
     path('submit/', views.submit_assignment_view, name='submit_assignment'),
+    path('status/', views.submission_batch_status_view, name='submission_batch_status'),
     path('status/<int:pk>/', views.submission_status_view, name='submission_status'),
+    path('counts/', views.submission_counts_view, name='submission_counts'),
+    path('list/', views.submission_list_view, name='submission_list'),
+    # Liveness probe (runservers.py supervisor, Caddy health checks)
+    path('health/', views.health_view, name='health'),
+    # Async variant of submit/ for the ASGI process (see async_submit.py)
+    path('submit-async/', async_submit.async_submit_assignment_view, name='submit_assignment_async'),
+    # Server-Sent Events status stream; async view, served by the ASGI process
+    path('events/<int:pk>/', events.submission_events_view, name='submission_events'),
+    # Whole-class uploads: a ZIP or several PDFs plus a manifest (see batch.py)
+    path('batch/', batch.batch_submit_view, name='batch_submit'),
+    path('batch/<int:pk>/', batch.batch_status_view, name='batch_status'),
+    # Resumable chunked uploads (see resumable.py)
+    path('uploads/', resumable.start_upload_view, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', resumable.upload_status_view, name='upload_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', resumable.upload_chunk_view, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', resumable.complete_upload_view, name='upload_complete'),
+    # Staff downloads, sent by the proxy (X-Accel-Redirect) or the object store (see tiering.py)
+    path('download/<int:pk>/', tiering.download_view, name='submission_download'),
+    # Streamed ZIP of many submissions plus a CSV manifest (see export.py)
+    path('export/', export.export_view, name='submission_export'),
+    # First-page JPEG previews by content hash (see previews.py)
+    path('previews/<str:digest>/<str:variant>.jpg', previews.preview_view, name='submission_preview'),
+    # Full-text search over extracted text (see search.py)
+    path('search/', search.search_view, name='submission_search'),
 
 ]
\ No newline at end of file
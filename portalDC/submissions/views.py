@@ -1,189 +1,335 @@
 # submissions/views.py
 
 from django.shortcuts import render, redirect # Keep render if you ever need HTML fallback
-from django.http import HttpResponse, JsonResponse # Import JsonResponse for API responses
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse # Import JsonResponse for API responses
 from django.conf import settings # To check DEBUG status if needed
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from . import admission, previews, status_cache
 from .forms import SubmissionForm
-from .models import Submission
-from .tasks import process_submission
+from .models import ALL_STUDENTS, Submission, SubmissionStatusCount
+from .tasks import save_and_enqueue
+from .tracing import Trace
+from .uploadhandlers import StreamingPDFUploadHandler
+import base64
+import hashlib
+import json
+import logging
 import os
-import traceback # Import traceback for detailed error logging
 
+logger = logging.getLogger(__name__)
+
+
+@admission.admission_control
 def submit_assignment_view(request):
     """
     Handles assignment submissions, expecting POST requests typically from a JS frontend.
-    Returns JSON responses.
+    Returns JSON responses. Timings for each phase are logged as one sampled trace record.
+    Rate limits and load shedding answer 429/503 first (see admission.py).
     """
-    print(">>> VIEW START <<<", flush=True) # Log view entry
+    with Trace('http.submit', method=request.method) as trace:
+        response = _submit_assignment(request, trace)
+        trace.set(status_code=response.status_code)
+        return response
+
+
+def _submit_assignment(request, trace):
+    # For an API endpoint primarily for POST, other methods are disallowed
+    if request.method != 'POST':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed for this endpoint. Please use POST.'
+        }, status=405) # 405 Method Not Allowed
 
     try:
-        print(f"--- Request Method Check: {request.method} ---", flush=True) # Log the method
-
-        # Initialize context (less relevant now we return JSON, but good practice)
-        context = {'is_debug': settings.DEBUG}
-        print("--- Context Initialized ---", flush=True)
-
-        # Handle POST requests (the expected method for submissions)
-        if request.method == 'POST':
-            print("--- Inside POST Block ---", flush=True) # Confirm POST logic entry
-
-            # Log raw data received - crucial for debugging frontend issues
-            print("Raw POST data:", request.POST, flush=True)
-            print("Raw FILES data:", request.FILES, flush=True)
-
-            # Instantiate the form - wrap in try/except as errors can occur here
-            try:
-                print("--- Instantiating Form ---", flush=True)
-                form = SubmissionForm(request.POST, request.FILES)
-                print("--- Form Instantiated ---", flush=True)
-            except Exception as e:
-                print(f"--- ERROR DURING FORM INSTANTIATION ---", flush=True)
-                print(traceback.format_exc(), flush=True) # Print full traceback
-                # Return a server error response if form creation fails
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Server error during form processing: {e}'
-                }, status=500)
-
-            # Validate the form
-            if form.is_valid():
-                print("--- Form IS valid ---", flush=True) # Confirm validation success
-                # Process the valid form - wrap in try/except for robustness
-                try:
-                    submission_instance = form.save(commit=False) # Create model instance
-                    submission_instance.status = 'PENDING' # Set initial status
-                    submission_instance.save() # Save to DB (also saves file)
-
-                    # Ensure file path is accessible (critical for Celery)
-                    if not submission_instance.uploaded_file:
-                         raise ValueError("File not found on submission instance after save.")
-                    file_path = submission_instance.uploaded_file.path
-                    print(f"--- File saved at: {file_path} ---", flush=True)
-
-                    # Queue the background task
-                    task = process_submission.delay(
-                        submission_instance.id,
-                        submission_instance.student_name,
-                        file_path
-                    )
-                    print(f"--- Celery task queued: {task.id} ---", flush=True)
-
-                    # Optionally save Celery task ID to the model
-                    submission_instance.celery_task_id = task.id
-                    submission_instance.save(update_fields=['celery_task_id'])
-
-                    # Prepare success message
-                    success_message = f"Assignment submitted successfully! ID: {submission_instance.id} (Task ID: {task.id}). Processing started."
-                    print(f"--- Success: {success_message} ---", flush=True)
-
-                    # Return a JSON success response
-                    return JsonResponse({
-                        'status': 'success',
-                        'message': success_message,
-                        'submission_id': submission_instance.id,
-                        'task_id': task.id
-                    }, status=201) # 201 Created is appropriate
-
-                except Exception as e:
-                     # Catch errors during saving, queuing, etc.
-                     print(f"--- ERROR during processing valid form ---", flush=True)
-                     print(traceback.format_exc(), flush=True) # Log the full error
-                     # Return a server error response
-                     return JsonResponse({
-                         'status': 'error',
-                         'message': f'Internal server error after validation: {e}'
-                     }, status=500)
-            else:
-                # Form validation failed
-                print("--- Form IS INVALID ---", flush=True) # Log validation failure
-                # Log the specific errors
-                print("Form errors:", form.errors.as_json(), flush=True)
-                # Return a JSON response indicating validation errors
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Form validation failed.',
-                    'errors': form.errors.get_json_data() # Structured errors for frontend
-                }, status=400) # 400 Bad Request
-
-        else: # Handle methods other than POST (e.g., GET, PUT, DELETE)
-            print(f"--- Inside ELSE (Method was {request.method}) ---", flush=True)
-            # For an API endpoint primarily for POST, other methods are often disallowed
-            return JsonResponse({
-                'status': 'error',
-                'message': f'Method {request.method} not allowed for this endpoint. Please use POST.'
-            }, status=405) # 405 Method Not Allowed
+        # Stream the file straight into MEDIA_ROOT (hashing + PDF check per chunk).
+        # Must be installed before request.POST / request.FILES are touched.
+        upload_handler = StreamingPDFUploadHandler(request)
+        request.upload_handlers = [upload_handler]
 
+        # Building the form parses the multipart body, so this phase includes the upload itself
+        with trace.phase('form_build'):
+            form = SubmissionForm(request.POST, request.FILES)
     except Exception as e:
-        # Catch any unexpected error early in the view execution
-        print(f"--- UNEXPECTED ERROR IN VIEW (OUTER TRY) ---", flush=True)
-        print(traceback.format_exc(), flush=True) # Log the full error
-        # Return a generic server error response
+        trace.fail(e)
+        logger.exception("Error while building the submission form")
         return JsonResponse({
             'status': 'error',
-            'message': f'Unexpected server error: {e}'
+            'message': f'Server error during form processing: {e}'
         }, status=500)
 
-    # This part should ideally not be reached if all code paths return a response
-    print("--- Reached end of view unexpectedly? Should have returned earlier. ---", flush=True)
+    # The upload handler aborts bad uploads early; report why
+    if upload_handler.rejection:
+        trace.set(rejected=upload_handler.rejection)
+        return JsonResponse({
+            'status': 'error',
+            'message': upload_handler.rejection,
+            'errors': {'uploaded_file': [{'message': upload_handler.rejection, 'code': 'invalid'}]}
+        }, status=upload_handler.rejection_status)
+
+    with trace.phase('validation'):
+        is_valid = form.is_valid()
+    if not is_valid:
+        # Return a JSON response indicating validation errors
+        errors = form.errors.get_json_data() # Structured errors for frontend
+        trace.set(form_errors=list(errors))
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Form validation failed.',
+            'errors': errors
+        }, status=400) # 400 Bad Request
+
+    with trace.phase('admission'):
+        rejection = admission.check_student(form.cleaned_data['student_name'])
+    if rejection is not None:
+        trace.set(rejected='student_rate')
+        return rejection
+
+    try:
+        submission_instance = form.save(commit=False) # Create model instance
+        task = save_and_enqueue(submission_instance, trace=trace) # Save (also saves file) and queue the task
+    except Exception as e:
+        # Catch errors during saving, queuing, etc.
+        trace.fail(e)
+        logger.exception("Error while saving/queuing a valid submission")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Internal server error after validation: {e}'
+        }, status=500)
+
+    trace.set(submission_id=submission_instance.id, task_id=task.id, size=form.cleaned_data['uploaded_file'].size)
+    with trace.phase('admission'):
+        estimate = admission.queue_estimate()
+    success_message = f"Assignment submitted successfully! ID: {submission_instance.id} (Task ID: {task.id}). Processing started."
     return JsonResponse({
-        'status': 'error',
-        'message': 'Server error: View execution reached unexpected end.'
-    }, status=500)
+        'status': 'success',
+        'message': success_message,
+        'submission_id': submission_instance.id,
+        'task_id': task.id,
+        **estimate, # queue_position, eta_seconds
+    }, status=201) # 201 Created is appropriate
+
 
+def health_view(request):
+    """
+    Liveness probe for runservers.py's supervisor and Caddy's active health checks.
+    Deliberately touches neither the database nor the broker: an outage there must
+    not make every web worker look dead and get restarted.
+    """
+    return JsonResponse({'status': 'ok', 'pid': os.getpid()}, status=200)
 
 
 def submission_status_view(request, pk):
     """
     Handles GET requests to check the status of a specific submission.
-    Returns JSON response with detailed submission info.
+    Returns JSON response with detailed submission info. Served from the status
+    cache with ETag/Last-Modified; a matching If-None-Match gets a 304.
     """
-    print(f">>> STATUS VIEW START (ID: {pk}) <<<", flush=True)
+    with Trace('http.status', submission_id=pk) as trace:
+        response = _submission_status(request, pk, trace)
+        trace.set(status_code=response.status_code)
+        return response
 
-    if request.method == 'GET':
-        try:
-            print(f"--- Attempting to fetch Submission with pk={pk} ---", flush=True)
-            # Fetch the submission object by its primary key (pk)
-            submission = Submission.objects.get(pk=pk)
-            print(f"--- Found Submission: ID={submission.id}, Status={submission.status} ---", flush=True)
-
-            # --- Prepare the data for the JSON response ---
-            file_name = os.path.basename(submission.uploaded_file.name) if submission.uploaded_file else None
-            submitted_at_iso = submission.submitted_at.isoformat() if submission.submitted_at else None # Use ISO format for consistency
-
-            response_data = {
-                'status': 'success', # Indicates the API call succeeded
-                # --- Match keys expected by the React component ---
-                'id': submission.id,
-                'student_name': submission.student_name,
-                'status': submission.status, # This is the submission status itself
-                'file_name': file_name,
-                'submitted_at': submitted_at_iso,
-                # --- End of matched keys ---
-            }
-            # --- End data preparation ---
-
-            print(f"--- Sending response data: {response_data} ---", flush=True)
-            # Return the detailed status in a JSON response
-            return JsonResponse(response_data, status=200) # 200 OK
-
-        except Submission.DoesNotExist:
-            print(f"--- Submission with pk={pk} NOT FOUND ---", flush=True)
-            return JsonResponse({
-                'status': 'error',
-                'message': f'Submission with ID {pk} not found.'
-            }, status=404) # 404 Not Found
-
-        except Exception as e:
-            print(f"--- UNEXPECTED ERROR fetching status for pk={pk} ---", flush=True)
-            print(traceback.format_exc(), flush=True)
-            return JsonResponse({
-                'status': 'error',
-                'message': f'An unexpected server error occurred: {e}'
-            }, status=500) # 500 Internal Server Error
 
-    else:
-        print(f"--- Method {request.method} not allowed for status check ---", flush=True)
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache' # Clients may keep it but must revalidate each poll
+    return response
+
+
+def _submission_status(request, pk, trace):
+    if request.method != 'GET':
         return JsonResponse({
             'status': 'error',
             'message': f'Method {request.method} not allowed. Please use GET.'
         }, status=405) # 405 Method Not Allowed
+
+    try:
+        with trace.phase('cache'):
+            entry = status_cache.get_entry(pk)
+    except Exception as e:
+        trace.fail(e)
+        logger.exception("Error fetching status for submission %s", pk)
+        return JsonResponse({
+            'status': 'error',
+            'message': f'An unexpected server error occurred: {e}'
+        }, status=500) # 500 Internal Server Error
+
+    if entry is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Submission with ID {pk} not found.'
+        }, status=404) # 404 Not Found
+
+    # Unchanged since the client's last poll: 304 without building a body
+    not_modified = get_conditional_response(request, etag=entry['etag'], last_modified=int(entry['last_modified']))
+    if not_modified is not None:
+        return _with_validators(not_modified, entry['etag'], entry['last_modified'])
+
+    # 'status': 'success' indicates the API call succeeded; the submission's own
+    # status in the entry data then overrides it, which is what the React component reads
+    response_data = {'status': 'success', **entry['data']}
+    return _with_validators(JsonResponse(response_data, status=200), entry['etag'], entry['last_modified'])
+
+
+def submission_batch_status_view(request):
+    """
+    GET status/?ids=1,2,3 -- statuses of many submissions in one request, resolved
+    from the status cache with a single pk__in query for any misses.
+    """
+    with Trace('http.status_batch') as trace:
+        response = _submission_batch_status(request, trace)
+        trace.set(status_code=response.status_code)
+        return response
+
+
+def _submission_batch_status(request, trace):
+    if request.method != 'GET':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed. Please use GET.'
+        }, status=405)
+
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.GET.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'ids must be a comma-separated list of integers.'}, status=400)
+    if not ids:
+        return JsonResponse({'status': 'error', 'message': 'Provide submission ids as ?ids=1,2,3.'}, status=400)
+    if len(ids) > settings.SUBMISSION_STATUS_BATCH_LIMIT:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {settings.SUBMISSION_STATUS_BATCH_LIMIT} ids per request.'
+        }, status=400)
+    trace.set(ids=len(ids))
+
+    try:
+        with trace.phase('cache'):
+            entries = status_cache.get_entries(ids)
+    except Exception as e:
+        trace.fail(e)
+        logger.exception("Error fetching batch status")
+        return JsonResponse({
+            'status': 'error',
+            'message': f'An unexpected server error occurred: {e}'
+        }, status=500)
+
+    not_found = [pk for pk in ids if pk not in entries]
+    # The batch is unchanged exactly when every member's ETag is
+    etag = hashlib.sha1(' '.join(entries[pk]['etag'] if pk in entries else '-' for pk in ids).encode()).hexdigest()
+    etag = f'"{etag}"'
+    last_modified = max((entry['last_modified'] for entry in entries.values()), default=0)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+
+    response_data = {
+        'status': 'success',
+        'submissions': [entries[pk]['data'] for pk in ids if pk in entries],
+        'not_found': not_found,
+    }
+    return _with_validators(JsonResponse(response_data, status=200), etag, last_modified)
+
+
+def submission_counts_view(request):
+    """
+    GET counts/ -- number of submissions per status, overall or for one student
+    (?student_name=...). Read from the SubmissionStatusCount counters, not COUNT(*).
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed. Please use GET.'
+        }, status=405)
+
+    student_name = request.GET.get('student_name', ALL_STUDENTS)
+    counts = SubmissionStatusCount.objects.counts(student_name)
+    return JsonResponse({
+        'status': 'success',
+        'student_name': student_name or None,
+        'counts': counts,
+        'total': sum(counts.values()),
+    }, status=200)
+
+
+# Columns returned by list/; everything else (text, metadata...) stays in the database
+LIST_FIELDS = ('id', 'student_name', 'status', 'file_name', 'submitted_at', 'completed_at', 'page_count', 'similarity_score',
+               'blob_id')
+
+
+def _encode_cursor(row):
+    return base64.urlsafe_b64encode(f"{row['submitted_at'].isoformat()}|{row['id']}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """(submitted_at, id) of the last row of the previous page; ValueError if malformed."""
+    try:
+        submitted_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        submitted_at = parse_datetime(submitted_at)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError(str(e))
+    if submitted_at is None:
+        raise ValueError("bad timestamp")
+    return submitted_at, int(pk)
+
+
+def _stream_list(rows, limit):
+    # Writes the JSON document row by row instead of building it in memory
+    yield '{"status": "success", "submissions": ['
+    last = None
+    for i, row in enumerate(rows):
+        if i == limit: # The extra row only tells us there is another page
+            break
+        if row['file_name']:
+            row['file_name'] = os.path.basename(row['file_name'])
+        digest = row.pop('blob_id')
+        row['thumbnail_url'] = previews.preview_url(digest) if digest else None # A few KB instead of the PDF
+        yield (', ' if i else '') + json.dumps(row, cls=DjangoJSONEncoder)
+        last = row
+    else:
+        last = None # Fewer than limit + 1 rows: this was the last page
+    yield f'], "next_cursor": {json.dumps(_encode_cursor(last) if last else None)}}}'
+
+
+def submission_list_view(request):
+    """
+    GET list/?limit=50&cursor=...&status=...&student_name=... -- submissions, newest
+    first, with keyset pagination over (submitted_at, id): each page continues from
+    the cursor of the previous one (next_cursor) with an indexed range scan, so page
+    10,000 costs the same as page 1. The JSON is streamed as rows are read.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Method {request.method} not allowed. Please use GET.'
+        }, status=405)
+
+    try:
+        limit = int(request.GET.get('limit', settings.SUBMISSION_LIST_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be an integer.'}, status=400)
+    if not 1 <= limit <= settings.SUBMISSION_LIST_MAX_LIMIT:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'limit must be between 1 and {settings.SUBMISSION_LIST_MAX_LIMIT}.'
+        }, status=400)
+
+    rows = Submission.objects.order_by('-submitted_at', '-id')
+    if 'cursor' in request.GET:
+        try:
+            submitted_at, pk = _decode_cursor(request.GET['cursor'])
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid cursor.'}, status=400)
+        # (submitted_at, id) < cursor, spelled with a leading range the index can seek to
+        rows = rows.filter(Q(submitted_at__lt=submitted_at) | Q(id__lt=pk), submitted_at__lte=submitted_at)
+    if request.GET.get('status'):
+        rows = rows.filter(status=request.GET['status'])
+    if request.GET.get('student_name'):
+        rows = rows.filter(student_name=request.GET['student_name'])
+
+    rows = rows.values(*LIST_FIELDS)[:limit + 1].iterator(chunk_size=limit + 1)
+    return StreamingHttpResponse(_stream_list(rows, limit), content_type='application/json')
\ No newline at end of file